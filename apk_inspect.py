@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+# ZIP 结构签名
+EOCD_SIGNATURE = b"PK\x05\x06"
+ZIP64_EOCD_LOCATOR_SIGNATURE = b"PK\x06\x07"
+ZIP64_EOCD_SIGNATURE = b"PK\x06\x06"
+CENTRAL_DIR_SIGNATURE = b"PK\x01\x02"
+# APK 签名块（v2/v3 签名）位于中央目录之前，以该魔数结尾
+APK_SIG_BLOCK_MAGIC = b"APK Sig Block 42"
+
+# EOCD 最小长度 22 字节，注释最长 65535 字节
+EOCD_MIN_SIZE = 22
+EOCD_SEARCH_SIZE = EOCD_MIN_SIZE + 65535
+CENTRAL_DIR_HEADER_SIZE = 46
+
+DIGEST_CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_TOP_ENTRIES = 10
+
+class ApkFormatError(Exception):
+    pass
+
+class ZipEntry:
+    __slots__ = ("name", "compressed_size", "uncompressed_size")
+
+    def __init__(self, name, compressed_size, uncompressed_size):
+        self.name = name
+        self.compressed_size = compressed_size
+        self.uncompressed_size = uncompressed_size
+
+def _find_eocd(data):
+    search_start = max(0, len(data) - EOCD_SEARCH_SIZE)
+    offset = data.rfind(EOCD_SIGNATURE, search_start)
+    if offset < 0:
+        raise ApkFormatError("未找到 ZIP 中央目录结束记录")
+    return offset
+
+def _read_central_dir_location(data, eocd_offset):
+    """返回 (条目数, 中央目录大小, 中央目录偏移)，支持 ZIP64"""
+    entry_count, cd_size, cd_offset = struct.unpack_from("<HII", data, eocd_offset + 10)
+    if entry_count == 0xFFFF or cd_size == 0xFFFFFFFF or cd_offset == 0xFFFFFFFF:
+        locator_offset = eocd_offset - 20
+        if locator_offset < 0 or data[locator_offset:locator_offset + 4] != ZIP64_EOCD_LOCATOR_SIGNATURE:
+            raise ApkFormatError("ZIP64 定位记录缺失")
+        zip64_offset = struct.unpack_from("<Q", data, locator_offset + 8)[0]
+        if data[zip64_offset:zip64_offset + 4] != ZIP64_EOCD_SIGNATURE:
+            raise ApkFormatError("ZIP64 中央目录结束记录无效")
+        entry_count, cd_size, cd_offset = struct.unpack_from("<QQQ", data, zip64_offset + 32)
+    return entry_count, cd_size, cd_offset
+
+def _parse_zip64_extra(extra, compressed_size, uncompressed_size):
+    """从 ZIP64 扩展字段中读取超过 4GB 的大小"""
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, data_size = struct.unpack_from("<HH", extra, pos)
+        if header_id == 0x0001:
+            field_pos = pos + 4
+            if uncompressed_size == 0xFFFFFFFF:
+                uncompressed_size = struct.unpack_from("<Q", extra, field_pos)[0]
+                field_pos += 8
+            if compressed_size == 0xFFFFFFFF:
+                compressed_size = struct.unpack_from("<Q", extra, field_pos)[0]
+            break
+        pos += 4 + data_size
+    return compressed_size, uncompressed_size
+
+def read_central_directory(data):
+    """只解析中央目录得到全部条目，不解压任何内容"""
+    eocd_offset = _find_eocd(data)
+    entry_count, cd_size, cd_offset = _read_central_dir_location(data, eocd_offset)
+    entries = []
+    pos = cd_offset
+    end = cd_offset + cd_size
+    while pos < end and len(entries) < entry_count:
+        if data[pos:pos + 4] != CENTRAL_DIR_SIGNATURE:
+            raise ApkFormatError(f"中央目录条目签名无效 (偏移 {pos})")
+        compressed_size, uncompressed_size, name_len, extra_len, comment_len = struct.unpack_from(
+            "<IIHHH", data, pos + 20
+        )
+        name_start = pos + CENTRAL_DIR_HEADER_SIZE
+        name = bytes(data[name_start:name_start + name_len]).decode('utf-8', errors='replace')
+        if compressed_size == 0xFFFFFFFF or uncompressed_size == 0xFFFFFFFF:
+            extra = bytes(data[name_start + name_len:name_start + name_len + extra_len])
+            compressed_size, uncompressed_size = _parse_zip64_extra(extra, compressed_size, uncompressed_size)
+        entries.append(ZipEntry(name, compressed_size, uncompressed_size))
+        pos = name_start + name_len + extra_len + comment_len
+    return entries, cd_offset
+
+def has_signing_block(data, cd_offset):
+    """检查中央目录之前是否存在 APK 签名块（v2 及以上签名）"""
+    magic_offset = cd_offset - len(APK_SIG_BLOCK_MAGIC)
+    return magic_offset >= 8 and data[magic_offset:cd_offset] == APK_SIG_BLOCK_MAGIC
+
+def has_jar_signature(entries):
+    """检查是否有 v1（JAR）签名文件"""
+    names = [entry.name.upper() for entry in entries]
+    return any(
+        name.startswith("META-INF/") and name.endswith((".RSA", ".DSA", ".EC"))
+        for name in names
+    )
+
+def categorize_entry(name):
+    """按 APK/AAB 中的路径归类：assets、lib/<abi>、dex、resources、meta、other"""
+    # AAB 中的模块内容位于 <module>/ 下，例如 base/lib/arm64-v8a/
+    parts = name.split("/")
+    if len(parts) > 1 and parts[0] not in ("assets", "lib", "res", "META-INF", "BUNDLE-METADATA") \
+            and parts[1] in ("assets", "lib", "res", "dex", "manifest", "root"):
+        parts = parts[1:]
+        name = "/".join(parts)
+    if parts[0] == "assets":
+        return "assets"
+    if parts[0] == "lib" and len(parts) > 2:
+        return f"lib/{parts[1]}"
+    if name.endswith(".dex"):
+        return "dex"
+    if parts[0] == "res" or name == "resources.arsc" or name.endswith(".pb"):
+        return "resources"
+    if parts[0] in ("META-INF", "BUNDLE-METADATA"):
+        return "meta"
+    return "other"
+
+def sha256_of(data, chunk_size=DIGEST_CHUNK_SIZE):
+    """按块计算 SHA-256，大文件也不会一次性复制到内存"""
+    hasher = hashlib.sha256()
+    view = memoryview(data)
+    try:
+        for offset in range(0, len(view), chunk_size):
+            hasher.update(view[offset:offset + chunk_size])
+    finally:
+        view.release()
+    return hasher.hexdigest()
+
+def inspect_apk(apk_path, top=DEFAULT_TOP_ENTRIES, compute_digest=True):
+    """通过 mmap 解析 APK/AAB 的中央目录，返回大小分类、最大条目、签名与摘要信息"""
+    file_size = os.path.getsize(apk_path)
+    with open(apk_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            entries, cd_offset = read_central_directory(data)
+            signing_block = has_signing_block(data, cd_offset)
+            digest = sha256_of(data) if compute_digest else None
+
+    categories = {}
+    for entry in entries:
+        category = categorize_entry(entry.name)
+        stats = categories.setdefault(category, {"count": 0, "compressed": 0, "uncompressed": 0})
+        stats["count"] += 1
+        stats["compressed"] += entry.compressed_size
+        stats["uncompressed"] += entry.uncompressed_size
+
+    largest = sorted(entries, key=lambda entry: entry.compressed_size, reverse=True)[:top]
+    return {
+        "path": apk_path,
+        "file_size": file_size,
+        "entry_count": len(entries),
+        "sha256": digest,
+        "signing_block": signing_block,
+        "jar_signature": has_jar_signature(entries),
+        "categories": dict(sorted(categories.items(), key=lambda item: item[1]["compressed"], reverse=True)),
+        "largest": [
+            {"name": entry.name, "compressed": entry.compressed_size, "uncompressed": entry.uncompressed_size}
+            for entry in largest
+        ],
+    }
+
+def check_size_budgets(report, budgets_mb):
+    """检查各分类（按压缩后大小）是否超出预算；"lib" 汇总所有 ABI，"total" 为文件大小"""
+    violations = []
+    categories = report["categories"]
+    for category, budget_mb in budgets_mb.items():
+        if category == "total":
+            actual = report["file_size"]
+        elif category == "lib":
+            actual = sum(stats["compressed"] for name, stats in categories.items() if name.startswith("lib/"))
+        else:
+            actual = categories.get(category, {}).get("compressed", 0)
+        limit = float(budget_mb) * 1024 * 1024
+        if actual > limit:
+            violations.append((category, actual, limit))
+    return violations
+
+def format_apk_report(report):
+    """生成可读的检查结果"""
+    mb = 1024 * 1024
+    lines = [
+        f"{os.path.basename(report['path'])}: {report['file_size'] / mb:.2f} MB，{report['entry_count']} 个条目",
+    ]
+    if report["sha256"]:
+        lines.append(f"  SHA-256: {report['sha256']}")
+    signatures = []
+    if report["signing_block"]:
+        signatures.append("APK 签名块 (v2+)")
+    if report["jar_signature"]:
+        signatures.append("JAR 签名 (v1)")
+    lines.append(f"  签名: {', '.join(signatures) if signatures else '未签名'}")
+    lines.append("  分类大小 (压缩后 / 解压后):")
+    for category, stats in report["categories"].items():
+        lines.append(
+            f"    {category:<20} {stats['compressed'] / mb:>9.2f} MB / {stats['uncompressed'] / mb:>9.2f} MB"
+            f"  ({stats['count']} 个文件)"
+        )
+    lines.append(f"  最大的 {len(report['largest'])} 个条目:")
+    for entry in report["largest"]:
+        lines.append(f"    {entry['compressed'] / mb:>9.2f} MB  {entry['name']}")
+    return lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="快速检查 APK/AAB 内容（只解析中央目录，不解压）")
+    parser.add_argument("files", nargs="+", help="APK 或 AAB 文件")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_ENTRIES, help="列出最大的条目数")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+    parser.add_argument("--no-digest", action="store_true", help="不计算 SHA-256")
+    args = parser.parse_args()
+
+    reports = [inspect_apk(path, args.top, not args.no_digest) for path in args.files]
+    if args.json:
+        json.dump(reports, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        for report in reports:
+            print("\n".join(format_apk_report(report)))
@@ -0,0 +1,217 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import stat
+import sys
+import time
+
+from build_utils import format_size, get_artifact_variant, get_cache_dir, log_pipeline_step
+
+# 产物仓库配置的默认值，可通过 build_params.json 的 artifact_store 覆盖
+DEFAULT_ARTIFACT_STORE_CONFIG = {
+    "enabled": True,
+    "dir": None,        # 仓库目录，默认 .build_cache/artifacts
+    "max_mb": 10240,    # 内容总大小上限，超过时按最近最少使用淘汰
+    "reuse": False,     # apk_build 时若当前提交与变体已有产物，直接取回而不重新打包
+}
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+def get_artifact_store_config(params):
+    config = dict(DEFAULT_ARTIFACT_STORE_CONFIG)
+    config.update((params or {}).get("artifact_store", {}))
+    return config
+
+def hash_file(file_path):
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def link_or_copy(src, dest, link=True):
+    """优先建立硬链接（同一文件系统下不占额外空间），失败或 link=False 时复制为可写文件"""
+    if os.path.exists(dest):
+        if link and os.path.samefile(src, dest):
+            return True
+        os.chmod(dest, stat.S_IREAD | stat.S_IWRITE)
+        os.remove(dest)
+    if link:
+        try:
+            os.link(src, dest)
+            return True
+        except OSError:
+            pass
+    shutil.copyfile(src, dest)
+    os.chmod(dest, stat.S_IREAD | stat.S_IWRITE)
+    return False
+
+class ArtifactStore:
+    """按内容寻址的产物仓库：相同内容只保存一份，按 (提交, 变体, 文件名) 建立索引"""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blobs_dir = os.path.join(root, "blobs")
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self.db_path = os.path.join(root, "index.db")
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS blobs ("
+                    " digest TEXT PRIMARY KEY, size INTEGER, created REAL, last_used REAL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS artifacts ("
+                    " commit_sha TEXT, variant TEXT, name TEXT, digest TEXT, created REAL, metadata TEXT,"
+                    " PRIMARY KEY (commit_sha, variant, name))"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_digest ON artifacts (digest)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def blob_path(self, digest):
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def ingest(self, file_path, commit, variant, metadata=None, digest=None):
+        """保存产物；内容已存在时只增加索引，返回 (摘要, 是否去重)"""
+        digest = digest or hash_file(file_path)
+        blob_path = self.blob_path(digest)
+        deduplicated = os.path.exists(blob_path)
+        if not deduplicated:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_path = f"{blob_path}.{os.getpid()}.tmp"
+            shutil.copyfile(file_path, tmp_path)
+            # 仓库内容只读，避免通过硬链接取回的文件被原地修改
+            os.chmod(tmp_path, stat.S_IREAD)
+            os.replace(tmp_path, blob_path)
+
+        now = time.time()
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    "INSERT INTO blobs VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (digest) DO UPDATE SET last_used = excluded.last_used",
+                    (digest, os.path.getsize(blob_path), now, now)
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?)",
+                    (commit, variant, os.path.basename(file_path), digest, now,
+                     json.dumps(metadata or {}, ensure_ascii=False))
+                )
+        self.evict()
+        return digest, deduplicated
+
+    def remove(self, commit, variant):
+        """删除提交与变体的索引（内容保留，由淘汰策略回收），用于整组替换产物"""
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                conn.execute("DELETE FROM artifacts WHERE commit_sha = ? AND variant = ?", (commit, variant))
+
+    def lookup(self, commit, variant=None):
+        """按提交（可选变体）查询产物，返回索引记录列表"""
+        query = "SELECT commit_sha, variant, name, digest, created, metadata FROM artifacts WHERE commit_sha = ?"
+        args = [commit]
+        if variant:
+            query += " AND variant = ?"
+            args.append(variant)
+        with contextlib.closing(self._connect()) as conn:
+            rows = conn.execute(query + " ORDER BY variant, name", args).fetchall()
+        return [
+            {"commit": row[0], "variant": row[1], "name": row[2], "digest": row[3],
+             "created": row[4], "metadata": json.loads(row[5])}
+            for row in rows
+            if os.path.exists(self.blob_path(row[3]))
+        ]
+
+    def fetch(self, commit, variant, dest_dir, link=True):
+        """把提交与变体对应的产物取回到 dest_dir，返回取回的文件路径列表
+
+        取回到会被构建工具覆盖的目录（如 Gradle 输出目录）时应传 link=False，
+        以免只读的硬链接妨碍后续构建。
+        """
+        records = self.lookup(commit, variant)
+        if not records:
+            return []
+        os.makedirs(dest_dir, exist_ok=True)
+        fetched = []
+        now = time.time()
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                for record in records:
+                    dest = os.path.join(dest_dir, record["name"])
+                    link_or_copy(self.blob_path(record["digest"]), dest, link)
+                    conn.execute("UPDATE blobs SET last_used = ? WHERE digest = ?", (now, record["digest"]))
+                    fetched.append(dest)
+        return fetched
+
+    def stats(self):
+        with contextlib.closing(self._connect()) as conn:
+            blob_count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            artifact_count, commit_count = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT commit_sha) FROM artifacts"
+            ).fetchone()
+        return {"blobs": blob_count, "bytes": total, "artifacts": artifact_count, "commits": commit_count}
+
+    def evict(self):
+        """按 last_used 从旧到新删除内容及其索引，直到总大小不超过上限"""
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+                if total <= self.max_bytes:
+                    return
+                for digest, size in conn.execute(
+                    "SELECT digest, size FROM blobs ORDER BY last_used"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    blob_path = self.blob_path(digest)
+                    if os.path.exists(blob_path):
+                        os.chmod(blob_path, stat.S_IREAD | stat.S_IWRITE)
+                        os.remove(blob_path)
+                    conn.execute("DELETE FROM artifacts WHERE digest = ?", (digest,))
+                    conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                    total -= size
+                    log_pipeline_step(f"产物淘汰: {digest[:12]} ({format_size(size)})")
+
+def open_artifact_store(params):
+    config = get_artifact_store_config(params)
+    root = config.get("dir") or get_cache_dir(params, "artifacts")
+    return ArtifactStore(root, int(config.get("max_mb", 10240)) * 1024 * 1024)
+
+if __name__ == "__main__":
+    from build_modules import load_build_params
+
+    parser = argparse.ArgumentParser(description="构建产物仓库查询与取回")
+    parser.add_argument("command", choices=["lookup", "fetch", "stats"],
+                        help="lookup: 按提交查询; fetch: 取回产物; stats: 仓库统计")
+    parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    parser.add_argument("--commit", help="提交 SHA")
+    parser.add_argument("--variant", help="变体名称（fetch 时默认按参数文件推断）")
+    parser.add_argument("--dest", default=".", help="fetch 的目标目录")
+    args = parser.parse_args()
+
+    params = load_build_params(args.params)
+    if not params:
+        sys.exit(1)
+    store = open_artifact_store(params)
+
+    if args.command == "stats":
+        print(json.dumps(store.stats(), ensure_ascii=False, indent=2))
+    elif not args.commit:
+        parser.error("lookup/fetch 需要 --commit")
+    elif args.command == "lookup":
+        print(json.dumps(store.lookup(args.commit, args.variant), ensure_ascii=False, indent=2))
+    else:
+        variant = args.variant or get_artifact_variant(params)
+        files = store.fetch(args.commit, variant, args.dest)
+        if not files:
+            log_pipeline_step(f"[ERROR] 未找到产物: {args.commit} / {variant}")
+            sys.exit(1)
+        for file_path in files:
+            log_pipeline_step(f"已取回: {file_path}")
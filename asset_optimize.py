@@ -0,0 +1,333 @@
+import argparse
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import struct
+import subprocess
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from build_cache import FileHashMemo, iter_tree_files
+from build_utils import format_size, get_cache_dir, log_pipeline_step
+
+# 资源预优化配置的默认值，可通过 build_params.json 的 asset_optimize 覆盖
+DEFAULT_ASSET_OPTIMIZE_CONFIG = {
+    "enabled": False,
+    "workers": None,              # 进程数，默认等于 CPU 核数
+    "input_dir": "assets",
+    "png": True,                  # 无损重新压缩 PNG
+    "resize": False,              # 开启后按 max_sizes 缩小图片，并同步更新 .meta 中的尺寸与 SpriteFrame 区域
+    "max_sizes": {},              # {"textures/bg/*.png": 1024}：匹配的图片最长边不超过该值（需要 Pillow）
+    "audio_extensions": [".wav", ".mp3", ".ogg"],
+    "audio_command": None,        # 音频优化命令，例如 "ffmpeg -y -loglevel error -i {input} -b:a 96k {output}"
+    "min_saving": 0.01,           # 节省比例低于此值时保留原文件
+}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# 只影响元信息、不影响像素的 PNG 块，重新压缩时去掉
+PNG_DROP_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"tIME"}
+ZLIB_STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
+
+# .meta 中按宽、高缩放的字段（Creator 2.x 直接位于子资源中，3.x 位于子资源的 userData 中）
+META_WIDTH_KEYS = ("width", "rawWidth", "trimX", "offsetX", "borderLeft", "borderRight")
+META_HEIGHT_KEYS = ("height", "rawHeight", "trimY", "offsetY", "borderTop", "borderBottom")
+# 3.x SpriteFrame 网格顶点中的像素坐标，nuv 为归一化坐标不需要缩放
+META_VERTEX_KEYS = {"rawPosition": 3, "minPos": 3, "maxPos": 3, "uv": 2}
+
+def get_asset_optimize_config(params):
+    config = dict(DEFAULT_ASSET_OPTIMIZE_CONFIG)
+    config.update((params or {}).get("asset_optimize", {}))
+    return config
+
+def get_max_sizes(config):
+    """未开启 resize 时不缩放任何图片"""
+    return (config.get("max_sizes") or {}) if config.get("resize") else {}
+
+def read_png_chunks(data):
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("不是 PNG 文件")
+    pos = len(PNG_SIGNATURE)
+    chunks = []
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack_from(">I4s", data, pos)
+        chunks.append((chunk_type, data[pos + 8:pos + 8 + length]))
+        pos += 12 + length
+        if chunk_type == b"IEND":
+            break
+    return chunks
+
+def write_png_chunk(chunk_type, body):
+    return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+
+def recompress_png(data):
+    """合并 IDAT 并以最高压缩级别重新压缩，像素数据不变"""
+    chunks = read_png_chunks(data)
+    raw = zlib.decompress(b"".join(body for chunk_type, body in chunks if chunk_type == b"IDAT"))
+    candidates = []
+    for strategy in ZLIB_STRATEGIES:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+        candidates.append(compressor.compress(raw) + compressor.flush())
+    best = min(candidates, key=len)
+
+    output = [PNG_SIGNATURE]
+    idat_written = False
+    for chunk_type, body in chunks:
+        if chunk_type in PNG_DROP_CHUNKS:
+            continue
+        if chunk_type == b"IDAT":
+            if not idat_written:
+                output.append(write_png_chunk(b"IDAT", best))
+                idat_written = True
+            continue
+        output.append(write_png_chunk(chunk_type, body))
+    return b"".join(output)
+
+def resize_image(input_path, output_path, max_size):
+    """按最长边缩小图片；未安装 Pillow 时返回 False"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+    with Image.open(input_path) as image:
+        if max(image.size) <= max_size:
+            return False
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        image.save(output_path, format=image.format or "PNG", optimize=True)
+    return True
+
+def get_max_size(rel_path, max_sizes):
+    for pattern, max_size in max_sizes.items():
+        if fnmatch.fnmatch(rel_path, pattern):
+            return int(max_size)
+    return None
+
+def optimize_file(file_path, rel_path, config, output_path):
+    """在工作进程中优化单个文件，结果写入 output_path；返回 (是否产生结果, 说明, 耗时)"""
+    start_time = time.time()
+    ext = os.path.splitext(file_path)[1].lower()
+    source = file_path
+    notes = []
+    try:
+        max_size = get_max_size(rel_path, get_max_sizes(config))
+        if max_size and ext in (".png", ".jpg", ".jpeg", ".webp"):
+            resized_path = output_path + ".resize" + ext
+            if resize_image(file_path, resized_path, max_size):
+                source = resized_path
+                notes.append(f"resize<={max_size}")
+
+        if ext == ".png" and config.get("png", True):
+            with open(source, 'rb') as f:
+                data = recompress_png(f.read())
+            with open(output_path, 'wb') as f:
+                f.write(data)
+            notes.append("png")
+        elif ext in config.get("audio_extensions", []) and config.get("audio_command"):
+            tmp_output = output_path + ext
+            command = config["audio_command"].format(input=f'"{source}"', output=f'"{tmp_output}"')
+            subprocess.run(command, shell=True, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            os.replace(tmp_output, output_path)
+            notes.append("audio")
+        elif source != file_path:
+            os.replace(source, output_path)
+        else:
+            return False, "无可用的优化", time.time() - start_time
+        return True, "+".join(notes), time.time() - start_time
+    except Exception as e:
+        return False, f"优化失败: {e}", time.time() - start_time
+    finally:
+        if source != file_path and os.path.exists(source):
+            os.remove(source)
+
+def get_settings_key(config):
+    """影响优化结果的配置，变化后缓存自动失效"""
+    settings = {k: config.get(k) for k in ("png", "audio_command")}
+    settings["max_sizes"] = get_max_sizes(config)
+    return json.dumps(settings, sort_keys=True)
+
+class AssetOptimizeStats:
+    def __init__(self):
+        self.files = 0
+        self.cache_hits = 0
+        self.optimized = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.worker_time = 0.0
+        self.wall_time = 0.0
+        self.failures = []
+
+    @property
+    def hit_rate(self):
+        return self.cache_hits / self.files if self.files else 0.0
+
+def optimize_assets(params):
+    """并行优化资源目录，按内容哈希缓存结果，返回 AssetOptimizeStats"""
+    config = get_asset_optimize_config(params)
+    input_root = os.path.join(params.get("project_path"), config.get("input_dir", "assets"))
+    cache_root = get_cache_dir(params, "assets")
+    memo = FileHashMemo(os.path.join(cache_root, "hash_memo.json"))
+    settings_key = get_settings_key(config)
+    suffixes = {".png"} if config.get("png", True) else set()
+    max_sizes = get_max_sizes(config)
+    suffixes.update(ext for ext in (".png", ".jpg", ".jpeg", ".webp") if max_sizes)
+    if config.get("audio_command"):
+        suffixes.update(config.get("audio_extensions", []))
+    min_saving = float(config.get("min_saving", 0.01))
+
+    stats = AssetOptimizeStats()
+    pending = []
+    for rel_path, file_path in iter_tree_files(input_root):
+        if os.path.splitext(rel_path)[1].lower() not in suffixes:
+            continue
+        stats.files += 1
+        digest = memo.get_hash(file_path)
+        key = hashlib.sha256(f"{digest}|{settings_key}".encode('utf-8')).hexdigest()
+        entry_path = os.path.join(cache_root, key[:2], key)
+        if os.path.exists(entry_path) or os.path.exists(entry_path + ".skip"):
+            stats.cache_hits += 1
+            apply_cached(file_path, entry_path, stats, resized=get_max_size(rel_path, max_sizes) is not None)
+        else:
+            pending.append((rel_path, file_path, entry_path))
+
+    workers = int(config.get("workers") or os.cpu_count() or 1)
+    start_time = time.time()
+    if pending:
+        log_pipeline_step(f"需要优化 {len(pending)} 个资源文件，进程数: {workers}")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for rel_path, file_path, entry_path in pending:
+                os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+                tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+                futures.append((executor.submit(optimize_file, file_path, rel_path, config, tmp_path),
+                                rel_path, file_path, entry_path, tmp_path))
+            for future, rel_path, file_path, entry_path, tmp_path in futures:
+                produced, note, duration = future.result()
+                stats.worker_time += duration
+                original_size = os.path.getsize(file_path)
+                if produced and os.path.getsize(tmp_path) < original_size * (1 - min_saving):
+                    os.replace(tmp_path, entry_path)
+                else:
+                    # 记录“无需优化”，下次直接跳过
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    open(entry_path + ".skip", 'w').close()
+                    if note.startswith("优化失败"):
+                        stats.failures.append(f"{rel_path}: {note}")
+                apply_cached(file_path, entry_path, stats, mark_output=(memo, settings_key, cache_root),
+                             resized=get_max_size(rel_path, max_sizes) is not None)
+    stats.wall_time = time.time() - start_time
+    memo.save()
+    return stats
+
+def get_image_size(data):
+    """返回图片的 (宽, 高)；PNG 直接读取 IHDR，其他格式需要 Pillow"""
+    if data.startswith(PNG_SIGNATURE):
+        return struct.unpack_from(">II", data, len(PNG_SIGNATURE) + 8)
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as image:
+        return image.size
+
+def scale_meta_rect(fields, sx, sy):
+    for key in META_WIDTH_KEYS:
+        if isinstance(fields.get(key), (int, float)):
+            fields[key] = round(fields[key] * sx)
+    for key in META_HEIGHT_KEYS:
+        if isinstance(fields.get(key), (int, float)):
+            fields[key] = round(fields[key] * sy)
+    vertices = fields.get("vertices")
+    if isinstance(vertices, dict):
+        for key, stride in META_VERTEX_KEYS.items():
+            values = vertices.get(key)
+            if isinstance(values, list):
+                vertices[key] = [v * (sx if i % stride == 0 else sy if i % stride == 1 else 1)
+                                 for i, v in enumerate(values)]
+
+def update_image_meta(meta_path, size, mtime_ns):
+    """图片缩放后按新尺寸更新 .meta 中的纹理尺寸与 SpriteFrame 区域；已是新尺寸时不改动"""
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    width, height = size
+    changed = False
+    if isinstance(meta.get("width"), int) and isinstance(meta.get("height"), int):
+        # Creator 2.x 在顶层记录纹理尺寸
+        if (meta["width"], meta["height"]) != (width, height):
+            meta["width"], meta["height"] = width, height
+            changed = True
+    for sub_meta in (meta.get("subMetas") or {}).values():
+        fields = sub_meta.get("userData", sub_meta)
+        raw_width, raw_height = fields.get("rawWidth"), fields.get("rawHeight")
+        if not raw_width or not raw_height or (raw_width, raw_height) == (width, height):
+            continue
+        scale_meta_rect(fields, width / raw_width, height / raw_height)
+        fields["rawWidth"], fields["rawHeight"] = width, height
+        changed = True
+    if changed:
+        tmp_path = meta_path + ".opt.tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+        os.utime(meta_path, ns=(mtime_ns, mtime_ns))
+    return changed
+
+def apply_cached(file_path, entry_path, stats, mark_output=None, resized=False):
+    """用缓存中的优化结果替换原文件；mark_output 不为空时把结果本身也记为“无需优化”。
+    替换后的文件使用缓存条目的修改时间：git checkout 还原后再次替换时时间不变，Creator 不会重新导入"""
+    original_size = os.path.getsize(file_path)
+    stats.bytes_before += original_size
+    if not os.path.exists(entry_path):
+        stats.bytes_after += original_size
+        return
+    with open(entry_path, 'rb') as src:
+        data = src.read()
+    mtime_ns = os.stat(entry_path).st_mtime_ns
+    tmp_path = file_path + ".opt.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+    os.utime(file_path, ns=(mtime_ns, mtime_ns))
+    if resized and os.path.exists(file_path + ".meta"):
+        update_image_meta(file_path + ".meta", get_image_size(data), mtime_ns)
+    stats.optimized += 1
+    stats.bytes_after += len(data)
+    if mark_output:
+        # 工作区未被 git 还原时，下次遇到的已是优化后的文件，避免重复优化
+        memo, settings_key, cache_root = mark_output
+        key = hashlib.sha256(f"{hashlib.sha256(data).hexdigest()}|{settings_key}".encode('utf-8')).hexdigest()
+        marker = os.path.join(cache_root, key[:2], key + ".skip")
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        open(marker, 'w').close()
+
+def log_asset_optimize_stats(stats):
+    saved = stats.bytes_before - stats.bytes_after
+    log_pipeline_step(
+        f"资源优化: {stats.files} 个文件，缓存命中 {stats.cache_hits} ({stats.hit_rate * 100:.0f}%)，"
+        f"替换 {stats.optimized} 个，节省 {format_size(saved)} / {format_size(stats.bytes_before)}"
+    )
+    if stats.worker_time > 0 and stats.wall_time > 0:
+        log_pipeline_step(
+            f"优化耗时: 墙钟 {stats.wall_time:.1f}s，单进程合计 {stats.worker_time:.1f}s，"
+            f"加速比 {stats.worker_time / stats.wall_time:.2f}x"
+        )
+    for failure in stats.failures:
+        log_pipeline_step(f"[WARNING] {failure}")
+
+if __name__ == "__main__":
+    from build_modules import load_build_params
+
+    parser = argparse.ArgumentParser(description="并行预优化项目资源（PNG 无损压缩、缩放与音频转码）")
+    parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    parser.add_argument("--workers", type=int, default=None, help="进程数")
+    args = parser.parse_args()
+
+    params = load_build_params(args.params)
+    if not params:
+        sys.exit(1)
+    if args.workers:
+        params.setdefault("asset_optimize", {})["workers"] = args.workers
+    log_asset_optimize_stats(optimize_assets(params))
@@ -0,0 +1,53 @@
+import argparse
+import os
+import sys
+import time
+
+from fake_output import emit_lines, load_tool_config, record_tool_time, write_random_file
+from fixture import write_executable
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def creator_lines(count, data_files):
+    yield "Cocos Creator v3.6.3"
+    yield "Start building..."
+    for i in range(count):
+        if i % 97 == 0:
+            yield f"警告: 资源 db://assets/textures/tex_{i}.png 未设置压缩格式"
+        elif i % 13 == 0:
+            yield f"[Build] 构建资源 {i % max(data_files, 1)}/{data_files} ..."
+        else:
+            yield f"[Build] Pack texture db://assets/textures/atlas_{i % 64}/frame_{i}.png -> data/res_{i}.bin"
+    yield "Build success in android"
+
+def write_gradle_project(proj_dir, config_path):
+    """生成 gradlew 包装脚本，实际由 fake_gradlew.py 执行"""
+    gradlew = "gradlew.bat" if os.name == "nt" else "gradlew"
+    write_executable(os.path.join(proj_dir, gradlew), os.path.join(BENCH_DIR, "fake_gradlew.py"), config_path)
+    with open(os.path.join(proj_dir, "build.gradle"), 'w', encoding='utf-8') as f:
+        f.write("// fake project generated by bench/fake_creator.py\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="CocosCreator 替身：输出日志、生成 build/android 目录与 gradlew")
+    parser.add_argument("--config", required=True, help="替身配置文件（由 bench/fixture.py 生成）")
+    parser.add_argument("--project", required=True)
+    parser.add_argument("--build", default="")
+    args, _ = parser.parse_known_args()
+
+    start_time = time.time()
+    config, creator = load_tool_config(args.config, "creator")
+    build_dir = os.path.join(args.project, "build", "android")
+    data_files = int(creator.get("data_files", 200))
+    for i in range(data_files):
+        write_random_file(os.path.join(build_dir, "data", f"res_{i:04d}.bin"), int(creator.get("data_kb", 8)) * 1024, i)
+    write_gradle_project(os.path.join(build_dir, "proj"), args.config)
+
+    lines = emit_lines(creator_lines(int(creator.get("lines", 20000)), data_files),
+                       float(creator.get("rate", 0)), float(creator.get("gbk_ratio", 0.1)))
+    # 真实 Creator 在构建成功时也经常返回 36
+    exit_code = int(creator.get("exit_code", 36))
+    record_tool_time(config, "creator", start_time, lines, exit_code)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
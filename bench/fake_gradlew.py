@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from fake_output import emit_lines, load_tool_config, record_tool_time, write_fake_apk
+
+DEFAULT_ABIS = ["armeabi-v7a", "arm64-v8a"]
+TASK_NAMES = [
+    "preBuild", "generate{v}BuildConfig", "merge{v}Resources", "compile{v}JavaWithJavac",
+    "externalNativeBuild{v}", "merge{v}NativeLibs", "dexBuilder{v}", "merge{v}Assets", "package{v}",
+]
+
+def get_split_abis(init_scripts):
+    """从 abi_splits.gradle 的 include(...) 中读取拆分的 ABI"""
+    for script_path in init_scripts:
+        if os.path.basename(script_path) == "abi_splits.gradle" and os.path.exists(script_path):
+            with open(script_path, 'r', encoding='utf-8') as f:
+                match = re.search(r"include\((.*)\)", f.read())
+            if match:
+                return re.findall(r"'([\w-]+)'", match.group(1))
+    return []
+
+def gradle_lines(count, variant, task_timing):
+    yield "Starting a Gradle Daemon (subsequent builds will be faster)"
+    tasks = [f":app:{name.format(v=variant)}" for name in TASK_NAMES]
+    per_task = max(count // len(tasks), 1)
+    for task in tasks:
+        yield f"> Task {task}"
+        for i in range(per_task):
+            if i % 211 == 0:
+                yield "注: 某些输入文件使用了未经检查或不安全的操作。"
+            elif i % 53 == 0:
+                yield f"warning: [options] 源值 8 已过时，将在未来所有发行版中删除 ({i})"
+            elif i % 7 == 0:
+                yield f"[CXX1405] building cocos/renderer/gfx/Object{i}.cpp.o"
+            else:
+                yield f"  Compiling com/cocos/game/generated/Class{i}.java"
+        if task_timing:
+            yield f"[TASK-TIMING] {task}|{per_task // 10}|EXECUTED"
+    yield "BUILD SUCCESSFUL in 12s"
+    yield f"{len(tasks)} actionable tasks: {len(tasks) - 2} executed, 2 up-to-date"
+
+def main():
+    parser = argparse.ArgumentParser(description="gradlew 替身：输出日志并生成 APK/AAB")
+    parser.add_argument("--config", required=True, help="替身配置文件（由 bench/fixture.py 生成）")
+    parser.add_argument("--init-script", action="append", default=[])
+    parser.add_argument("tasks", nargs="*")
+    args, _ = parser.parse_known_args()
+
+    start_time = time.time()
+    config, gradle = load_tool_config(args.config, "gradle")
+    tasks = [task for task in args.tasks if not task.startswith("-")]
+    if not any(task.startswith(("assemble", "bundle")) for task in tasks):
+        # 预热（help）等不产生产物的调用只模拟启动耗时
+        time.sleep(float(gradle.get("warmup_seconds", 0)))
+        return 0
+    mode = "release" if any(task.endswith("Release") for task in tasks) else "debug"
+    variant = mode.capitalize()
+    split_abis = get_split_abis(args.init_script)
+    task_timing = any(os.path.basename(path) == "task_timing.gradle" for path in args.init_script)
+
+    lines = emit_lines(gradle_lines(int(gradle.get("lines", 30000)), variant, task_timing),
+                       float(gradle.get("rate", 0)), float(gradle.get("gbk_ratio", 0.05)))
+    exit_code = int(gradle.get("exit_code", 0))
+    if exit_code != 0:
+        emit_lines(["FAILURE: Build failed with an exception.", "BUILD FAILED in 12s"], 0, 0)
+        record_tool_time(config, "gradle", start_time, lines, exit_code)
+        return exit_code
+
+    outputs_dir = os.path.join("app", "build", "outputs")
+    if f"assemble{variant}" in tasks:
+        apk_dir = os.path.join(outputs_dir, "apk", mode)
+        names = []
+        if split_abis:
+            for abi in split_abis:
+                names.append(f"app-{abi}-{mode}.apk")
+                write_fake_apk(os.path.join(apk_dir, names[-1]), [abi], gradle, seed=len(names))
+        else:
+            names.append(f"app-{mode}.apk")
+            write_fake_apk(os.path.join(apk_dir, names[-1]), DEFAULT_ABIS, gradle)
+        with open(os.path.join(apk_dir, "output-metadata.json"), 'w', encoding='utf-8') as f:
+            json.dump({"elements": [{"outputFile": name} for name in names]}, f)
+    if f"bundle{variant}" in tasks:
+        write_fake_apk(os.path.join(outputs_dir, "bundle", mode, f"app-{mode}.aab"), DEFAULT_ABIS, gradle)
+
+    record_tool_time(config, "gradle", start_time, lines, exit_code)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import json
+import os
+import random
+import sys
+import time
+import zipfile
+
+# 输出节奏：每个时间片写一次并刷新，模拟真实工具的成批输出
+EMIT_TICK = 0.05
+
+def load_tool_config(config_path, tool):
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return config, config.get(tool, {})
+
+def encode_line(line, index, gbk_ratio):
+    """按比例把部分行编码为 GBK，模拟中文 Windows 控制台下的工具输出"""
+    if gbk_ratio > 0 and index % max(int(1 / gbk_ratio), 1) == 0:
+        return line.encode('gbk', errors='replace') + b"\r\n"
+    return line.encode('utf-8') + b"\n"
+
+def emit_lines(lines, rate, gbk_ratio, stream=None):
+    """以 rate 行/秒（0 表示不限速）输出 lines，返回输出行数"""
+    stream = stream or sys.stdout.buffer
+    start_time = time.time()
+    per_tick = max(int(rate * EMIT_TICK), 1) if rate else 4096
+    buffer = []
+    count = 0
+    for index, line in enumerate(lines):
+        buffer.append(encode_line(line, index, gbk_ratio))
+        count += 1
+        if len(buffer) >= per_tick:
+            stream.write(b"".join(buffer))
+            stream.flush()
+            buffer = []
+            if rate:
+                delay = start_time + count / rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+    if buffer:
+        stream.write(b"".join(buffer))
+        stream.flush()
+    return count
+
+def write_random_file(path, size, seed):
+    """写入不可压缩的伪随机内容（模拟 .so、纹理等）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rng = random.Random(seed)
+    with open(path, 'wb') as f:
+        f.write(rng.randbytes(size))
+
+def write_fake_apk(path, abis, config, seed=0):
+    """生成结构与真实 APK 相近的 zip：dex、resources.arsc、各 ABI 的 .so 与资源文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rng = random.Random(seed)
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as apk:
+        apk.writestr("AndroidManifest.xml", b"\x03\x00\x08\x00" + bytes(2048))
+        apk.writestr("classes.dex", b"dex\n035\x00" + rng.randbytes(int(config.get("dex_kb", 512)) * 1024))
+        apk.writestr("resources.arsc", bytes(int(config.get("arsc_kb", 64)) * 1024),
+                     compress_type=zipfile.ZIP_STORED)
+        for abi in abis:
+            apk.writestr(f"lib/{abi}/libcocos.so", rng.randbytes(int(config.get("lib_kb", 1024)) * 1024))
+        for i in range(int(config.get("assets", 50))):
+            apk.writestr(f"assets/data/res_{i:04d}.bin", rng.randbytes(int(config.get("asset_kb", 8)) * 1024))
+        apk.writestr("META-INF/CERT.RSA", rng.randbytes(1024))
+
+def record_tool_time(config, tool, start_time, lines, exit_code):
+    """把工具自身耗时追加到 tool_log，基准脚本据此计算流水线脚本本身的开销"""
+    tool_log = config.get("tool_log")
+    if not tool_log:
+        return
+    with open(tool_log, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"tool": tool, "duration": time.time() - start_time,
+                            "lines": lines, "exit_code": exit_code}) + "\n")
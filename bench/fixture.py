@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import stat
+import struct
+import subprocess
+import sys
+import zlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 替身工具的默认配置，可由 run_bench.py 的命令行参数覆盖
+DEFAULT_TOOL_CONFIG = {
+    "creator": {
+        "lines": 20000,
+        "rate": 0,           # 行/秒，0 表示不限速
+        "gbk_ratio": 0.1,    # GBK 编码行的比例
+        "exit_code": 36,
+        "data_files": 200,
+        "data_kb": 8,
+    },
+    "gradle": {
+        "lines": 30000,
+        "rate": 0,
+        "gbk_ratio": 0.05,
+        "exit_code": 0,
+        "warmup_seconds": 0,  # 预热（help）调用的耗时，模拟守护进程启动与配置阶段
+        "dex_kb": 512,
+        "lib_kb": 1024,
+        "assets": 50,
+        "asset_kb": 8,
+    },
+}
+
+FIXTURE_TEXTURES = 40
+FIXTURE_SCRIPTS = 60
+
+def git(args, cwd, check=True):
+    return subprocess.run(["git"] + args, cwd=cwd, check=check, capture_output=True, text=True)
+
+def get_git_env(work_dir):
+    """隔离全局 git 配置：git_update 会写入 safe.directory，不能污染执行基准的机器"""
+    return {
+        "GIT_CONFIG_GLOBAL": os.path.join(work_dir, "gitconfig"),
+        "GIT_AUTHOR_NAME": "bench", "GIT_AUTHOR_EMAIL": "bench@localhost",
+        "GIT_COMMITTER_NAME": "bench", "GIT_COMMITTER_EMAIL": "bench@localhost",
+    }
+
+def make_png(width, height, seed):
+    """生成一张未优化的 RGB PNG（zlib 级别 1），供 asset_optimize 处理"""
+    rows = []
+    for y in range(height):
+        rows.append(b"\x00" + bytes(((x * seed + y * 7) & 0xff) for x in range(width * 3)))
+    def chunk(chunk_type, body):
+        return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"tEXt", b"Software\x00bench")
+            + chunk(b"IDAT", zlib.compress(b"".join(rows), 1))
+            + chunk(b"IEND", b""))
+
+def write_project_files(project_dir):
+    textures_dir = os.path.join(project_dir, "assets", "textures")
+    scripts_dir = os.path.join(project_dir, "assets", "scripts")
+    os.makedirs(textures_dir, exist_ok=True)
+    os.makedirs(scripts_dir, exist_ok=True)
+    for i in range(FIXTURE_TEXTURES):
+        with open(os.path.join(textures_dir, f"tex_{i:03d}.png"), 'wb') as f:
+            f.write(make_png(64, 64, i + 1))
+    for i in range(FIXTURE_SCRIPTS):
+        with open(os.path.join(scripts_dir, f"Component{i:03d}.ts"), 'w', encoding='utf-8') as f:
+            f.write(f"export class Component{i} {{\n    // 第 {i} 个组件\n    update(dt: number) {{}}\n}}\n")
+    with open(os.path.join(project_dir, "buildConfig_android.json"), 'w', encoding='utf-8') as f:
+        json.dump({"platform": "android", "buildPath": "project://build", "debug": False}, f, indent=2)
+    with open(os.path.join(project_dir, ".gitignore"), 'w', encoding='utf-8') as f:
+        f.write("build/\nlibrary/\ntemp/\n")
+
+def write_executable(path, target, config_path):
+    """生成调用替身脚本的可执行包装"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.name == "nt":
+        content = f'@echo off\r\n"{sys.executable}" "{target}" --config "{config_path}" %*\r\n'
+    else:
+        content = f'#!/bin/sh\nexec "{sys.executable}" "{target}" --config "{config_path}" "$@"\n'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+def create_fixture(work_dir, tool_config=None, params_overrides=None):
+    """在 work_dir 下生成 git 远端与工作区、替身 Creator 与构建参数，返回各路径"""
+    work_dir = os.path.abspath(work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    os.environ.update(get_git_env(work_dir))
+
+    config = json.loads(json.dumps(DEFAULT_TOOL_CONFIG))
+    for tool, values in (tool_config or {}).items():
+        config[tool].update(values)
+    config["tool_log"] = os.path.join(work_dir, "tool_times.jsonl")
+    config_path = os.path.join(work_dir, "tools.json")
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+    # 路径中带版本号，get_creator_version 能解析到 3.6.3
+    creator_name = "CocosCreator.bat" if os.name == "nt" else "CocosCreator"
+    creator_path = os.path.join(work_dir, "tools", "Creator", "3.6.3", creator_name)
+    write_executable(creator_path, os.path.join(BENCH_DIR, "fake_creator.py"), config_path)
+
+    origin_dir = os.path.join(work_dir, "origin.git")
+    upstream_dir = os.path.join(work_dir, "upstream")
+    project_dir = os.path.join(work_dir, "project")
+    if not os.path.isdir(origin_dir):
+        git(["init", "--bare", "-b", "main", origin_dir], cwd=work_dir)
+        git(["clone", origin_dir, upstream_dir], cwd=work_dir)
+        git(["checkout", "-b", "main"], cwd=upstream_dir, check=False)
+        write_project_files(upstream_dir)
+        git(["add", "-A"], cwd=upstream_dir)
+        git(["commit", "-m", "initial project"], cwd=upstream_dir)
+        git(["push", "-u", "origin", "main"], cwd=upstream_dir)
+        git(["clone", origin_dir, project_dir], cwd=work_dir)
+
+    params = {
+        "game_type": "release",
+        "config_path": "buildConfig_android.json",
+        "creator_path": creator_path,
+        "project_path": project_dir,
+        "cache_dir": os.path.join(work_dir, "cache"),
+        "clean_mode": "keep_cache",
+        "asset_optimize": {"enabled": True},
+        "gradle_profile": {"task_report": True},
+    }
+    params.update(params_overrides or {})
+    params_path = os.path.join(work_dir, "build_params.json")
+    with open(params_path, 'w', encoding='utf-8') as f:
+        json.dump(params, f, indent=2, ensure_ascii=False)
+
+    return {
+        "work_dir": work_dir,
+        "config_path": config_path,
+        "tool_log": config["tool_log"],
+        "creator_path": creator_path,
+        "origin_dir": origin_dir,
+        "upstream_dir": upstream_dir,
+        "project_dir": project_dir,
+        "params_path": params_path,
+        "params": params,
+    }
+
+def push_upstream_commit(fixture):
+    """在远端追加一次提交，使下一次 git 更新有内容可拉取"""
+    upstream_dir = fixture["upstream_dir"]
+    index = int(git(["rev-list", "--count", "HEAD"], cwd=upstream_dir).stdout.strip())
+    path = os.path.join(upstream_dir, "assets", "scripts", f"Component{index % FIXTURE_SCRIPTS:03d}.ts")
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(f"// bench change {index}\n")
+    git(["commit", "-am", f"bench change {index}"], cwd=upstream_dir)
+    git(["push", "origin", "main"], cwd=upstream_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成基准测试用的 git 仓库、替身 Creator 与构建参数")
+    parser.add_argument("work_dir", help="生成目录")
+    args = parser.parse_args()
+    fixture = create_fixture(args.work_dir)
+    print(json.dumps({k: v for k, v in fixture.items() if k != "params"}, indent=2, ensure_ascii=False))
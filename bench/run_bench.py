@@ -0,0 +1,280 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_output import encode_line, write_fake_apk
+from fake_gradlew import gradle_lines
+from fixture import create_fixture, git, push_upstream_commit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+RESULTS_SCHEMA = 1
+# 小于该值的变化视为噪声，compare 不判定为退化
+DEFAULT_MIN_DELTA_SECONDS = 0.05
+
+def get_repo_commit():
+    head = git(["rev-parse", "HEAD"], cwd=REPO_DIR, check=False).stdout.strip()
+    dirty = bool(git(["status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR, check=False).stdout.strip())
+    return head or None, dirty
+
+def read_tool_times(tool_log):
+    if not os.path.exists(tool_log):
+        return []
+    with open(tool_log, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def get_e2e_scenarios(fixture):
+    """端到端场景：(名称, 命令, 工作目录, 执行前的准备)"""
+    python = sys.executable
+    params_path = fixture["params_path"]
+    params = fixture["params"]
+
+    def pull():
+        push_upstream_commit(fixture)
+
+    scenarios = []
+    for action, prepare in (("git_update", pull), ("asset_optimize", None), ("cocos_build", None),
+                            ("apk_build", None), ("verify_build", None)):
+        scenarios.append((f"build_modules:{action}",
+                          [python, os.path.join(REPO_DIR, "build_modules.py"), action, "--params", params_path],
+                          REPO_DIR, prepare))
+    scenarios.append(("pipeline", [python, os.path.join(REPO_DIR, "pipeline.py"), "--params", params_path],
+                      REPO_DIR, pull))
+    scenarios.append(("build.py", [
+        python, os.path.join(REPO_DIR, "build.py"), "--creator", params["creator_path"],
+        "--project", params["project_path"], "--config", params["config_path"],
+        "--mode", params["game_type"], "--build-params", params_path,
+    ], REPO_DIR, None))
+    # main.py 从当前目录读取 build_params.json
+    scenarios.append(("main.py", [python, os.path.join(REPO_DIR, "main.py")], fixture["work_dir"], pull))
+    return scenarios
+
+def run_e2e(name, command, cwd, prepare, fixture, repeat, log_dir):
+    runs = []
+    for index in range(repeat):
+        if prepare:
+            prepare()
+        tool_log = fixture["tool_log"]
+        if os.path.exists(tool_log):
+            os.remove(tool_log)
+        log_path = os.path.join(log_dir, f"{name.replace(':', '_')}.{index}.log")
+        start_time = time.perf_counter()
+        with open(log_path, 'wb') as log_file:
+            return_code = subprocess.run(command, cwd=cwd, stdout=log_file, stderr=subprocess.STDOUT).returncode
+        duration = time.perf_counter() - start_time
+        tools = read_tool_times(tool_log)
+        tool_time = sum(tool["duration"] for tool in tools)
+        runs.append({
+            "duration": duration,
+            "exit_code": return_code,
+            "tool_time": tool_time,
+            "overhead": duration - tool_time,
+            "tool_lines": sum(tool["lines"] for tool in tools),
+            "output_bytes": os.path.getsize(log_path),
+        })
+        print(f"  {name:<28} #{index + 1}  {duration:7.2f}s  工具 {tool_time:6.2f}s  返回码 {return_code}")
+    return runs
+
+def make_mixed_output(line_count):
+    """生成与 gradlew 替身相同的 UTF-8/GBK 混合原始输出"""
+    lines = []
+    for index, line in enumerate(gradle_lines(line_count, "Release", True)):
+        lines.append(encode_line(line, index, 0.05))
+    return lines
+
+def get_component_benchmarks(fixture, line_count, work_dir):
+    """组件基准：返回 (名称, 计时函数, 处理量, 单位) 列表，处理量用于计算吞吐"""
+    from apk_inspect import inspect_apk
+    from build_cache import compute_fingerprint
+    from gradle_utils import DEFAULT_GRADLE_PROFILE, GradleOutputParser
+    from log_store import CompressedLogSink
+    from process_stream import ConsoleSink, decode_line, stream_process
+
+    raw_lines = make_mixed_output(line_count)
+    text_lines = [decode_line(raw.rstrip(b"\r\n")) for raw in raw_lines]
+    data_path = os.path.join(work_dir, "mixed_output.log")
+    with open(data_path, 'wb') as f:
+        f.writelines(raw_lines)
+    apk_path = os.path.join(work_dir, "component.apk")
+    write_fake_apk(apk_path, ["armeabi-v7a", "arm64-v8a"], {"lib_kb": 8192, "dex_kb": 4096, "assets": 500})
+
+    def stream():
+        command = [sys.executable, "-c",
+                   "import shutil, sys; shutil.copyfileobj(open(sys.argv[1], 'rb'), sys.stdout.buffer)", data_path]
+        with open(os.devnull, 'w', encoding='utf-8') as devnull:
+            stream_process(command, [ConsoleSink("[BENCH]", stream=devnull, lossy=False)], shell=False)
+
+    def decode():
+        for raw in raw_lines:
+            decode_line(raw.rstrip(b"\r\n"))
+
+    def parse():
+        parser = GradleOutputParser(DEFAULT_GRADLE_PROFILE)
+        for line in text_lines:
+            parser.feed(line)
+
+    def capture():
+        log_dir = tempfile.mkdtemp(dir=work_dir)
+        sink = CompressedLogSink(log_dir, "bench", 256 * 1024, 64 * 1024 * 1024)
+        sink.start()
+        for i in range(0, len(text_lines), 256):
+            sink.put(text_lines[i:i + 256])
+        sink.close()
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+    return [
+        ("component:stream_process", stream, len(raw_lines), "行"),
+        ("component:decode_line", decode, len(raw_lines), "行"),
+        ("component:gradle_parser", parse, len(text_lines), "行"),
+        ("component:log_capture", capture, len(text_lines), "行"),
+        ("component:apk_inspect", lambda: inspect_apk(apk_path), os.path.getsize(apk_path), "字节"),
+        ("component:fingerprint", lambda: compute_fingerprint(fixture["project_dir"], ["assets"]), None, None),
+    ]
+
+def run_component(name, func, amount, unit, repeat):
+    runs = []
+    for index in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        duration = time.perf_counter() - start_time
+        run = {"duration": duration}
+        if amount:
+            run["throughput"] = amount / duration
+        runs.append(run)
+        rate = f"  {amount / duration:,.0f} {unit}/秒" if amount else ""
+        print(f"  {name:<28} #{index + 1}  {duration:7.3f}s{rate}")
+    return runs
+
+def summarize(kind, runs):
+    durations = [run["duration"] for run in runs]
+    summary = {
+        "kind": kind,
+        "runs": runs,
+        "median": statistics.median(durations),
+        "min": min(durations),
+        "max": max(durations),
+    }
+    if kind == "e2e":
+        summary["overhead_median"] = statistics.median(run["overhead"] for run in runs)
+        summary["exit_codes"] = sorted({run["exit_code"] for run in runs})
+    elif "throughput" in runs[0]:
+        summary["throughput_median"] = statistics.median(run["throughput"] for run in runs)
+    return summary
+
+def run_benchmarks(args):
+    work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix="build_bench_"))
+    tool_config = {
+        "creator": {"lines": args.creator_lines, "rate": args.rate, "exit_code": args.creator_exit},
+        "gradle": {"lines": args.gradle_lines, "rate": args.rate, "exit_code": args.gradle_exit},
+    }
+    fixture = create_fixture(work_dir, tool_config)
+    log_dir = os.path.join(work_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    selected = set(args.scenarios.split(",")) if args.scenarios else None
+    print(f"基准目录: {work_dir}")
+
+    results = {}
+    try:
+        if not args.skip_e2e:
+            for name, command, cwd, prepare in get_e2e_scenarios(fixture):
+                if selected is None or name in selected:
+                    results[name] = summarize("e2e", run_e2e(name, command, cwd, prepare, fixture,
+                                                            args.repeat, log_dir))
+        if not args.skip_components:
+            for name, func, amount, unit in get_component_benchmarks(fixture, args.component_lines, work_dir):
+                if selected is None or name in selected:
+                    results[name] = summarize("component", run_component(name, func, amount, unit, args.repeat))
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit, dirty = get_repo_commit()
+    report = {
+        "schema": RESULTS_SCHEMA,
+        "commit": commit,
+        "dirty": dirty,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "settings": {k: v for k, v in vars(args).items() if k not in ("command", "output", "work_dir", "keep")},
+        "results": results,
+    }
+    output = args.output or f"bench-{(commit or 'unknown')[:12]}{'-dirty' if dirty else ''}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"结果已写入: {output}")
+    failed = [name for name, summary in results.items() if summary.get("exit_codes", [0]) != [0]]
+    for name in failed:
+        print(f"[WARNING] {name} 返回码: {results[name]['exit_codes']}，日志: {log_dir}")
+    return 1 if failed else 0
+
+def compare_results(base_path, head_path, threshold, min_delta):
+    """按中位数比较两次结果，超过阈值的变慢记为退化，返回退化数"""
+    with open(base_path, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(head_path, 'r', encoding='utf-8') as f:
+        head = json.load(f)
+    print(f"基准: {(base.get('commit') or '?')[:12]}  对比: {(head.get('commit') or '?')[:12]}")
+    if base.get("settings") != head.get("settings"):
+        print("[WARNING] 两次运行的参数不同，结果可能不可比")
+
+    regressions = 0
+    print(f"{'场景':<30}{'基准':>10}{'对比':>10}{'变化':>9}   脚本开销")
+    for name in sorted(set(base["results"]) | set(head["results"])):
+        old = base["results"].get(name)
+        new = head["results"].get(name)
+        if not old or not new:
+            print(f"{name:<30}{'缺失' if not old else '':>10}{'缺失' if not new else '':>10}")
+            continue
+        delta = new["median"] - old["median"]
+        ratio = delta / old["median"] if old["median"] else 0.0
+        overhead = ""
+        if "overhead_median" in old and "overhead_median" in new:
+            overhead = f"{old['overhead_median']:.2f}s -> {new['overhead_median']:.2f}s"
+        flag = ""
+        if ratio > threshold and delta > min_delta:
+            flag = "  ❌ 退化"
+            regressions += 1
+        elif ratio < -threshold and -delta > min_delta:
+            flag = "  ✅ 提升"
+        print(f"{name:<30}{old['median']:>9.3f}s{new['median']:>9.3f}s{ratio * 100:>+8.1f}%   {overhead}{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="流水线脚本基准测试（替身 Creator/Gradle/git，无需 Windows 与 Android SDK）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="执行基准并写出 JSON 结果")
+    run_parser.add_argument("--output", default=None, help="结果文件，默认 bench-<提交>.json")
+    run_parser.add_argument("--work-dir", default=None, help="基准目录，默认临时目录（结束后删除）")
+    run_parser.add_argument("--keep", action="store_true", help="保留临时基准目录")
+    run_parser.add_argument("--repeat", type=int, default=3, help="每个场景的执行次数")
+    run_parser.add_argument("--scenarios", default=None, help="只执行指定场景，逗号分隔，例如 pipeline,component:decode_line")
+    run_parser.add_argument("--skip-e2e", action="store_true", help="跳过端到端场景")
+    run_parser.add_argument("--skip-components", action="store_true", help="跳过组件场景")
+    run_parser.add_argument("--creator-lines", type=int, default=20000, help="Creator 替身输出行数")
+    run_parser.add_argument("--gradle-lines", type=int, default=30000, help="gradlew 替身输出行数")
+    run_parser.add_argument("--rate", type=float, default=0, help="替身输出速率（行/秒），0 表示不限速")
+    run_parser.add_argument("--creator-exit", type=int, default=36, help="Creator 替身的退出码")
+    run_parser.add_argument("--gradle-exit", type=int, default=0, help="gradlew 替身的退出码")
+    run_parser.add_argument("--component-lines", type=int, default=200000, help="组件场景的输出行数")
+
+    compare_parser = subparsers.add_parser("compare", help="比较两次结果")
+    compare_parser.add_argument("base", help="基准结果 JSON")
+    compare_parser.add_argument("head", help="对比结果 JSON")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="中位数变慢超过该比例视为退化")
+    compare_parser.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA_SECONDS,
+                                help="绝对变化小于该秒数时忽略")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(run_benchmarks(args))
+    sys.exit(1 if compare_results(args.base, args.head, args.threshold, args.min_delta) else 0)
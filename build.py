@@ -2,10 +2,13 @@ import argparse
 import json
 import logging
 import os
-import subprocess
 import sys
 from pathlib import Path
 
+from process_stream import CallbackSink, stream_process
+from gradle_utils import GradleOutputParser, format_gradle_command, get_gradle_profile
+from resource_monitor import init_resource_monitor, log_resource_summary, open_resource_monitor
+
 def setup_logger():
     logger = logging.getLogger("cocos_builder")
     logger.setLevel(logging.INFO)
@@ -23,23 +26,14 @@ def check_file(path: Path, description: str, logger):
     return path
 
 
-def run_subprocess(command: str, logger, cwd: Path = None):
+def run_subprocess(command: str, logger, cwd: Path = None, line_handler=None, name="command"):
     logger.info(f"执行命令: {command}")
-    process = subprocess.Popen(
-        command,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        cwd=cwd,
-        shell=True  # ⭐注意要用 shell=True，因为 command 是字符串
-    )
-    assert process.stdout
-    for raw_line in iter(process.stdout.readline, b''):
-        try:
-            line = raw_line.decode('utf-8').rstrip()
-        except UnicodeDecodeError:
-            line = raw_line.decode('gbk', errors='replace').rstrip()
-        logger.info(line)
-    ret = process.wait()
+    sinks = [CallbackSink(logger.info)]
+    if line_handler:
+        sinks.append(CallbackSink(line_handler))
+    monitor = open_resource_monitor(name)
+    # ⭐注意要用 shell=True，因为 command 是字符串
+    ret = stream_process(command, sinks, cwd=cwd, shell=True, monitors=[monitor] if monitor else []).return_code
 
     if ret == 0:
         logger.info("子进程正常完成 ✅")
@@ -63,17 +57,30 @@ def build_with_cocos_creator(exec_path: Path, project_dir: Path, config_file: Pa
     # 拼接成一条完整的命令
     command = f'"{str(exec_path)}" --project "{str(project_dir)}" --build {config_file}'
 
-    run_subprocess(command, logger)
+    run_subprocess(command, logger, name="cocos_export")
     logger.info("Cocos Creator 构建完成 ✅")
 
 
-def build_apk_with_gradle(build_dir: Path, gradlew: Path, mode: str, logger):
+def load_build_params(build_params: Path, logger):
+    params = {}
+    if build_params:
+        check_file(build_params, "构建参数文件", logger)
+        with open(build_params, 'r', encoding='utf-8') as f:
+            params = json.load(f)
+    return params
+
+
+def build_apk_with_gradle(build_dir: Path, gradlew: Path, mode: str, logger, gradle_profile=None):
     logger.info("开始使用 Gradle 打包 APK...")
     project_native = build_dir / "proj"
     check_file(gradlew, "Gradle Wrapper", logger)
     logger.info(project_native)
     task = "assembleRelease" if mode == "release" else "assembleDebug"
-    run_subprocess([str(gradlew), task], logger, cwd=project_native)
+    gradle_profile = gradle_profile or get_gradle_profile({})
+    gradle_parser = GradleOutputParser(gradle_profile)
+    command = format_gradle_command(f'"{gradlew}"', [task], gradle_profile)
+    run_subprocess(command, logger, cwd=project_native, line_handler=gradle_parser.feed, name="gradle_build")
+    gradle_parser.log_summary(logger.info)
     logger.info("Gradle 打包完成 ✅")
 
 
@@ -85,6 +92,8 @@ def parse_args():
                         help="构建配置文件名 (相对于项目路径)")
     parser.add_argument("--mode", choices=["debug", "release"], default="release",
                         help="Gradle 构建模式")
+    parser.add_argument("--build-params", default=None,
+                        help="build_params.json 路径，用于读取 gradle_profile 等执行配置")
     return parser.parse_args()
 
 
@@ -104,11 +113,15 @@ def main():
     check_file(project_path, "项目目录", logger)
     check_file(config_path, "构建配置文件", logger)
 
+    build_params = load_build_params(Path(args.build_params) if args.build_params else None, logger)
+    init_resource_monitor(build_params)
+
     # 执行构建
     build_with_cocos_creator(creator_path, project_path, config_path, logger)
 
     # 打包 APK
-    build_apk_with_gradle(build_dir, gradlew_path, args.mode, logger)
+    build_apk_with_gradle(build_dir, gradlew_path, args.mode, logger, get_gradle_profile(build_params))
+    log_resource_summary()
 
     apk_dir = project_path / "build" / "outputs" / "apk"
     logger.info(f"APK 存放目录: {apk_dir}")
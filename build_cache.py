@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+from build_utils import file_lock, format_size, log_pipeline_step
+
+# 计算文件哈希时每次读取的块大小
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_file(file_path):
+    """分块计算文件的 SHA-256"""
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def iter_tree_files(root, exclude=()):
+    """按稳定顺序遍历目录下的文件，返回 (相对路径, 绝对路径)；exclude 为相对路径列表"""
+    exclude = {path.replace("\\", "/").strip("/") for path in exclude}
+    for current_dir, dirs, files in os.walk(root):
+        rel_dir = os.path.relpath(current_dir, root).replace("\\", "/")
+        rel_dir = "" if rel_dir == "." else rel_dir + "/"
+        dirs[:] = sorted(d for d in dirs if rel_dir + d not in exclude)
+        for name in sorted(files):
+            if rel_dir + name not in exclude:
+                yield rel_dir + name, os.path.join(current_dir, name)
+
+class FileHashMemo:
+    """按 (大小, 修改时间) 记忆文件哈希，避免每次构建重复读取未变化的资源"""
+
+    def __init__(self, memo_path):
+        self.memo_path = memo_path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(memo_path):
+            try:
+                with open(memo_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get_hash(self, file_path):
+        stat = os.stat(file_path)
+        key = os.path.abspath(file_path)
+        cached = self.entries.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hash_file(file_path)
+        self.entries[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        self.dirty = True
+        return digest
+
+    def save(self):
+        """与其他进程同时写入的记录合并后保存"""
+        if not self.dirty:
+            return
+        with file_lock(self.memo_path + ".lock"):
+            entries = {}
+            if os.path.exists(self.memo_path):
+                try:
+                    with open(self.memo_path, 'r', encoding='utf-8') as f:
+                        entries = json.load(f)
+                except (OSError, ValueError):
+                    entries = {}
+            entries.update(self.entries)
+            tmp_path = f"{self.memo_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.memo_path)
+            self.entries = entries
+        self.dirty = False
+
+def get_creator_version(creator_path):
+    """从 Creator 安装路径中解析版本号，解析不到时用可执行文件的大小与修改时间代替"""
+    match = re.search(r"(\d+\.\d+\.\d+)", creator_path.replace("\\", "/"))
+    if match:
+        return match.group(1)
+    if os.path.exists(creator_path):
+        stat = os.stat(creator_path)
+        return f"{stat.st_size}-{int(stat.st_mtime)}"
+    return "unknown"
+
+def compute_fingerprint(project_path, input_dirs, extra_files=(), extra_values=(), memo=None):
+    """根据输入目录、额外文件内容与额外取值计算构建指纹"""
+    hasher = hashlib.sha256()
+    for value in extra_values:
+        hasher.update(f"value:{value}\n".encode('utf-8'))
+
+    for extra_file in extra_files:
+        digest = "missing"
+        if os.path.isfile(extra_file):
+            digest = memo.get_hash(extra_file) if memo else hash_file(extra_file)
+        hasher.update(f"file:{os.path.basename(extra_file)}:{digest}\n".encode('utf-8'))
+
+    for input_dir in input_dirs:
+        dir_path = os.path.join(project_path, input_dir)
+        if not os.path.isdir(dir_path):
+            hasher.update(f"dir:{input_dir}:missing\n".encode('utf-8'))
+            continue
+        for rel_path, file_path in iter_tree_files(dir_path):
+            digest = memo.get_hash(file_path) if memo else hash_file(file_path)
+            hasher.update(f"{input_dir}/{rel_path}:{digest}\n".encode('utf-8'))
+
+    return hasher.hexdigest()
+
+def clear_tree(root, exclude=()):
+    """删除目录下除 exclude（相对路径）以外的全部内容"""
+    if not os.path.isdir(root):
+        return
+    exclude = {path.replace("\\", "/").strip("/") for path in exclude}
+    # 需要保留的路径的所有上级目录也不能整体删除
+    protected_parents = set()
+    for path in exclude:
+        parts = path.split("/")
+        for i in range(1, len(parts)):
+            protected_parents.add("/".join(parts[:i]))
+
+    def _clear(current_dir, rel_dir):
+        for name in os.listdir(current_dir):
+            rel_path = rel_dir + name
+            full_path = os.path.join(current_dir, name)
+            if rel_path in exclude:
+                continue
+            if rel_path in protected_parents and os.path.isdir(full_path):
+                _clear(full_path, rel_path + "/")
+            elif os.path.isdir(full_path) and not os.path.islink(full_path):
+                shutil.rmtree(full_path)
+            else:
+                os.remove(full_path)
+
+    _clear(root, "")
+
+class CacheStore:
+    """本地目录缓存：按指纹保存目录快照，超过容量上限时按最近最少使用淘汰。
+
+    矩阵构建的多个变体会并发使用同一缓存目录，读写条目与索引都在文件锁内进行，
+    索引每次修改前重新读取，不会覆盖其他进程写入的条目。
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.entries_dir = os.path.join(root, "entries")
+        self.index_path = os.path.join(root, "index.json")
+        self.lock_path = os.path.join(root, "index.lock")
+        os.makedirs(self.entries_dir, exist_ok=True)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                index.setdefault("entries", {})
+                index.setdefault("stats", {"hits": 0, "misses": 0})
+                return index
+            except (OSError, ValueError):
+                log_pipeline_step(f"[WARNING] 缓存索引损坏，将重新建立: {self.index_path}")
+        return {"entries": {}, "stats": {"hits": 0, "misses": 0}}
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _entry_path(self, key):
+        return os.path.join(self.entries_dir, key)
+
+    @property
+    def stats(self):
+        return self.index["stats"]
+
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self.index["entries"].values())
+
+    def get(self, key, dest_dir, keep=()):
+        """命中时把缓存内容恢复到 dest_dir（保留 keep 中的路径），返回是否命中"""
+        with file_lock(self.lock_path):
+            self.index = self._load_index()
+            entry = self.index["entries"].get(key)
+            entry_path = self._entry_path(key)
+            if entry is None or not os.path.isdir(entry_path):
+                self.index["entries"].pop(key, None)
+                self.stats["misses"] += 1
+                self._save_index()
+                return False
+
+            # 复制期间持有锁，避免条目被其他进程替换或淘汰
+            clear_tree(dest_dir, keep)
+            shutil.copytree(entry_path, dest_dir, dirs_exist_ok=True)
+            entry["last_used"] = time.time()
+            self.stats["hits"] += 1
+            self._save_index()
+            return True
+
+    def put(self, key, src_dir, exclude=()):
+        """把 src_dir（排除 exclude 中的相对路径）保存为 key 对应的缓存条目"""
+        entry_path = self._entry_path(key)
+        # 每个进程使用独立的临时目录，复制在锁外进行
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+
+        size = 0
+        for rel_path, file_path in iter_tree_files(src_dir, exclude):
+            target = os.path.join(tmp_path, rel_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(file_path, target)
+            size += os.path.getsize(target)
+
+        if size > self.max_bytes:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            log_pipeline_step(f"[WARNING] 缓存内容 {format_size(size)} 超过容量上限，不写入缓存")
+            return False
+
+        with file_lock(self.lock_path):
+            self.index = self._load_index()
+            if os.path.exists(entry_path):
+                shutil.rmtree(entry_path)
+            os.replace(tmp_path, entry_path)
+            now = time.time()
+            self.index["entries"][key] = {"size": size, "created": now, "last_used": now}
+            self._evict()
+            self._save_index()
+        return True
+
+    def _evict(self):
+        """按 last_used 从旧到新淘汰，直到总大小不超过上限"""
+        entries = self.index["entries"]
+        total = self.total_bytes()
+        for key in sorted(entries, key=lambda k: entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]["size"]
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+            del entries[key]
+            log_pipeline_step(f"缓存淘汰: {key[:12]}")
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import urllib.error
+import urllib.request
+
+from build_daemon import get_daemon_config
+from build_utils import SCRIPT_DIR, log_pipeline_step
+
+def submit_build(server, params, stages, commit):
+    body = json.dumps({
+        "params": params,
+        "stages": stages,
+        "commit": commit,
+        "build_tag": os.environ.get("BUILD_TAG"),
+    }).encode('utf-8')
+    request = urllib.request.Request(
+        f"{server}/builds", data=body, headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+def follow_log(server, job_id):
+    """逐块输出任务日志，直到任务结束"""
+    stdout = sys.stdout.buffer
+    with urllib.request.urlopen(f"{server}/builds/{job_id}/log") as response:
+        while True:
+            chunk = response.read1(64 * 1024) if hasattr(response, "read1") else response.read(64 * 1024)
+            if not chunk:
+                break
+            stdout.write(chunk)
+            stdout.flush()
+
+def get_job(server, job_id):
+    with urllib.request.urlopen(f"{server}/builds/{job_id}", timeout=10) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+def run_local(params_path, stages, commit=None):
+    """构建服务不可用时在本机直接执行流水线"""
+    command = [sys.executable, os.path.join(SCRIPT_DIR, "pipeline.py"), "--params", params_path]
+    if stages:
+        command += ["--stages", stages]
+    if commit:
+        command += ["--commit", commit]
+    return subprocess.call(command, cwd=SCRIPT_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description="向常驻构建服务提交构建，服务不可用时在本机执行")
+    parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    parser.add_argument("--stages", default=None, help="要执行的阶段，逗号分隔 (默认全部)")
+    parser.add_argument("--commit", default=None,
+                        help="要构建的游戏工程提交：git_update 切换到该提交，同一提交的重复请求合并为一次构建")
+    parser.add_argument("--server", default=None, help="构建服务地址，默认按参数文件中的 build_daemon 配置")
+    parser.add_argument("--no-fallback", action="store_true", help="服务不可用时不在本机执行")
+    args = parser.parse_args()
+
+    params_path = os.path.abspath(args.params)
+    try:
+        with open(params_path, 'r', encoding='utf-8') as f:
+            params = json.load(f)
+    except Exception as e:
+        log_pipeline_step(f"[ERROR] 读取构建参数失败: {e}")
+        return 1
+
+    config = get_daemon_config(params)
+    server = (args.server or f"http://{config['host']}:{config['port']}").rstrip("/")
+    try:
+        job = submit_build(server, params, args.stages, args.commit)
+    except (urllib.error.URLError, OSError) as e:
+        if args.no_fallback:
+            log_pipeline_step(f"[ERROR] 无法连接构建服务 {server}: {e}")
+            return 1
+        log_pipeline_step(f"构建服务 {server} 不可用 ({e})，在本机执行")
+        return run_local(params_path, args.stages, args.commit)
+
+    note = f"，已合并到进行中的任务 (请求数: {job['requests']})" if job.get("coalesced") else ""
+    log_pipeline_step(f"构建任务 {job['id']} 状态: {job['status']}{note}")
+    follow_log(server, job["id"])
+
+    job = get_job(server, job["id"])
+    log_pipeline_step(f"构建任务 {job['id']} 结束: {job['status']}，返回码: {job['return_code']}")
+    return 0 if job["return_code"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
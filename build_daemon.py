@@ -0,0 +1,308 @@
+import argparse
+import hashlib
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from build_utils import SCRIPT_DIR, get_cache_dir, log_pipeline_step
+from gradle_utils import get_gradle_profile, warm_up_gradle
+from process_stream import CallbackSink, FileSink, stream_process
+from stage_retry import get_watchdog_config
+
+# 构建服务配置的默认值，可通过 build_params.json 的 build_daemon 覆盖
+DEFAULT_DAEMON_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "warm_interval": 1800,  # 空闲超过该秒数时重新预热 Gradle 守护进程，0 表示不预热
+    "keep_jobs": 50,        # 内存中保留的历史任务数
+}
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# git_update 拉取（并按需切换提交）后输出的实际构建提交
+HEAD_PATTERN = re.compile(r"当前提交: ([0-9a-f]{40})")
+
+def get_daemon_config(params):
+    config = dict(DEFAULT_DAEMON_CONFIG)
+    config.update((params or {}).get("build_daemon", {}))
+    return config
+
+def get_request_key(params, stages, commit):
+    """相同参数、阶段与提交的请求合并为同一次构建"""
+    payload = json.dumps({"params": params, "stages": stages, "commit": commit}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class BuildJob:
+    def __init__(self, job_id, key, params, stages, commit, build_tag, job_dir):
+        self.job_id = job_id
+        self.key = key
+        self.params = params
+        self.stages = stages
+        self.commit = commit
+        self.build_tag = build_tag
+        self.job_dir = job_dir
+        self.log_path = os.path.join(job_dir, "build.log")
+        self.status = JOB_QUEUED
+        # 从日志中解析的实际构建提交，git_update 完成前为 None
+        self.head = None
+        self.return_code = None
+        self.requests = 1
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # 有新日志或状态变化时通知正在跟随日志的客户端
+        self.changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def on_line(self, line):
+        if self.head is None:
+            match = HEAD_PATTERN.search(line)
+            if match:
+                self.head = match.group(1)
+        self.notify()
+
+    def notify(self, *_):
+        with self.changed:
+            self.changed.notify_all()
+
+    def to_dict(self):
+        return {
+            "id": self.job_id,
+            "status": self.status,
+            "return_code": self.return_code,
+            "stages": self.stages,
+            "commit": self.commit,
+            "head": self.head,
+            "requests": self.requests,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "log": self.log_path,
+        }
+
+class BuildDaemon:
+    """常驻构建服务：请求排队依次执行，相同请求合并到同一次构建"""
+
+    def __init__(self, params, config):
+        self.params = params
+        self.config = config
+        self.jobs_dir = get_cache_dir(params, "daemon", "jobs")
+        self.jobs = {}
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._last_build = time.time()
+
+    def submit(self, params, stages=None, commit=None, build_tag=None):
+        """提交构建请求，返回 (任务, 是否合并到已有任务)"""
+        key = get_request_key(params, stages, commit)
+        with self._lock:
+            for job in self.jobs.values():
+                if job.key != key or job.done:
+                    continue
+                # 排队中的任务尚未拉取代码，与新请求构建同一提交；运行中的任务只有实际构建的提交
+                # 已确定且与请求的提交一致时才能合并
+                if job.status == JOB_QUEUED or (commit and job.head and job.head.startswith(commit)):
+                    job.requests += 1
+                    return job, True
+
+            self._counter += 1
+            job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{self._counter}"
+            job_dir = os.path.join(self.jobs_dir, job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            job = BuildJob(job_id, key, params, stages, commit, build_tag, job_dir)
+            self.jobs[job_id] = job
+            self._prune_jobs()
+        self.queue.put(job)
+        return job, False
+
+    def _prune_jobs(self):
+        finished = [job for job in self.jobs.values() if job.done]
+        for job in sorted(finished, key=lambda j: j.created)[:max(len(self.jobs) - int(self.config["keep_jobs"]), 0)]:
+            del self.jobs[job.job_id]
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def warm_up(self):
+        """预热 Gradle 守护进程，使下一次构建不必冷启动"""
+        project_path = self.params.get("project_path")
+        build_dir = os.path.join(project_path, "build", "android", "proj") if project_path else None
+        if not build_dir or not os.path.exists(build_dir):
+            return
+        profile = get_gradle_profile(self.params)
+        if not profile.get("daemon"):
+            return
+        try:
+            warm_up_gradle(build_dir, profile, get_watchdog_config(self.params, "gradle_warmup"))
+        except Exception as e:
+            log_pipeline_step(f"[WARNING] Gradle 预热失败: {e}")
+
+    def run_job(self, job):
+        params_path = os.path.join(job.job_dir, "build_params.json")
+        with open(params_path, 'w', encoding='utf-8') as f:
+            json.dump(job.params, f, ensure_ascii=False, indent=4)
+
+        command = [sys.executable, os.path.join(SCRIPT_DIR, "pipeline.py"), "--params", params_path]
+        if job.stages:
+            command += ["--stages", job.stages]
+        if job.commit:
+            # git_update 切换到请求的提交，而不是构建分支最新提交
+            command += ["--commit", job.commit]
+        env = dict(os.environ, PYTHONIOENCODING="utf-8")
+        if job.build_tag:
+            env["BUILD_TAG"] = job.build_tag
+
+        job.status = JOB_RUNNING
+        job.started = time.time()
+        log_pipeline_step(f"开始构建任务 {job.job_id} (合并请求数: {job.requests})")
+        try:
+            result = stream_process(
+                command, [FileSink(job.log_path, mode='w'), CallbackSink(job.on_line)],
+                cwd=SCRIPT_DIR, shell=False, env=env
+            )
+            job.return_code = result.return_code
+        except Exception as e:
+            log_pipeline_step(f"[ERROR] 构建任务 {job.job_id} 启动失败: {e}")
+            job.return_code = -1
+        job.finished = time.time()
+        job.status = JOB_SUCCEEDED if job.return_code == 0 else JOB_FAILED
+        job.notify()
+        status = "✅" if job.return_code == 0 else "❌"
+        log_pipeline_step(
+            f"构建任务 {job.job_id} 结束，返回码: {job.return_code}，耗时 {job.finished - job.started:.1f}s {status}"
+        )
+
+    def worker_loop(self):
+        """同一工作区只能串行构建：启动时的预热与空闲时按 warm_interval 的重新预热都在本线程执行，不与构建重叠"""
+        warm_interval = float(self.config.get("warm_interval") or 0)
+        if warm_interval:
+            self.warm_up()
+        while True:
+            try:
+                job = self.queue.get(timeout=warm_interval or None)
+            except queue.Empty:
+                self.warm_up()
+                continue
+            self.run_job(job)
+
+class BuildRequestHandler(BaseHTTPRequestHandler):
+    daemon = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/builds":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length).decode('utf-8'))
+            params = body["params"]
+            if not isinstance(params, dict) or not params.get("project_path"):
+                raise ValueError("params 缺少 project_path")
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {"error": f"无效的构建请求: {e}"})
+            return
+        job, coalesced = self.daemon.submit(params, body.get("stages"), body.get("commit"), body.get("build_tag"))
+        if coalesced:
+            log_pipeline_step(f"请求已合并到构建任务 {job.job_id} (合并请求数: {job.requests})")
+        self._send_json(202, dict(job.to_dict(), coalesced=coalesced))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["builds"]:
+            self._send_json(200, self.daemon.list_jobs())
+            return
+        job = self.daemon.get_job(parts[1]) if len(parts) >= 2 and parts[0] == "builds" else None
+        if job is None:
+            self._send_json(404, {"error": "not found"})
+        elif len(parts) == 2:
+            self._send_json(200, job.to_dict())
+        elif parts[2:] == ["log"]:
+            offset = int(parse_qs(url.query).get("offset", ["0"])[0])
+            self._stream_log(job, offset)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _stream_log(self, job, offset):
+        """跟随输出任务日志，直到任务结束"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.end_headers()
+        try:
+            while True:
+                finished = job.done
+                if os.path.exists(job.log_path):
+                    with open(job.log_path, 'rb') as f:
+                        f.seek(offset)
+                        data = f.read()
+                    if data:
+                        offset += len(data)
+                        self.wfile.write(data)
+                        self.wfile.flush()
+                # 任务结束后日志已全部写入，再读一次即可退出
+                if finished:
+                    break
+                with job.changed:
+                    job.changed.wait(timeout=1)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+def serve(params):
+    config = get_daemon_config(params)
+    daemon = BuildDaemon(params, config)
+    BuildRequestHandler.daemon = daemon
+    server = ThreadingHTTPServer((config["host"], int(config["port"])), BuildRequestHandler)
+    server.daemon_threads = True
+
+    threading.Thread(target=daemon.worker_loop, daemon=True).start()
+    log_pipeline_step(f"构建服务已启动: http://{config['host']}:{config['port']}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log_pipeline_step("构建服务停止")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    from build_modules import load_build_params
+
+    parser = argparse.ArgumentParser(description="常驻构建服务")
+    parser.add_argument("--params", default="build_params.json", help="服务配置与预热使用的构建参数文件")
+    parser.add_argument("--port", type=int, default=None, help="监听端口")
+    args = parser.parse_args()
+
+    params = load_build_params(args.params)
+    if not params:
+        sys.exit(1)
+    if args.port:
+        params.setdefault("build_daemon", {})["port"] = args.port
+    serve(params)
@@ -1,14 +1,63 @@
+import argparse
 import json
 import os
-import subprocess
 import sys
 import time
-import datetime
 
-def log_pipeline_step(message):
-    """输出带有管道格式的日志信息"""
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[PIPELINE] [{timestamp}] {message}")
+from apk_inspect import DEFAULT_TOP_ENTRIES, check_size_budgets, format_apk_report, inspect_apk
+from asset_optimize import get_asset_optimize_config, log_asset_optimize_stats, optimize_assets
+from artifact_store import get_artifact_store_config, open_artifact_store
+from build_cache import CacheStore, FileHashMemo, compute_fingerprint, get_creator_version
+from change_impact import analyze_impact, get_recorded_export, get_skip_decision, record_cocos_export
+from checkpoint import validate_checkpoint, write_checkpoint
+from compiler_cache import open_compiler_cache
+from build_trace import get_tracer, init_tracer, trace_span
+from build_utils import format_size, get_artifact_variant, get_cache_dir, log_pipeline_step
+from stage_retry import get_watchdog_config, log_watchdog_summary, run_with_retry
+from git_utils import checkout_commit, ensure_on_branch, get_head_commit, pull_updates, run_git
+from log_store import init_log_store
+from publish import get_publish_config, publish_artifacts
+from resource_monitor import init_resource_monitor, log_resource_summary
+from gradle_utils import (
+    GradleOutputParser,
+    get_android_outputs,
+    get_output_tasks,
+    format_gradle_command,
+    get_gradle_profile,
+    get_warmup_project_dir,
+    sync_warmup_project,
+    warm_up_gradle,
+    write_init_scripts,
+    write_task_report,
+)
+
+# 保留缓存模式下默认不清理的目录（相对项目路径）：
+# Cocos Creator 的导入缓存，Gradle/CMake 的中间产物，以及 Gradle 预热工程
+DEFAULT_CLEAN_KEEP_PATHS = [
+    "library",
+    "temp",
+    "build/android/proj/.gradle",
+    "build/android/proj/build",
+    "build/android/proj/app/build",
+    "build/android/proj/app/.cxx",
+    "build/gradle-warmup",
+]
+
+# 参与 Cocos 导出缓存指纹计算的项目目录：资源、项目设置、编辑器扩展与构建相关的编辑器配置
+DEFAULT_COCOS_CACHE_INPUTS = ["assets", "settings", "extensions", "profiles"]
+
+# 参与指纹计算的项目文件（构建配置文件之外），引擎模块、脚本编译选项等会影响导出结果
+DEFAULT_COCOS_CACHE_INPUT_FILES = ["package.json", "tsconfig.json"]
+
+# Cocos 导出缓存不保存的 Gradle/CMake 产物（相对 build/android）
+COCOS_CACHE_EXCLUDES = [
+    "proj/.gradle",
+    "proj/build",
+    "proj/app/build",
+    "proj/app/.cxx",
+]
+
+DEFAULT_COCOS_CACHE_MAX_MB = 20480
 
 def load_build_params(file_path='build_params.json'):
     """加载构建参数"""
@@ -35,10 +84,82 @@ def load_build_params(file_path='build_params.json'):
 
     return params
 
-def run_git_update():
+def get_path_stats(path):
+    """统计文件或目录下的文件数与总字节数"""
+    if os.path.isfile(path) or os.path.islink(path):
+        return 1, os.path.getsize(path) if os.path.isfile(path) else 0
+
+    file_count = 0
+    total_bytes = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            file_count += 1
+            if os.path.isfile(file_path) and not os.path.islink(file_path):
+                total_bytes += os.path.getsize(file_path)
+    return file_count, total_bytes
+
+def clean_workspace(project_path, params, log=log_pipeline_step):
+    """清理工作区未跟踪文件，clean_mode 为 keep_cache 时保留缓存目录；矩阵构建通过 log 给日志加上变体前缀"""
+    clean_mode = params.get("clean_mode", "full")
+    if clean_mode == "full":
+        keep_paths = []
+    elif clean_mode == "keep_cache":
+        keep_paths = params.get("clean_keep_paths", DEFAULT_CLEAN_KEEP_PATHS)
+    else:
+        log(f"[ERROR] 未知的清理模式: {clean_mode} (可选: full, keep_cache)")
+        return False
+
+    # 以 / 开头的排除规则只匹配项目根目录下的对应路径；-x 模式下 -e 规则依然生效
+    exclude_args = []
+    for keep_path in keep_paths:
+        exclude_args += ["-e", "/" + keep_path.replace("\\", "/").strip("/")]
+
+    # 先试运行统计将要删除的内容
+    dry_run_process = run_git(["-c", "core.quotepath=off", "clean", "-xdn"] + exclude_args, cwd=project_path)
+    if dry_run_process.returncode != 0:
+        log(f"[ERROR] git clean 试运行失败: {dry_run_process.stderr}")
+        return False
+
+    removed_files = 0
+    removed_bytes = 0
+    prefix = "Would remove "
+    for line in dry_run_process.stdout.splitlines():
+        if not line.startswith(prefix):
+            continue
+        file_count, total_bytes = get_path_stats(os.path.join(project_path, line[len(prefix):]))
+        removed_files += file_count
+        removed_bytes += total_bytes
+
+    kept_files = 0
+    kept_bytes = 0
+    for keep_path in keep_paths:
+        full_path = os.path.join(project_path, keep_path)
+        if os.path.exists(full_path):
+            file_count, total_bytes = get_path_stats(full_path)
+            kept_files += file_count
+            kept_bytes += total_bytes
+
+    if keep_paths:
+        log(f"执行git clean -xdf清理缓存文件，保留目录: {', '.join(keep_paths)}")
+    else:
+        log("执行git clean -xdf清理缓存文件...")
+    clean_process = run_git(["clean", "-xdfq"] + exclude_args, cwd=project_path)
+    if clean_process.returncode != 0:
+        log(f"[ERROR] git clean失败: {clean_process.stderr}")
+        return False
+
+    log(
+        f"git clean完成: 删除 {removed_files} 个文件 ({format_size(removed_bytes)})，"
+        f"保留 {kept_files} 个文件 ({format_size(kept_bytes)})"
+    )
+    return True
+
+def run_git_update(params=None):
     """执行Git更新操作"""
     log_pipeline_step("STAGE: Git操作 - 清理并更新代码")
-    params = load_build_params()
+    if params is None:
+        params = load_build_params()
     if not params:
         return False
         
@@ -51,28 +172,17 @@ def run_git_update():
     try:
         # 添加安全目录配置
         log_pipeline_step(f"配置Git安全目录: {project_path}")
-        safe_dir_process = subprocess.run(
-            ["git", "config", "--global", "--add", "safe.directory", project_path],
-            capture_output=True,
-            text=True
-        )
+        safe_dir_process = run_git(["config", "--global", "--add", "safe.directory", project_path])
         if safe_dir_process.returncode != 0:
             log_pipeline_step(f"[WARNING] 配置Git安全目录失败: {safe_dir_process.stderr}")
             log_pipeline_step("继续执行Git操作...")
         else:
             log_pipeline_step("Git安全目录配置完成")
         
-        # 切换到项目目录
-        log_pipeline_step(f"切换到项目目录: {project_path}")
-        os.chdir(project_path)
-        
+        # 各阶段在流水线的线程中执行，不切换进程的工作目录，git 命令一律指定 cwd
         # 使用git checkout .重置修改
-        log_pipeline_step("执行git checkout .重置修改...")
-        checkout_process = subprocess.run(
-            ["git", "checkout", "."],
-            capture_output=True,
-            text=True
-        )
+        log_pipeline_step(f"执行git checkout .重置修改: {project_path}")
+        checkout_process = run_git(["checkout", "."], cwd=project_path)
         if checkout_process.stdout.strip():
             log_pipeline_step(checkout_process.stdout)
         if checkout_process.returncode != 0:
@@ -81,35 +191,39 @@ def run_git_update():
         else:
             log_pipeline_step("git checkout完成")
             
-        # 清理缓存文件
-        log_pipeline_step("执行git clean -xdf清理缓存文件...")
-        clean_process = subprocess.run(
-            ["git", "clean", "-xdf"],
-            capture_output=True,
-            text=True
-        )
-        if clean_process.stdout.strip():
-            log_pipeline_step(clean_process.stdout)
-        if clean_process.returncode != 0:
-            log_pipeline_step(f"[ERROR] git clean失败: {clean_process.stderr}")
+        # 清理未跟踪文件（按配置保留缓存目录）
+        if not clean_workspace(project_path, params):
             return False
-        else:
-            log_pipeline_step("git clean完成")
         
-        # 执行git pull更新代码
+        # 记录更新前的 HEAD，供变更影响分析比较
+        try:
+            old_head = get_head_commit(project_path)
+        except RuntimeError:
+            old_head = None
+
+        # 执行git pull更新代码（按 git_fetch 配置使用本地镜像/部分克隆/浅拉取）
         log_pipeline_step("执行git pull更新代码...")
-        pull_process = subprocess.run(
-            ["git", "pull"],
-            capture_output=True,
-            text=True
-        )
-        if pull_process.stdout.strip():
-            log_pipeline_step(pull_process.stdout)
-        if pull_process.returncode != 0:
-            log_pipeline_step(f"[ERROR] git pull失败: {pull_process.stderr}")
+        if not ensure_on_branch(project_path) or not pull_updates(project_path, params):
             return False
         else:
             log_pipeline_step("git pull完成")
+
+        # 指定了提交时构建该提交，而不是分支最新提交
+        commit = params.get("commit")
+        if commit:
+            log_pipeline_step(f"切换到指定提交: {commit}")
+            if not checkout_commit(project_path, commit):
+                return False
+        head = get_head_commit(project_path)
+        if commit and not head.startswith(commit):
+            log_pipeline_step(f"[ERROR] 当前提交 {head} 与指定提交 {commit} 不一致")
+            return False
+        log_pipeline_step(f"当前提交: {head}")
+
+        try:
+            analyze_impact(params, old_head)
+        except Exception as e:
+            log_pipeline_step(f"[WARNING] 变更影响分析失败，后续阶段全部执行: {e}")
             
         log_pipeline_step("Git操作全部完成 ✅")
         return True
@@ -118,10 +232,66 @@ def run_git_update():
         log_pipeline_step(f"[ERROR] 执行Git命令失败: {e}")
         return False
 
-def run_cocos_build():
+def get_cocos_cache_store(params):
+    cache_root = get_cache_dir(params, "cocos")
+    max_bytes = int(params.get("cocos_cache_max_mb", DEFAULT_COCOS_CACHE_MAX_MB)) * 1024 * 1024
+    return CacheStore(os.path.join(cache_root, "store"), max_bytes)
+
+def open_cocos_cache(params):
+    """打开 Cocos 导出缓存并计算本次构建的输入指纹"""
+    project_path = params.get("project_path")
+    cache_root = get_cache_dir(params, "cocos")
+    store = get_cocos_cache_store(params)
+
+    memo = FileHashMemo(os.path.join(cache_root, "hash_memo.json"))
+    input_files = [params.get("config_path")] + params.get("cocos_cache_input_files", DEFAULT_COCOS_CACHE_INPUT_FILES)
+    with trace_span("cocos_fingerprint") as span:
+        fingerprint = compute_fingerprint(
+            project_path,
+            params.get("cocos_cache_inputs", DEFAULT_COCOS_CACHE_INPUTS),
+            extra_files=[os.path.join(project_path, path) for path in input_files],
+            extra_values=[f"creator={get_creator_version(params.get('creator_path'))}"],
+            memo=memo
+        )
+        memo.save()
+        span.set(fingerprint=fingerprint)
+    log_pipeline_step(f"计算 Cocos 导出指纹耗时: {span.duration:.2f}s")
+    return store, fingerprint
+
+def log_cocos_cache_stats(store):
+    """输出 Cocos 导出缓存的累计命中统计"""
+    stats = store.stats
+    log_pipeline_step(
+        f"Cocos 导出缓存统计: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次，"
+        f"占用 {format_size(store.total_bytes())} / {format_size(store.max_bytes)}"
+    )
+
+def restore_prior_export(params, decision):
+    """变更不影响导出时，从 Cocos 导出缓存恢复基准提交的导出结果，返回是否恢复"""
+    fingerprint = get_recorded_export(params, decision["base"])
+    if fingerprint is None or not params.get("cocos_cache", True):
+        log_pipeline_step(f"没有 {decision['base'][:12]} 的导出缓存记录，执行 Creator 构建")
+        return False
+    android_dir = os.path.join(params.get("project_path"), "build", "android")
+    try:
+        with trace_span("cocos_cache_restore", reason="impact") as span:
+            restored = get_cocos_cache_store(params).get(fingerprint, android_dir, keep=COCOS_CACHE_EXCLUDES)
+            span.set(hit=restored)
+    except Exception as e:
+        log_pipeline_step(f"[WARNING] 恢复导出结果失败: {e}")
+        return False
+    if not restored:
+        log_pipeline_step(f"导出缓存中已没有 {fingerprint[:12]}，执行 Creator 构建")
+        return False
+    record_cocos_export(params, fingerprint)
+    log_pipeline_step(f"跳过 Creator 构建（{decision['reason']}），复用 {decision['base'][:12]} 的导出结果 ✅")
+    return True
+
+def run_cocos_build(params=None):
     """执行Cocos Creator构建操作"""
     log_pipeline_step("STAGE: Cocos 工程生成")
-    params = load_build_params()
+    if params is None:
+        params = load_build_params()
     if not params:
         return False
         
@@ -137,33 +307,51 @@ def run_cocos_build():
         log_pipeline_step(f"[ERROR] 项目路径不存在: {project_path}")
         return False
     
+    # 本次变更不影响导出时复用上次的导出结果
+    skip_decision = get_skip_decision(params, "cocos_build")
+    if skip_decision and restore_prior_export(params, skip_decision):
+        return True
+
+    # 输入未变化时直接从缓存恢复导出结果，跳过 Creator
+    cocos_cache = None
+    fingerprint = None
+    android_dir = os.path.join(project_path, "build", "android")
+    if params.get("cocos_cache", True):
+        try:
+            cocos_cache, fingerprint = open_cocos_cache(params)
+            with trace_span("cocos_cache_restore") as span:
+                cache_hit = cocos_cache.get(fingerprint, android_dir, keep=COCOS_CACHE_EXCLUDES)
+                span.set(hit=cache_hit)
+            if cache_hit:
+                log_pipeline_step(f"Cocos 导出缓存命中: {fingerprint[:12]}，跳过 Creator 构建")
+                log_cocos_cache_stats(cocos_cache)
+                record_cocos_export(params, fingerprint)
+                log_pipeline_step("Cocos 工程生成完成 ✅")
+                return True
+            log_pipeline_step(f"Cocos 导出缓存未命中: {fingerprint[:12]}")
+            log_cocos_cache_stats(cocos_cache)
+        except Exception as e:
+            log_pipeline_step(f"[WARNING] Cocos 导出缓存不可用: {e}")
+            cocos_cache = None
+
     try:
         # 构建命令
         log_pipeline_step("执行Cocos Creator构建...")
         command = f'"{creator_path}" --project "{project_path}" --build "configPath={project_path}/{config_file}"'
         log_pipeline_step(f"执行命令: {command}")
         
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            shell=True
-        )
-        
-        # 实时输出日志
-        for line in iter(process.stdout.readline, b''):
-            try:
-                decoded_line = line.decode('utf-8').strip()
-            except UnicodeDecodeError:
-                decoded_line = line.decode('gbk', errors='replace').strip()
-            
-            if decoded_line:
-                print(f"[COCOS] {decoded_line}")
-        
-        # 等待进程完成
-        return_code = process.wait()
+        # 实时输出日志并等待进程完成
+        with trace_span("cocos_export", config_path=config_file, creator_path=creator_path) as span:
+            outcome = run_with_retry("cocos_export", command, "[COCOS]", get_watchdog_config(params, "cocos_export"))
+            return_code = outcome.return_code
+            span.set(exit_code=return_code, success=outcome.success, attempts=outcome.attempts,
+                     killed=outcome.killed)
         
-        if return_code == 0 or return_code == 36:  # Cocos Creator有时返回36但实际构建成功
+        if outcome.success:  # 成功返回码（含 Creator 的 36）由 watchdog.cocos_export.success_exit_codes 配置
+            if cocos_cache is not None and os.path.isdir(android_dir):
+                if cocos_cache.put(fingerprint, android_dir, exclude=COCOS_CACHE_EXCLUDES):
+                    log_pipeline_step(f"Cocos 导出结果已写入缓存: {fingerprint[:12]}")
+                    record_cocos_export(params, fingerprint)
             log_pipeline_step("Cocos 工程生成完成 ✅")
             return True
         else:
@@ -174,10 +362,55 @@ def run_cocos_build():
         log_pipeline_step(f"[ERROR] 执行Cocos构建命令失败: {e}")
         return False
 
-def run_apk_build():
+def run_asset_optimize(params=None):
+    """Cocos 导出前用多进程预优化资源（asset_optimize.enabled 开启时执行）。
+    位于导出之前的关键路径上，与 Gradle 预热同时进行"""
+    log_pipeline_step("STAGE: 资源预优化")
+    if params is None:
+        params = load_build_params()
+    if not params:
+        return False
+
+    if not get_asset_optimize_config(params).get("enabled"):
+        log_pipeline_step("资源预优化未启用，跳过")
+        return True
+
+    try:
+        with trace_span("asset_optimize") as span:
+            stats = optimize_assets(params)
+            span.set(files=stats.files, cache_hits=stats.cache_hits, optimized=stats.optimized,
+                     bytes_saved=stats.bytes_before - stats.bytes_after)
+        log_asset_optimize_stats(stats)
+        log_pipeline_step("资源预优化完成 ✅")
+        return True
+    except Exception as e:
+        log_pipeline_step(f"[ERROR] 资源预优化失败: {e}")
+        return False
+
+def run_gradle_warmup(params=None):
+    """在预热工程中启动Gradle守护进程并完成配置阶段，与资源预优化、Cocos工程生成同时执行。
+    导出过程会重新生成 build/android/proj，因此不在其中预热"""
+    log_pipeline_step("STAGE: Gradle 预热")
+    if params is None:
+        params = load_build_params()
+    if not params:
+        return False
+
+    warmup_dir = get_warmup_project_dir(params.get("project_path"))
+    if not os.path.isdir(warmup_dir):
+        log_pipeline_step("Gradle 预热跳过: 还没有预热工程（首次构建或 full 清理后），由正式构建启动守护进程")
+        return True
+    try:
+        return warm_up_gradle(warmup_dir, get_gradle_profile(params), get_watchdog_config(params, "gradle_warmup"))
+    except Exception as e:
+        log_pipeline_step(f"[WARNING] Gradle 预热失败: {e}")
+        return True
+
+def run_apk_build(params=None):
     """执行APK打包操作"""
     log_pipeline_step("STAGE: APK 打包生成")
-    params = load_build_params()
+    if params is None:
+        params = load_build_params()
     if not params:
         return False
         
@@ -190,41 +423,72 @@ def run_apk_build():
         log_pipeline_step(f"[ERROR] Android构建目录不存在: {build_dir}")
         log_pipeline_step("请先执行Cocos工程生成步骤")
         return False
+
+    # 本次变更不影响打包时直接取回基准提交的APK（之后的 verify_build 会按当前提交重新入库）
+    skip_decision = get_skip_decision(params, "apk_build")
+    if skip_decision:
+        log_pipeline_step(f"变更不影响打包: {skip_decision['reason']}")
+        if reuse_stored_apk(params, skip_decision["base"]):
+            return True
+
+    if get_artifact_store_config(params).get("reuse") and reuse_stored_apk(params):
+        return True
         
     try:
-        # 切换到构建目录
-        log_pipeline_step(f"切换到Android构建目录: {build_dir}")
-        os.chdir(build_dir)
-        
-        # 确定构建任务
-        task = "assembleRelease" if mode == "release" else "assembleDebug"
+        log_pipeline_step(f"Android构建目录: {build_dir}")
+
+        # 确定构建任务：APK（可按 ABI 拆分）与 AAB 在同一次 Gradle 调用中并行生成
+        android_outputs = get_android_outputs(params)
+        tasks = get_output_tasks(mode, android_outputs)
+        if not tasks:
+            log_pipeline_step("[ERROR] android_outputs 中 apk 与 bundle 均未开启")
+            return False
+        task = " ".join(tasks)
         log_pipeline_step(f"执行Gradle构建: {task}")
+        if android_outputs.get("abi_splits"):
+            log_pipeline_step(f"按 ABI 拆分APK: {', '.join(android_outputs['abi_splits'])}")
         
         # 执行Gradle构建
         gradle_cmd = "gradlew.bat" if os.name == "nt" else "./gradlew"
-        command = f"{gradle_cmd} {task}"
+        gradle_profile = get_gradle_profile(params)
+        init_scripts = write_init_scripts(params, gradle_profile)
+        compiler_cache = open_compiler_cache(params)
+        if compiler_cache:
+            init_scripts.append(compiler_cache.prepare())
+        command = format_gradle_command(gradle_cmd, tasks, gradle_profile, init_scripts)
+        log_pipeline_step(f"执行命令: {command}")
+        # 每次执行（含重试）使用新的解析器，统计只反映最后一次执行
+        gradle_parsers = []
+
+        def new_gradle_parser():
+            gradle_parsers.append(GradleOutputParser(gradle_profile))
+            return gradle_parsers[-1].feed
         
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            shell=True
-        )
+        # 实时输出日志并等待进程完成
+        with trace_span("gradle_build", task=task, command=command) as span:
+            outcome = run_with_retry("gradle_build", command, "[GRADLE]", get_watchdog_config(params, "gradle_build"),
+                                     line_handler_factory=new_gradle_parser, cwd=build_dir)
+            return_code = outcome.return_code
+            gradle_parser = gradle_parsers[-1]
+            span.set(exit_code=return_code, attempts=outcome.attempts, killed=outcome.killed,
+                     daemon_reused=gradle_parser.daemon_reused, cache_hit_ratio=gradle_parser.cache_hit_ratio)
+        gradle_parser.trace_phases(get_tracer(), span.start, span.end)
+        gradle_parser.log_summary()
+        if gradle_profile.get("task_report"):
+            if gradle_parser.tasks:
+                write_task_report(gradle_parser.tasks, get_cache_dir(params, "gradle", "reports", mode))
+            else:
+                log_pipeline_step("[WARNING] 未解析到任务耗时数据，跳过任务报告")
+        if compiler_cache:
+            native_ms = sum(t["duration_ms"] for t in gradle_parser.tasks if t["native"]) if gradle_parser.tasks else None
+            compiler_cache.report(native_ms)
         
-        # 实时输出日志
-        for line in iter(process.stdout.readline, b''):
+        if outcome.success:
+            # 构建成功的工程脚本作为下次构建的预热工程
             try:
-                decoded_line = line.decode('utf-8').strip()
-            except UnicodeDecodeError:
-                decoded_line = line.decode('gbk', errors='replace').strip()
-            
-            if decoded_line:
-                print(f"[GRADLE] {decoded_line}")
-        
-        # 等待进程完成
-        return_code = process.wait()
-        
-        if return_code == 0:
+                sync_warmup_project(build_dir, get_warmup_project_dir(project_path))
+            except OSError as e:
+                log_pipeline_step(f"[WARNING] 同步 Gradle 预热工程失败: {e}")
             log_pipeline_step("APK 打包生成完成 ✅")
             return True
         else:
@@ -235,39 +499,200 @@ def run_apk_build():
         log_pipeline_step(f"[ERROR] 执行APK打包命令失败: {e}")
         return False
 
-def verify_build():
+def get_apk_output_dir(project_path, mode):
+    """获取Gradle的APK输出目录"""
+    return os.path.join(project_path, "build", "android", "proj", "app", "build", "outputs", "apk", mode)
+
+def get_bundle_output_dir(project_path, mode):
+    """获取Gradle的AAB输出目录"""
+    return os.path.join(project_path, "build", "android", "proj", "app", "build", "outputs", "bundle", mode)
+
+def list_build_outputs(project_path, mode, android_outputs):
+    """列出本次构建的APK与AAB；APK 优先按 Android 插件写出的 output-metadata.json，避免把旧的拆分包算进来"""
+    artifacts = []
+    apk_dir = get_apk_output_dir(project_path, mode)
+    if android_outputs.get("apk", True) and os.path.isdir(apk_dir):
+        names = None
+        metadata_path = os.path.join(apk_dir, "output-metadata.json")
+        if os.path.exists(metadata_path):
+            try:
+                with open(metadata_path, 'r', encoding='utf-8') as f:
+                    names = [element["outputFile"] for element in json.load(f).get("elements", [])]
+            except (OSError, ValueError, KeyError):
+                names = None
+        if names is None:
+            names = sorted(f for f in os.listdir(apk_dir) if f.endswith('.apk'))
+        artifacts += [os.path.join(apk_dir, name) for name in names if os.path.exists(os.path.join(apk_dir, name))]
+    bundle_dir = get_bundle_output_dir(project_path, mode)
+    if android_outputs.get("bundle") and os.path.isdir(bundle_dir):
+        artifacts += [os.path.join(bundle_dir, f) for f in sorted(os.listdir(bundle_dir)) if f.endswith('.aab')]
+    return artifacts
+
+def find_missing_outputs(artifacts, android_outputs):
+    """按产物配置检查是否缺少 APK、各 ABI 的拆分包或 AAB"""
+    names = [os.path.basename(path) for path in artifacts]
+    apk_names = [name for name in names if name.endswith('.apk')]
+    missing = []
+    if android_outputs.get("apk", True):
+        if not apk_names:
+            missing.append("APK")
+        for abi in android_outputs.get("abi_splits") or []:
+            if apk_names and not any(abi in name for name in apk_names):
+                missing.append(f"{abi} APK")
+    if android_outputs.get("bundle") and not any(name.endswith('.aab') for name in names):
+        missing.append("AAB")
+    return missing
+
+def write_output_metadata(apk_dir, names):
+    """改写 output-metadata.json 的产物列表，保留 Android 插件写出的其他字段"""
+    metadata_path = os.path.join(apk_dir, "output-metadata.json")
+    metadata = {"version": 3, "artifactType": {"type": "APK", "kind": "Directory"}, "elementType": "File"}
+    if os.path.exists(metadata_path):
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            pass
+    element_type = "ONE_OF_MANY" if len(names) > 1 else "SINGLE"
+    metadata["elements"] = [{"type": element_type, "filters": [], "outputFile": name} for name in names]
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+
+def reuse_stored_apk(params, commit=None):
+    """指定提交（默认当前提交）与变体在产物仓库中已有APK时直接取回，返回是否取回"""
+    try:
+        commit = commit or get_head_commit(params.get("project_path"))
+        variant = get_artifact_variant(params)
+        mode = params.get("game_type", "release")
+        apk_dir = get_apk_output_dir(params.get("project_path"), mode)
+        files = open_artifact_store(params).fetch(commit, variant, apk_dir, link=False)
+        if files:
+            bundle_dir = get_bundle_output_dir(params.get("project_path"), mode)
+            for index, file_path in enumerate(files):
+                if file_path.endswith('.aab'):
+                    os.makedirs(bundle_dir, exist_ok=True)
+                    files[index] = os.path.join(bundle_dir, os.path.basename(file_path))
+                    os.replace(file_path, files[index])
+            # keep_cache 时目录中可能留有旧构建的拆分包，输出清单只列出取回的APK
+            write_output_metadata(apk_dir, [os.path.basename(f) for f in files if f.endswith('.apk')])
+    except Exception as e:
+        log_pipeline_step(f"[WARNING] 查询产物仓库失败: {e}")
+        return False
+    if not files:
+        log_pipeline_step(f"产物仓库中没有 {commit[:12]} / {variant} 的APK，执行打包")
+        return False
+    for file_path in files:
+        log_pipeline_step(f"已从产物仓库取回: {os.path.basename(file_path)}")
+    log_pipeline_step(f"复用 {commit[:12]} / {variant} 的已验证APK，跳过Gradle打包 ✅")
+    return True
+
+def store_artifacts(params, apk_paths, reports):
+    """把验证通过的APK/AAB存入产物仓库（按提交、变体与内容摘要索引）"""
+    try:
+        commit = get_head_commit(params.get("project_path"))
+        variant = get_artifact_variant(params)
+        store = open_artifact_store(params)
+        digests = {report["path"]: report["sha256"] for report in reports}
+        # 本次验证的产物为完整的一组，替换之前入库的同一提交与变体的产物
+        store.remove(commit, variant)
+        for apk_path in apk_paths:
+            metadata = {
+                "game_type": params.get("game_type", "release"),
+                "game_version": params.get("game_version"),
+                "config_path": params.get("config_path"),
+                "build_tag": os.environ.get("BUILD_TAG"),
+                "size": os.path.getsize(apk_path),
+            }
+            digest, deduplicated = store.ingest(apk_path, commit, variant, metadata, digests.get(apk_path))
+            note = "（内容已存在，已去重）" if deduplicated else ""
+            log_pipeline_step(f"产物入库: {os.path.basename(apk_path)} -> {digest[:12]}{note}")
+        stats = store.stats()
+        log_pipeline_step(
+            f"产物仓库: {stats['artifacts']} 个产物，{stats['commits']} 个提交，"
+            f"{stats['blobs']} 份内容，共 {format_size(stats['bytes'])}"
+        )
+    except Exception as e:
+        # 入库失败不影响构建结果
+        log_pipeline_step(f"[WARNING] 产物入库失败: {e}")
+
+def check_apk_report(report, params):
+    """输出APK检查结果，并按 apk_size_budgets（MB）与签名要求判断是否通过"""
+    for line in format_apk_report(report):
+        log_pipeline_step(line)
+
+    passed = True
+    for category, actual, limit in check_size_budgets(report, params.get("apk_size_budgets", {})):
+        log_pipeline_step(
+            f"[ERROR] {os.path.basename(report['path'])} 的 {category} 超出大小预算: "
+            f"{format_size(actual)} > {format_size(limit)}"
+        )
+        passed = False
+    if params.get("apk_require_signature", False) and not (report["signing_block"] or report["jar_signature"]):
+        log_pipeline_step(f"[ERROR] {os.path.basename(report['path'])} 未签名")
+        passed = False
+    return passed
+
+def verify_build(params=None):
     """验证构建结果"""
     log_pipeline_step("STAGE: 构建结果验证")
-    params = load_build_params()
+    if params is None:
+        params = load_build_params()
     if not params:
         return False
         
     project_path = params.get("project_path")
     mode = params.get("game_type", "release")
+    android_outputs = get_android_outputs(params)
     
     # 检查APK输出目录
-    apk_dir = os.path.join(project_path, "build", "android", "proj", "app", "build", "outputs", "apk", mode)
+    apk_dir = get_apk_output_dir(project_path, mode)
     log_pipeline_step(f"检查APK输出目录: {apk_dir}")
+    if android_outputs.get("bundle"):
+        log_pipeline_step(f"检查AAB输出目录: {get_bundle_output_dir(project_path, mode)}")
     
-    if not os.path.exists(apk_dir):
+    if android_outputs.get("apk", True) and not os.path.exists(apk_dir):
         log_pipeline_step(f"[ERROR] APK输出目录不存在: {apk_dir}")
         return False
         
     try:
-        # 列出目录下所有APK文件
-        apk_files = [f for f in os.listdir(apk_dir) if f.endswith('.apk')]
+        # 列出本次构建的全部产物（APK、各 ABI 拆分包与 AAB）
+        artifacts = list_build_outputs(project_path, mode, android_outputs)
+        missing = find_missing_outputs(artifacts, android_outputs)
         
-        if apk_files:
-            log_pipeline_step("找到以下APK文件:")
-            for apk in apk_files:
-                apk_path = os.path.join(apk_dir, apk)
-                size_mb = os.path.getsize(apk_path) / (1024 * 1024)
-                log_pipeline_step(f"  {apk} (大小: {size_mb:.2f} MB)")
-            
-            # 获取APK版本信息（如有需要可以添加）
+        if artifacts and not missing:
+            log_pipeline_step("找到以下构建产物:")
+            reports = []
+            verified = True
+            for apk_path in artifacts:
+                apk = os.path.basename(apk_path)
+                with trace_span("verify_apk", apk=apk) as span:
+                    size_mb = os.path.getsize(apk_path) / (1024 * 1024)
+                    log_pipeline_step(f"  {apk} (大小: {size_mb:.2f} MB)")
+                    if params.get("apk_deep_verify", True):
+                        report = inspect_apk(apk_path, int(params.get("apk_top_entries", DEFAULT_TOP_ENTRIES)))
+                        reports.append(report)
+                        if not check_apk_report(report, params):
+                            verified = False
+                    span.set(size_mb=round(size_mb, 2), exit_code=0 if verified else 1)
+
+            if reports:
+                report_path = os.path.join(get_cache_dir(params, "verify", mode), "apk_report.json")
+                with open(report_path, 'w', encoding='utf-8') as f:
+                    json.dump(reports, f, ensure_ascii=False, indent=2)
+                log_pipeline_step(f"APK检查报告: {report_path}")
+
+            if not verified:
+                log_pipeline_step("[ERROR] APK检查未通过 ❌")
+                return False
+
+            if get_artifact_store_config(params).get("enabled"):
+                store_artifacts(params, artifacts, reports)
             
             log_pipeline_step("构建验证成功 ✅")
             return True
+        elif missing:
+            log_pipeline_step(f"[ERROR] 缺少构建产物: {', '.join(missing)} ❌")
+            return False
         else:
             log_pipeline_step("[ERROR] 未找到APK文件 ❌")
             return False
@@ -276,28 +701,135 @@ def verify_build():
         log_pipeline_step(f"[ERROR] 验证构建结果失败: {e}")
         return False
 
+def run_publish(params=None):
+    """把验证通过的APK/AAB发布到 publish.destination（未配置时跳过）"""
+    log_pipeline_step("STAGE: 产物发布")
+    if params is None:
+        params = load_build_params()
+    if not params:
+        return False
+
+    if not get_publish_config(params).get("destination"):
+        log_pipeline_step("未配置 publish.destination，跳过发布")
+        return True
+
+    try:
+        artifacts = list_build_outputs(params.get("project_path"), params.get("game_type", "release"),
+                                       get_android_outputs(params))
+        if not artifacts:
+            log_pipeline_step("[ERROR] 没有可发布的产物 ❌")
+            return False
+        with trace_span("publish", artifacts=len(artifacts)) as span:
+            result = publish_artifacts(params, artifacts)
+            span.set(success=result)
+        if result:
+            log_pipeline_step("产物发布完成 ✅")
+        return result
+    except Exception as e:
+        log_pipeline_step(f"[ERROR] 发布产物失败: {e}")
+        return False
+
+# 写检查点的阶段及其依赖（Gradle 预热不产生输出，不记录检查点）
+CHECKPOINT_DEPS = {
+    "git_update": [],
+    "cocos_build": ["git_update"],
+    "apk_build": ["cocos_build"],
+    "verify_build": ["apk_build"],
+}
+
+def get_stage_outputs(action, params):
+    """各阶段用于计算输出指纹的 (目录, 排除路径) 列表"""
+    project_path = params.get("project_path")
+    if action == "cocos_build":
+        # Gradle 的构建目录由 apk_build 改写，不计入导出结果
+        return [(os.path.join(project_path, "build", "android"), COCOS_CACHE_EXCLUDES)]
+    if action in ("apk_build", "verify_build"):
+        mode = params.get("game_type", "release")
+        android_outputs = get_android_outputs(params)
+        outputs = []
+        if android_outputs.get("apk", True):
+            outputs.append((get_apk_output_dir(project_path, mode), ()))
+        if android_outputs.get("bundle"):
+            outputs.append((get_bundle_output_dir(project_path, mode), ()))
+        return outputs
+    return []
+
+def save_stage_checkpoint(action, params, duration):
+    """阶段成功后写检查点，失败只提示，不影响构建结果"""
+    if action not in CHECKPOINT_DEPS:
+        return
+    try:
+        commit = get_head_commit(params.get("project_path"))
+        write_checkpoint(params, action, commit, get_stage_outputs(action, params), duration, CHECKPOINT_DEPS[action])
+    except Exception as e:
+        log_pipeline_step(f"[WARNING] 写入 {action} 检查点失败: {e}")
+
+def check_stage_checkpoint(action, params):
+    """--resume 时判断阶段是否可以跳过"""
+    if action not in CHECKPOINT_DEPS:
+        return False
+    try:
+        commit = get_head_commit(params.get("project_path"))
+        valid, reason = validate_checkpoint(
+            params, action, commit, get_stage_outputs(action, params), CHECKPOINT_DEPS[action]
+        )
+    except Exception as e:
+        valid, reason = False, str(e)
+    if valid:
+        log_pipeline_step(f"跳过阶段 {action}: {reason}")
+    else:
+        log_pipeline_step(f"阶段 {action} 需要执行: {reason}")
+    return valid
+
+# 命令行可执行的构建阶段
+STAGE_ACTIONS = {
+    "git_update": run_git_update,
+    "asset_optimize": run_asset_optimize,
+    "cocos_build": run_cocos_build,
+    "gradle_warmup": run_gradle_warmup,
+    "apk_build": run_apk_build,
+    "verify_build": verify_build,
+    "publish": run_publish,
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="构建流水线阶段执行脚本")
+    parser.add_argument("action", nargs="?", help="要执行的操作: " + ", ".join(STAGE_ACTIONS))
+    parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    parser.add_argument("--resume", action="store_true",
+                        help="检查点有效（提交、参数与输出均未变化）时跳过该阶段")
+    return parser.parse_args()
+
 if __name__ == "__main__":
     # 命令行参数处理
-    if len(sys.argv) < 2:
-        log_pipeline_step("请指定要执行的操作: git_update, cocos_build, apk_build, verify_build")
+    args = parse_args()
+    if not args.action:
+        log_pipeline_step("请指定要执行的操作: " + ", ".join(STAGE_ACTIONS))
         sys.exit(1)
         
-    action = sys.argv[1]
-    result = False
+    action = args.action
+    if action not in STAGE_ACTIONS:
+        log_pipeline_step(f"未知操作: {action}")
+        sys.exit(1)
     
     start_time = time.time()
     
-    if action == "git_update":
-        result = run_git_update()
-    elif action == "cocos_build":
-        result = run_cocos_build()
-    elif action == "apk_build":
-        result = run_apk_build()
-    elif action == "verify_build":
-        result = verify_build()
-    else:
-        log_pipeline_step(f"未知操作: {action}")
-        sys.exit(1)
+    params = load_build_params(args.params)
+    result = False
+    if params and (args.resume or params.get("resume")) and check_stage_checkpoint(action, params):
+        result = True
+    elif params:
+        tracer = init_tracer(params, action)
+        init_log_store(params, tracer.run_id)
+        init_resource_monitor(params)
+        with tracer.span(action, category="stage") as span:
+            result = STAGE_ACTIONS[action](params)
+            span.set(exit_code=0 if result else 1)
+        if result:
+            save_stage_checkpoint(action, params, span.duration)
+        log_watchdog_summary()
+        log_resource_summary()
+        tracer.finish()
         
     end_time = time.time()
     duration = end_time - start_time
@@ -306,4 +838,4 @@ if __name__ == "__main__":
     log_pipeline_step(f"操作 {action} 完成，耗时: {duration_str}")
     
     if not result:
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,254 @@
+import contextlib
+import json
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+from build_utils import get_artifact_variant, get_cache_dir, log_pipeline_step
+
+# 追踪配置的默认值，可通过 build_params.json 的 trace 覆盖
+DEFAULT_TRACE_CONFIG = {
+    "enabled": True,
+    "dir": None,                   # 追踪文件与历史库目录，默认 .build_cache/trace
+    "regression_margin": 0.2,      # 比历史基线慢 20% 以上视为退化
+    "baseline_runs": 10,           # 基线取最近 N 次成功运行的中位数
+    "min_regression_seconds": 5.0, # 绝对差值小于此值时忽略，避免短步骤的抖动误报
+}
+
+# 参与退化检测的追踪类别
+REGRESSION_CATEGORIES = ("stage", "step", "git")
+
+class Span:
+    """一个时间区间，结束后写入 Tracer；args 中可记录退出码与关键参数"""
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = dict(args)
+        self.start = time.time()
+        self.end = None
+        self.tid = threading.get_ident()
+
+    def set(self, **kwargs):
+        self.args.update(kwargs)
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+    @property
+    def success(self):
+        """args 中显式给出 success 时以其为准，否则按退出码判断"""
+        if "success" in self.args:
+            return bool(self.args["success"])
+        return self.args.get("exit_code") in (None, 0)
+
+class Tracer:
+    """收集构建过程中的时间区间，输出 Chrome trace 格式并写入历史库。
+
+    variant 为构建变体（构建类型与配置，或矩阵变体名），历史基线只与同一变体比较；
+    subdir 不为空时追踪文件写入 runs/<run_id>/<subdir>/，矩阵的各变体共用 BUILD_TAG 时互不覆盖。
+    """
+
+    def __init__(self, run_id, label, config=None, trace_dir=None, variant=None, subdir=None):
+        self.run_id = run_id
+        self.label = label
+        self.variant = variant
+        self.subdir = subdir
+        self.config = config or dict(DEFAULT_TRACE_CONFIG, enabled=False)
+        self.trace_dir = trace_dir
+        self.spans = []
+        self.events = []
+        self.counters = []
+        self._lock = threading.Lock()
+        self._thread_ids = {}
+
+    @property
+    def enabled(self):
+        return bool(self.config.get("enabled")) and self.trace_dir is not None
+
+    def _tid(self, ident):
+        # Chrome trace 中用较小的线程编号更易读
+        return self._thread_ids.setdefault(ident, len(self._thread_ids) + 1)
+
+    @contextlib.contextmanager
+    def span(self, name, category="step", **args):
+        span = Span(name, category, args)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=str(e))
+            raise
+        finally:
+            span.end = time.time()
+            with self._lock:
+                self.spans.append(span)
+
+    def add_span(self, name, start, end, category="step", **args):
+        """记录事后解析得到的区间（如 Gradle 的配置/执行阶段）"""
+        span = Span(name, category, args)
+        span.start = start
+        span.end = end
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def instant(self, name, category="event", **args):
+        """记录瞬时事件（如重试、强制结束进程）"""
+        with self._lock:
+            self.events.append({"name": name, "cat": category, "ts": time.time(),
+                                "tid": threading.get_ident(), "args": args})
+
+    def counter(self, name, ts, **values):
+        """记录计数器采样（如进程树的 CPU/内存），在 trace 中显示为随时间变化的曲线"""
+        with self._lock:
+            self.counters.append({"name": name, "ts": ts, "args": values})
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        trace_events = [{
+            "name": "process_name", "ph": "M", "pid": pid,
+            "args": {"name": f"{self.label} ({self.run_id}{', ' + self.variant if self.variant else ''})"},
+        }]
+        for span in sorted(self.spans, key=lambda s: s.start):
+            trace_events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": int(span.start * 1e6),
+                "dur": int((span.end - span.start) * 1e6),
+                "pid": pid,
+                "tid": self._tid(span.tid),
+                "args": span.args,
+            })
+        for event in self.events:
+            trace_events.append({
+                "name": event["name"],
+                "cat": event["cat"],
+                "ph": "i",
+                "s": "p",
+                "ts": int(event["ts"] * 1e6),
+                "pid": pid,
+                "tid": self._tid(event["tid"]),
+                "args": event["args"],
+            })
+        for counter in self.counters:
+            trace_events.append({
+                "name": counter["name"],
+                "ph": "C",
+                "ts": int(counter["ts"] * 1e6),
+                "pid": pid,
+                "args": counter["args"],
+            })
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms",
+                "otherData": {"run_id": self.run_id, "label": self.label, "variant": self.variant}}
+
+    def write(self):
+        """写出 Chrome trace 文件（可在 chrome://tracing 或 Perfetto 中打开）"""
+        run_dir = os.path.join(self.trace_dir, "runs", self.run_id, *([self.subdir] if self.subdir else []))
+        os.makedirs(run_dir, exist_ok=True)
+        trace_path = os.path.join(run_dir, f"{self.label}.json")
+        with open(trace_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f, ensure_ascii=False)
+        return trace_path
+
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.trace_dir, "history.db"), timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS spans ("
+            " run_id TEXT, label TEXT, name TEXT, category TEXT,"
+            " start REAL, duration REAL, exit_code INTEGER, success INTEGER, args TEXT)"
+        )
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(spans)")]
+        if "variant" not in columns:
+            # 旧历史库没有变体列，这些记录不再参与基线
+            conn.execute("ALTER TABLE spans ADD COLUMN variant TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_name ON spans (name, start)")
+        return conn
+
+    def record_history(self):
+        """把本次的区间追加到历史库"""
+        rows = [
+            (self.run_id, self.label, span.name, span.category, span.start, span.duration,
+             span.args.get("exit_code"), int(span.success),
+             json.dumps(span.args, ensure_ascii=False, default=str), self.variant)
+            for span in self.spans
+        ]
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO spans (run_id, label, name, category, start, duration, exit_code, success, args, variant)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def check_regressions(self):
+        """与同一变体最近 N 次成功运行的中位数比较，返回退化的区间列表"""
+        margin = float(self.config.get("regression_margin", 0.2))
+        baseline_runs = int(self.config.get("baseline_runs", 10))
+        min_seconds = float(self.config.get("min_regression_seconds", 5.0))
+        regressions = []
+        with contextlib.closing(self._connect()) as conn:
+            for span in self.spans:
+                if span.category not in REGRESSION_CATEGORIES or not span.success:
+                    continue
+                history = [row[0] for row in conn.execute(
+                    "SELECT duration FROM spans WHERE name = ? AND category = ? AND variant IS ? AND run_id != ?"
+                    " AND success = 1 ORDER BY start DESC LIMIT ?",
+                    (span.name, span.category, self.variant, self.run_id, baseline_runs)
+                )]
+                if len(history) < 3:
+                    continue
+                baseline = statistics.median(history)
+                if baseline <= 0:
+                    continue
+                if span.duration > baseline * (1 + margin) and span.duration - baseline >= min_seconds:
+                    regressions.append((span.name, span.duration, baseline))
+        return regressions
+
+    def finish(self):
+        """写出追踪文件、记录历史并报告退化"""
+        if not self.enabled:
+            return
+        try:
+            trace_path = self.write()
+            log_pipeline_step(f"追踪文件: {trace_path}")
+            regressions = self.check_regressions()
+            self.record_history()
+        except Exception as e:
+            log_pipeline_step(f"[WARNING] 写入追踪数据失败: {e}")
+            return
+        for name, duration, baseline in regressions:
+            log_pipeline_step(
+                f"[WARNING] 耗时退化: {name} 本次 {duration:.1f}s，基线 {baseline:.1f}s "
+                f"(+{(duration / baseline - 1) * 100:.0f}%)"
+            )
+
+_tracer = None
+
+def get_run_id():
+    """同一次 Jenkins 构建的各个进程共用 BUILD_TAG，本地运行时按时间生成"""
+    return os.environ.get("BUILD_TAG") or time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+
+def init_tracer(params, label):
+    """按参数初始化全局 Tracer"""
+    global _tracer
+    config = dict(DEFAULT_TRACE_CONFIG)
+    config.update((params or {}).get("trace", {}))
+    trace_dir = None
+    if config.get("enabled"):
+        trace_dir = config.get("dir") or get_cache_dir(params, "trace")
+        os.makedirs(trace_dir, exist_ok=True)
+    _tracer = Tracer(get_run_id(), label, config, trace_dir,
+                     variant=get_artifact_variant(params or {}), subdir=(params or {}).get("variant"))
+    return _tracer
+
+def get_tracer():
+    """获取全局 Tracer；未初始化时返回只在内存中记录的 Tracer"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(get_run_id(), "default")
+    return _tracer
+
+def trace_span(name, category="step", **args):
+    return get_tracer().span(name, category, **args)
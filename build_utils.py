@@ -0,0 +1,57 @@
+import contextlib
+import datetime
+import os
+
+# 脚本所在目录，缓存与状态文件都放在这里，不受项目 git clean 影响
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_CACHE_DIR = os.path.join(SCRIPT_DIR, ".build_cache")
+
+def log_pipeline_step(message):
+    """输出带有管道格式的日志信息"""
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[PIPELINE] [{timestamp}] {message}")
+
+def get_cache_dir(params, *parts):
+    """获取缓存目录（可通过 cache_dir 参数覆盖），并确保目录存在"""
+    cache_dir = os.path.join(params.get("cache_dir", DEFAULT_CACHE_DIR), *parts)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def format_size(num_bytes):
+    """将字节数格式化为 MB 字符串"""
+    return f"{num_bytes / (1024 * 1024):.2f} MB"
+
+def get_artifact_variant(params):
+    """产物所属的变体：矩阵构建传入 variant，否则由构建类型与配置文件名组合"""
+    if params.get("variant"):
+        return params["variant"]
+    config_name = os.path.splitext(os.path.basename(params.get("config_path", "")))[0]
+    return f"{params.get('game_type', 'release')}-{config_name}"
+
+@contextlib.contextmanager
+def file_lock(lock_path):
+    """进程间互斥的文件锁（阻塞等待），用于多个构建进程共用的缓存与仓库"""
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    with open(lock_path, 'a+b') as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    # LK_LOCK 最多重试 10 秒后抛出异常，继续等待
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,176 @@
+import argparse
+import fnmatch
+import json
+import os
+import sys
+
+from build_utils import log_pipeline_step
+from checkpoint import get_checkpoint_dir, get_params_hash, load_checkpoint
+from git_utils import get_head_commit, run_git
+
+# 变更影响分析的默认配置，可通过 build_params.json 的 impact_analysis 覆盖
+DEFAULT_IMPACT_CONFIG = {
+    "enabled": True,
+    # 按顺序匹配，第一条匹配的规则决定该文件影响的阶段；路径为仓库内的相对路径（/ 分隔），* 可以跨目录
+    "rules": [
+        {"patterns": ["*.md", "docs/*", "LICENSE*", ".gitignore", ".gitattributes"], "stages": []},
+        # 原生与 Java 代码由 Gradle 直接从 native/ 引用，不需要重新导出
+        {"patterns": ["native/*"], "stages": ["apk_build"]},
+    ],
+    "default_stages": ["cocos_build", "apk_build"],  # 没有规则匹配的文件
+    "max_files_logged": 20,
+}
+
+# 参与影响分析的阶段，按执行顺序排列；前面的阶段重新执行时后面的阶段也必须重新执行
+IMPACT_STAGES = ["cocos_build", "apk_build"]
+
+DECISION_FILE = "impact.json"
+EXPORT_FILE = "cocos_export.json"
+
+def get_impact_config(params):
+    config = dict(DEFAULT_IMPACT_CONFIG)
+    config.update((params or {}).get("impact_analysis", {}))
+    return config
+
+def match_stages(path, config):
+    """返回单个变更文件影响的阶段"""
+    for rule in config["rules"]:
+        if any(fnmatch.fnmatchcase(path, pattern) for pattern in rule["patterns"]):
+            return list(rule["stages"])
+    return list(config["default_stages"])
+
+def list_changed_files(project_path, base, head):
+    """列出两个提交之间变更的文件；不跟踪重命名，使重命名前后的路径都参与匹配"""
+    process = run_git(["diff", "--name-only", "--no-renames", base, head], cwd=project_path)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip() or f"git diff 失败: {base[:12]}..{head[:12]}")
+    return [line for line in process.stdout.splitlines() if line]
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def decide_stage(params, stage, head, config, diff_cache):
+    """以阶段上次成功执行的提交为基准，判断本次变更是否影响该阶段"""
+    record = load_checkpoint(params, stage)
+    if record is None:
+        return {"run": True, "reason": "没有成功执行的记录"}
+    if record.get("params_hash") != get_params_hash(params):
+        return {"run": True, "reason": "构建参数已变化"}
+    base = record.get("commit")
+    decision = {"base": base}
+    if base == head:
+        return dict(decision, run=False, reason=f"提交未变化 ({head[:12]})", files=0)
+    if base not in diff_cache:
+        try:
+            diff_cache[base] = list_changed_files(params["project_path"], base, head)
+        except RuntimeError as e:
+            return dict(decision, run=True, reason=f"无法比较 {str(base)[:12]}..{head[:12]}: {e}")
+    changed = diff_cache[base]
+    affecting = [path for path in changed if stage in match_stages(path, config)]
+    decision["files"] = len(changed)
+    if affecting:
+        shown = ", ".join(affecting[:3]) + (" 等" if len(affecting) > 3 else "")
+        return dict(decision, run=True, reason=f"{len(affecting)}/{len(changed)} 个变更文件影响该阶段: {shown}")
+    return dict(decision, run=False, reason=f"{len(changed)} 个变更文件均不影响该阶段")
+
+def analyze_impact(params, old_head):
+    """git 更新后比较各阶段上次成功的提交与新 HEAD，记录哪些阶段可以复用之前的结果"""
+    config = get_impact_config(params)
+    path = os.path.join(get_checkpoint_dir(params), DECISION_FILE)
+    if not config.get("enabled"):
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+
+    project_path = params["project_path"]
+    head = get_head_commit(project_path)
+    if old_head and old_head != head:
+        try:
+            changed = list_changed_files(project_path, old_head, head)
+            log_pipeline_step(f"本次更新 {old_head[:12]} -> {head[:12]}，变更 {len(changed)} 个文件:")
+            limit = int(config["max_files_logged"])
+            for changed_path in changed[:limit]:
+                log_pipeline_step(f"  {changed_path} -> {', '.join(match_stages(changed_path, config)) or '不影响构建'}")
+            if len(changed) > limit:
+                log_pipeline_step(f"  ... 其余 {len(changed) - limit} 个文件省略")
+        except RuntimeError as e:
+            log_pipeline_step(f"[WARNING] 无法列出本次更新的变更: {e}")
+    elif old_head:
+        log_pipeline_step(f"本次更新没有新提交 ({head[:12]})")
+
+    stages = {}
+    diff_cache = {}
+    upstream_runs = None
+    for stage in IMPACT_STAGES:
+        decision = decide_stage(params, stage, head, config, diff_cache)
+        if not decision["run"] and upstream_runs:
+            decision.update(run=True, reason=f"上游阶段 {upstream_runs} 需要重新执行")
+        if decision["run"] and upstream_runs is None:
+            upstream_runs = stage
+        stages[stage] = decision
+        action = "执行" if decision["run"] else "复用之前的结果"
+        log_pipeline_step(f"变更影响分析: {stage} {action}，原因: {decision['reason']}")
+
+    _write_json(path, {"head": head, "params_hash": get_params_hash(params), "stages": stages})
+    return stages
+
+def get_skip_decision(params, stage):
+    """返回阶段可以跳过时的分析结果，否则返回 None；分析结果只对同一 HEAD 与参数有效"""
+    if not get_impact_config(params).get("enabled"):
+        return None
+    data = _read_json(os.path.join(get_checkpoint_dir(params), DECISION_FILE))
+    if not data or data.get("params_hash") != get_params_hash(params):
+        return None
+    decision = data.get("stages", {}).get(stage)
+    if not decision or decision.get("run", True):
+        return None
+    try:
+        if get_head_commit(params["project_path"]) != data.get("head"):
+            return None
+    except RuntimeError:
+        return None
+    return decision
+
+def record_cocos_export(params, fingerprint):
+    """记录当前提交使用的 Cocos 导出缓存条目，跳过导出时据此恢复"""
+    try:
+        commit = get_head_commit(params["project_path"])
+    except RuntimeError:
+        return
+    _write_json(os.path.join(get_checkpoint_dir(params), EXPORT_FILE), {"commit": commit, "fingerprint": fingerprint})
+
+def get_recorded_export(params, commit):
+    data = _read_json(os.path.join(get_checkpoint_dir(params), EXPORT_FILE))
+    if data and data.get("commit") == commit:
+        return data.get("fingerprint")
+    return None
+
+if __name__ == "__main__":
+    from build_modules import load_build_params
+
+    parser = argparse.ArgumentParser(description="变更影响分析：列出两个提交之间的变更文件及其影响的阶段")
+    parser.add_argument("base", help="基准提交")
+    parser.add_argument("head", nargs="?", default="HEAD", help="目标提交，默认 HEAD")
+    parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    args = parser.parse_args()
+
+    build_params = load_build_params(args.params)
+    if not build_params:
+        sys.exit(1)
+    impact_config = get_impact_config(build_params)
+    affected = set()
+    for changed_path in list_changed_files(build_params["project_path"], args.base, args.head):
+        stages = match_stages(changed_path, impact_config)
+        affected.update(stages)
+        print(f"{changed_path}\t{','.join(stages) or '-'}")
+    print(f"受影响的阶段: {', '.join(s for s in IMPACT_STAGES if s in affected) or '无'}")
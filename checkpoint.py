@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import time
+
+from build_cache import iter_tree_files
+from build_utils import get_cache_dir
+
+# 不影响构建结果的参数，不参与参数哈希
+CHECKPOINT_IGNORED_KEYS = (
+    "resume",
+    "commit",
+    "cache_dir",
+    "git_fetch",
+    "trace",
+    "log_store",
+    "resource_monitor",
+    "watchdog",
+    "build_daemon",
+    "distributed_build",
+    "compiler_cache",
+    "impact_analysis",
+    "artifact_store",
+    "publish",
+)
+
+def get_checkpoint_dir(params):
+    """每个工作区（含矩阵构建的工作树）使用独立的检查点目录"""
+    project_key = hashlib.sha1(os.path.abspath(params.get("project_path", "")).encode('utf-8')).hexdigest()[:12]
+    return get_cache_dir(params, "checkpoints", project_key)
+
+def get_params_hash(params):
+    relevant = {k: v for k, v in params.items() if k not in CHECKPOINT_IGNORED_KEYS}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def fingerprint_outputs(outputs):
+    """按 (相对路径, 大小, 修改时间) 计算输出目录的指纹；outputs 为 (目录, 排除路径) 列表，目录不存在时返回 None"""
+    hasher = hashlib.sha256()
+    for root, exclude in outputs:
+        if not os.path.isdir(root):
+            return None
+        hasher.update(f"{root}\n".encode('utf-8'))
+        for rel_path, file_path in iter_tree_files(root, exclude):
+            stat = os.stat(file_path)
+            hasher.update(f"{rel_path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode('utf-8'))
+    return hasher.hexdigest()
+
+def _checkpoint_path(params, name):
+    return os.path.join(get_checkpoint_dir(params), f"{name}.json")
+
+def load_checkpoint(params, name):
+    try:
+        with open(_checkpoint_path(params, name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_checkpoint(params, name, commit, outputs, duration, deps=()):
+    """阶段成功后记录提交、参数哈希、输出指纹、耗时与依赖阶段的检查点编号"""
+    record = {
+        "stage": name,
+        "commit": commit,
+        "params_hash": get_params_hash(params),
+        "output_fingerprint": fingerprint_outputs(outputs),
+        "duration": duration,
+        "finished": time.time(),
+        "deps": {dep: (load_checkpoint(params, dep) or {}).get("id") for dep in deps},
+    }
+    record["id"] = hashlib.sha256(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    path = _checkpoint_path(params, name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp_path, path)
+    return record
+
+def validate_checkpoint(params, name, commit, outputs, deps=()):
+    """校验检查点是否仍然有效，返回 (是否有效, 原因)"""
+    record = load_checkpoint(params, name)
+    if record is None:
+        return False, "没有检查点"
+    if record.get("commit") != commit:
+        return False, f"提交已变化 ({str(record.get('commit'))[:12]} -> {commit[:12]})"
+    if record.get("params_hash") != get_params_hash(params):
+        return False, "构建参数已变化"
+    fingerprint = fingerprint_outputs(outputs)
+    if fingerprint is None or record.get("output_fingerprint") != fingerprint:
+        return False, "输出已变化或不存在"
+    for dep in deps:
+        # 依赖阶段的检查点编号需与写入时一致（两者都不存在说明依赖阶段未单独执行过，视为一致）
+        if record.get("deps", {}).get(dep) != (load_checkpoint(params, dep) or {}).get("id"):
+            return False, f"依赖阶段 {dep} 已重新执行"
+    return True, f"检查点有效（{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['finished']))}，" \
+                 f"原耗时 {record['duration']:.1f}s）"
@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+from build_utils import get_cache_dir, log_pipeline_step
+
+# 原生编译缓存配置的默认值，可通过 build_params.json 的 compiler_cache 覆盖
+DEFAULT_COMPILER_CACHE_CONFIG = {
+    "enabled": True,
+    "path": None,          # ccache 可执行文件，默认从 PATH 查找
+    "dir": None,           # 缓存目录，默认 .build_cache/ccache（不在 git clean 的范围内）
+    "max_size": "20G",     # 缓存大小上限，超过后 ccache 自动淘汰最旧的条目
+    "compression": True,
+    # 工作区经过 git clean/checkout 后文件时间戳会变化，放宽检查以免误判为未命中
+    "sloppiness": "pch_defines,time_macros,include_file_mtime,include_file_ctime",
+}
+
+# 以 CMake 编译器启动器的方式接入 ccache 的 init script。与 abi_splits 相同，在 beforeProject 中注册
+# afterEvaluate，保证在 Android 插件锁定 DSL 之前追加 CMake 参数
+COMPILER_CACHE_INIT_SCRIPT = """\
+gradle.beforeProject { project ->
+    project.afterEvaluate {
+        if (!project.plugins.hasPlugin('com.android.application') && !project.plugins.hasPlugin('com.android.library')) {
+            return
+        }
+        def android = project.extensions.getByName('android')
+        android.defaultConfig.externalNativeBuild.cmake.arguments(
+            "-DCMAKE_C_COMPILER_LAUNCHER=%(launcher)s",
+            "-DCMAKE_CXX_COMPILER_LAUNCHER=%(launcher)s"
+        )
+    }
+}
+"""
+
+# ccache --print-stats 中的计数项（3.7 起支持该选项）
+HIT_KEYS = ("direct_cache_hit", "preprocessed_cache_hit")
+MISS_KEYS = ("cache_miss",)
+# 至少有这么多次未命中时才用本次的原生编译耗时更新每次编译的平均耗时
+MIN_MISSES_FOR_AVERAGE = 10
+STATS_FILE = "compiler_cache.json"
+
+def get_compiler_cache_config(params):
+    config = dict(DEFAULT_COMPILER_CACHE_CONFIG)
+    config.update((params or {}).get("compiler_cache", {}))
+    return config
+
+def get_ccache_dir(params, config):
+    if config.get("dir"):
+        os.makedirs(config["dir"], exist_ok=True)
+        return os.path.abspath(config["dir"])
+    return get_cache_dir(params, "ccache")
+
+def read_ccache_stats(ccache_path, env):
+    """读取 ccache 的累计计数，失败时返回 None"""
+    try:
+        result = subprocess.run([ccache_path, "--print-stats"], capture_output=True, text=True, env=env, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    stats = {}
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition("\t")
+        if value.strip().isdigit():
+            stats[key.strip()] = int(value)
+    return stats
+
+def count_stats(stats, keys):
+    return sum(stats.get(key, 0) for key in keys)
+
+class CompilerCache:
+    """为 Gradle 的 CMake 原生编译接入 ccache，并统计每次构建的命中情况"""
+
+    def __init__(self, params, config, ccache_path):
+        self.params = params
+        self.config = config
+        self.ccache_path = ccache_path
+        self.ccache_dir = get_ccache_dir(params, config)
+        self.stats_path = os.path.join(get_cache_dir(params, "gradle"), STATS_FILE)
+        self.before = None
+
+    def build_env(self):
+        env = {
+            "CCACHE_DIR": self.ccache_dir,
+            "CCACHE_MAXSIZE": str(self.config["max_size"]),
+            "CCACHE_SLOPPINESS": self.config["sloppiness"],
+            # 不同工作树（矩阵构建、分布式节点）的绝对路径不同，改写为相对路径后可以互相命中
+            "CCACHE_BASEDIR": os.path.abspath(self.params.get("project_path", ".")),
+            "CCACHE_NOHASHDIR": "1",
+            # NDK 升级或重新解压后 mtime 会变化，按编译器内容判断是否同一编译器
+            "CCACHE_COMPILERCHECK": "content",
+        }
+        env["CCACHE_COMPRESS" if self.config.get("compression") else "CCACHE_NOCOMPRESS"] = "1"
+        return env
+
+    def prepare(self):
+        """设置 ccache 环境变量（Gradle 守护进程会沿用客户端的环境）、写出 init script，并记录构建前的计数"""
+        project_path = os.path.abspath(self.params.get("project_path", "."))
+        if os.path.abspath(self.ccache_dir).startswith(project_path + os.sep):
+            log_pipeline_step(f"[WARNING] ccache 目录位于工程内，会被 git clean 删除: {self.ccache_dir}")
+        os.environ.update(self.build_env())
+        self.before = read_ccache_stats(self.ccache_path, os.environ)
+        script_path = os.path.join(get_cache_dir(self.params, "gradle"), "compiler_cache.gradle")
+        with open(script_path, 'w', encoding='utf-8') as f:
+            # CMake 参数中的反斜杠会被当作转义字符
+            f.write(COMPILER_CACHE_INIT_SCRIPT % {"launcher": self.ccache_path.replace("\\", "/")})
+        log_pipeline_step(f"原生编译缓存: {self.ccache_path}，目录 {self.ccache_dir}，上限 {self.config['max_size']}")
+        return script_path
+
+    def _load_history(self):
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def report(self, native_ms=None):
+        """输出本次构建的命中率与估算节省的编译时间；native_ms 为原生编译任务的耗时（未开启任务报告时为 None）。
+        并发构建共用同一缓存时计数包含其他构建"""
+        after = read_ccache_stats(self.ccache_path, os.environ)
+        if self.before is None or after is None:
+            log_pipeline_step("[WARNING] 无法读取 ccache 统计（需要 ccache 3.7 及以上版本）")
+            return None
+        hits = count_stats(after, HIT_KEYS) - count_stats(self.before, HIT_KEYS)
+        misses = count_stats(after, MISS_KEYS) - count_stats(self.before, MISS_KEYS)
+        total = hits + misses
+        if total == 0:
+            log_pipeline_step("原生编译缓存: 本次没有编译任何 C/C++ 文件")
+            return {"hits": 0, "misses": 0}
+
+        history = self._load_history()
+        # 本次未命中的次数足够多时，用原生任务耗时 / 未命中次数作为每次编译的平均耗时
+        if native_ms and misses >= MIN_MISSES_FOR_AVERAGE:
+            history["avg_compile_ms"] = native_ms / misses
+            with open(self.stats_path, 'w', encoding='utf-8') as f:
+                json.dump(history, f, indent=2)
+        summary = {"hits": hits, "misses": misses, "hit_ratio": hits / total,
+                   "cache_size_mb": after.get("cache_size_kibibyte", 0) / 1024}
+        message = (f"原生编译缓存: 命中 {hits}，未命中 {misses}，命中率 {summary['hit_ratio'] * 100:.1f}%，"
+                   f"缓存大小 {summary['cache_size_mb']:.0f} MB / {self.config['max_size']}")
+        if history.get("avg_compile_ms"):
+            summary["saved_seconds"] = hits * history["avg_compile_ms"] / 1000
+            message += f"，估算节省编译时间 {summary['saved_seconds']:.1f}s"
+        elif hits and native_ms is None:
+            message += "，开启 gradle_profile.task_report 后可估算节省的编译时间"
+        log_pipeline_step(message)
+        return summary
+
+def open_compiler_cache(params):
+    """按配置返回 CompilerCache；未开启或找不到 ccache 时返回 None"""
+    config = get_compiler_cache_config(params)
+    if not config.get("enabled"):
+        return None
+    ccache_path = config.get("path") or shutil.which("ccache")
+    if not ccache_path or not os.path.exists(ccache_path):
+        log_pipeline_step("[WARNING] 未找到 ccache，原生编译不使用编译缓存")
+        return None
+    return CompilerCache(params, config, os.path.abspath(ccache_path))
+
+if __name__ == "__main__":
+    from build_modules import load_build_params
+
+    parser = argparse.ArgumentParser(description="查看或清理原生编译缓存（ccache）")
+    parser.add_argument("action", choices=["stats", "clear"])
+    parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    args = parser.parse_args()
+
+    build_params = load_build_params(args.params)
+    if not build_params:
+        sys.exit(1)
+    cache = open_compiler_cache(build_params)
+    if cache is None:
+        sys.exit(1)
+    env = dict(os.environ, **cache.build_env())
+    command = [cache.ccache_path, "--show-stats" if args.action == "stats" else "--clear"]
+    sys.exit(subprocess.call(command, env=env))
@@ -0,0 +1,654 @@
+import argparse
+import base64
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+from build_modules import load_build_params
+from build_utils import SCRIPT_DIR, get_cache_dir, log_pipeline_step
+from matrix_build import (
+    MATRIX_ONLY_KEYS,
+    get_variant_name,
+    log_matrix_summary,
+    resolve_head,
+    run_variant,
+    safe_dir_name,
+)
+from process_stream import Sink
+
+# 分布式构建配置的默认值，可通过 build_params.json 的 distributed_build 覆盖
+DEFAULT_DISTRIBUTED_CONFIG = {
+    "host": "0.0.0.0",
+    "port": 8766,
+    "token": None,               # 共享口令，设置后工作节点连接时必须提供
+    "heartbeat_interval": 5,     # 工作节点发送心跳的间隔（秒）
+    "heartbeat_timeout": 30,     # 超过该秒数没有收到心跳即视为节点失联，任务重新分配
+    "max_attempts": 3,           # 每个变体最多分配的次数
+    "locality_wait": 30,         # 有缓存的节点忙碌时，任务最多等待该秒数再分配给没有缓存的节点
+    "worker_wait_timeout": 600,  # 有待分配任务但没有任何在线节点超过该秒数时放弃
+    "chunk_size": 1024 * 1024,   # 产物分块传输的大小
+    "echo_logs": False,          # 是否在协调者控制台输出各节点的构建日志
+}
+
+TASK_PENDING = "pending"
+TASK_RUNNING = "running"
+TASK_SUCCEEDED = "succeeded"
+TASK_FAILED = "failed"
+
+_print_lock = threading.Lock()
+
+def get_distributed_config(params):
+    config = dict(DEFAULT_DISTRIBUTED_CONFIG)
+    config.update((params or {}).get("distributed_build", {}))
+    return config
+
+def log_dist(message):
+    with _print_lock:
+        log_pipeline_step(message)
+
+class Connection:
+    """基于 TCP 的 JSON Lines 连接：每条消息一行，发送加锁以便心跳线程与主线程共用"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+        self._send_lock = threading.Lock()
+
+    def send(self, message):
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    def receive(self):
+        """读取一条消息，连接关闭时返回 None"""
+        line = self.reader.readline()
+        if not line:
+            return None
+        return json.loads(line)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+class DistTask:
+    def __init__(self, task_id, variant, commit):
+        self.task_id = task_id
+        self.variant = variant
+        self.name = get_variant_name(variant)
+        self.dir_name = safe_dir_name(self.name)
+        self.commit = commit
+        self.status = TASK_PENDING
+        self.worker = None
+        self.attempts = 0
+        self.failed_workers = set()
+        self.pending_since = time.time()
+        self.summary = None
+        self.artifacts = []
+
+class WorkerState:
+    def __init__(self, worker_id, connection, info):
+        self.worker_id = worker_id
+        self.connection = connection
+        self.commits = set(info.get("commits", []))
+        self.variants = set(info.get("variants", []))
+        self.host = info.get("host")
+        self.last_seen = time.time()
+        self.task = None
+        self.alive = True
+
+    def update_cache(self, info):
+        self.commits.update(info.get("commits", []))
+        self.variants.update(info.get("variants", []))
+
+def locality_score(worker, task):
+    """节点已有该提交得 2 分，已有该变体的工作树（导入缓存、Gradle 增量输出）得 1 分"""
+    return (2 if task.commit in worker.commits else 0) + (1 if task.dir_name in worker.variants else 0)
+
+class Coordinator:
+    """把变体分配给工作节点：优先分配给已有该提交/工作树的节点，节点失联时重新分配"""
+
+    def __init__(self, params, variants, commit, output_dir, config):
+        self.params = params
+        self.commit = commit
+        self.output_dir = output_dir
+        self.config = config
+        self.tasks = [DistTask(f"t{i + 1}", variant, commit) for i, variant in enumerate(variants)]
+        self.workers = {}
+        self._lock = threading.RLock()
+        self._done = threading.Event()
+        self._no_worker_since = time.time()
+        self._partial = {}
+        # 发给工作节点的公共参数，节点本地的路径参数由节点自己覆盖
+        self.base_params = {k: v for k, v in params.items() if k not in MATRIX_ONLY_KEYS}
+
+    def _task_by_id(self, task_id):
+        for task in self.tasks:
+            if task.task_id == task_id:
+                return task
+        return None
+
+    def register(self, connection, hello):
+        token = self.config.get("token")
+        if token and hello.get("token") != token:
+            connection.send({"type": "rejected", "reason": "token 不匹配"})
+            return None
+        worker_id = hello.get("worker_id") or f"worker-{len(self.workers) + 1}"
+        with self._lock:
+            old = self.workers.get(worker_id)
+            if old and old.alive:
+                self._mark_dead(old, "同名节点重新连接")
+            worker = WorkerState(worker_id, connection, hello)
+            self.workers[worker_id] = worker
+        log_dist(f"节点上线: {worker_id} ({worker.host})，已有提交 {len(worker.commits)} 个，"
+                 f"工作树 {len(worker.variants)} 个")
+        self.schedule()
+        return worker
+
+    def _live_workers(self):
+        return [worker for worker in self.workers.values() if worker.alive]
+
+    def _pick_task(self, worker, pending):
+        live = self._live_workers()
+        best = None
+        best_score = -1
+        now = time.time()
+        for task in pending:
+            # 在该节点上失败过的任务，有其他节点时不再分配给它
+            if worker.worker_id in task.failed_workers and len(live) > 1:
+                continue
+            score = locality_score(worker, task)
+            if score == 0 and now - task.pending_since < float(self.config["locality_wait"]):
+                if any(locality_score(other, task) > 0 for other in live if other is not worker):
+                    continue
+            if score > best_score:
+                best, best_score = task, score
+        return best, best_score
+
+    def schedule(self):
+        """把待分配任务交给空闲节点"""
+        assignments = []
+        with self._lock:
+            pending = [task for task in self.tasks if task.status == TASK_PENDING]
+            for worker in self._live_workers():
+                if worker.task or not pending:
+                    continue
+                task, score = self._pick_task(worker, pending)
+                if task is None:
+                    continue
+                pending.remove(task)
+                task.status = TASK_RUNNING
+                task.worker = worker.worker_id
+                task.attempts += 1
+                worker.task = task
+                assignments.append((worker, task, score))
+        for worker, task, score in assignments:
+            log_dist(f"[{task.name}] 分配给 {worker.worker_id}（第 {task.attempts} 次，缓存得分 {score}）")
+            self._append_log(task, f"===== 第 {task.attempts} 次执行，节点 {worker.worker_id} =====")
+            try:
+                worker.connection.send({"type": "task", "task_id": task.task_id, "variant": task.variant,
+                                        "commit": task.commit, "params": self.base_params})
+            except OSError:
+                self.handle_disconnect(worker)
+
+    def _variant_dir(self, task):
+        path = os.path.join(self.output_dir, task.dir_name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _append_log(self, task, *lines):
+        with open(os.path.join(self._variant_dir(task), "build.log"), 'a', encoding='utf-8') as f:
+            f.write("".join(line + "\n" for line in lines))
+
+    def _owned_task(self, worker, message):
+        """只接受当前分配给该节点的任务的消息，失联后重新分配的任务忽略旧节点迟到的消息"""
+        task = self._task_by_id(message.get("task_id"))
+        if task is None or task.worker != worker.worker_id or task.status != TASK_RUNNING:
+            return None
+        return task
+
+    def handle_message(self, worker, message):
+        worker.last_seen = time.time()
+        kind = message.get("type")
+        if kind == "heartbeat":
+            return
+        task = self._owned_task(worker, message)
+        if task is None:
+            return
+        if kind == "log":
+            self._append_log(task, *message["lines"])
+            if self.config.get("echo_logs"):
+                with _print_lock:
+                    for line in message["lines"]:
+                        print(f"[{task.name}@{worker.worker_id}] {line}")
+        elif kind == "artifact":
+            self._receive_chunk(task, message)
+        elif kind == "artifact_done":
+            self._finish_artifact(task, message)
+        elif kind == "result":
+            with self._lock:
+                self._finish_task(worker, task, message)
+            self._check_done()
+            self.schedule()
+
+    def _artifact_path(self, task, name):
+        artifact_dir = os.path.join(self._variant_dir(task), "artifacts")
+        os.makedirs(artifact_dir, exist_ok=True)
+        return os.path.join(artifact_dir, os.path.basename(name))
+
+    def _receive_chunk(self, task, message):
+        part_path = self._artifact_path(task, message["name"]) + ".part"
+        offset = int(message["offset"])
+        with open(part_path, 'wb' if offset == 0 else 'r+b') as f:
+            f.seek(offset)
+            f.write(base64.b64decode(message["data"]))
+
+    def _finish_artifact(self, task, message):
+        path = self._artifact_path(task, message["name"])
+        part_path = path + ".part"
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        if digest.hexdigest() != message["sha256"]:
+            log_dist(f"[{task.name}] [ERROR] 产物校验失败: {message['name']}")
+            os.remove(part_path)
+            return
+        os.replace(part_path, path)
+        task.artifacts.append(path)
+
+    def _finish_task(self, worker, task, message):
+        summary = message.get("summary", {})
+        worker.update_cache(message.get("cache", {}))
+        worker.task = None
+        expected = summary.get("artifacts", [])
+        received = {os.path.basename(path) for path in task.artifacts}
+        missing = [name for name in expected if os.path.basename(name) not in received]
+        success = bool(summary.get("success")) and not missing
+        summary.update({
+            "success": success,
+            "artifacts": list(task.artifacts),
+            "log": os.path.join(self._variant_dir(task), "build.log"),
+            "worker": worker.worker_id,
+            "attempts": task.attempts,
+        })
+        if missing:
+            summary["error"] = f"产物传输不完整: {', '.join(missing)}"
+        task.summary = summary
+        task.status = TASK_SUCCEEDED if success else TASK_FAILED
+        status = "构建完成 ✅" if success else f"[ERROR] 构建失败 ❌ {summary.get('error', '')}"
+        log_dist(f"[{task.name}] {worker.worker_id} {status}（{summary.get('duration', 0):.1f}s）")
+
+    def _mark_dead(self, worker, reason):
+        """节点失联：正在执行的任务放回队列（超过最大次数时记为失败）"""
+        worker.alive = False
+        task = worker.task
+        worker.task = None
+        log_dist(f"[WARNING] 节点 {worker.worker_id} 失联: {reason}")
+        if task is None or task.status != TASK_RUNNING:
+            return
+        task.failed_workers.add(worker.worker_id)
+        task.worker = None
+        # 丢弃传输到一半的产物与已接收的产物，由下一次执行重新上传
+        task.artifacts = []
+        artifact_dir = os.path.join(self._variant_dir(task), "artifacts")
+        if os.path.isdir(artifact_dir):
+            for name in os.listdir(artifact_dir):
+                if name.endswith(".part"):
+                    os.remove(os.path.join(artifact_dir, name))
+        if task.attempts >= int(self.config["max_attempts"]):
+            task.status = TASK_FAILED
+            task.summary = {"name": task.name, "success": False, "stages": {}, "artifacts": [],
+                            "duration": 0.0, "attempts": task.attempts,
+                            "error": f"已分配 {task.attempts} 次，节点均失联"}
+            log_dist(f"[{task.name}] [ERROR] 已达到最大分配次数，放弃")
+        else:
+            task.status = TASK_PENDING
+            task.pending_since = time.time()
+            log_dist(f"[{task.name}] 重新排队，等待分配")
+
+    def handle_disconnect(self, worker):
+        with self._lock:
+            if self._done.is_set():
+                # 全部完成后的正常断开
+                worker.alive = False
+            elif worker.alive:
+                self._mark_dead(worker, "连接已断开")
+        self._check_done()
+        self.schedule()
+
+    def monitor(self):
+        """检查心跳超时与无节点超时，并定期重新调度（等待缓存的任务到期后可分配给其他节点）"""
+        timeout = float(self.config["heartbeat_timeout"])
+        while not self._done.wait(1.0):
+            now = time.time()
+            expired = []
+            with self._lock:
+                for worker in self._live_workers():
+                    if now - worker.last_seen > timeout:
+                        self._mark_dead(worker, f"{timeout:.0f}s 未收到心跳")
+                        expired.append(worker)
+                if self._live_workers():
+                    self._no_worker_since = now
+                elif now - self._no_worker_since > float(self.config["worker_wait_timeout"]):
+                    for task in self.tasks:
+                        if task.status == TASK_PENDING:
+                            task.status = TASK_FAILED
+                            task.summary = {"name": task.name, "success": False, "stages": {}, "artifacts": [],
+                                            "duration": 0.0, "attempts": task.attempts, "error": "没有可用的工作节点"}
+                    log_dist("[ERROR] 长时间没有在线的工作节点，剩余任务记为失败")
+            for worker in expired:
+                worker.connection.close()
+            self._check_done()
+            self.schedule()
+
+    def _check_done(self):
+        if all(task.status in (TASK_SUCCEEDED, TASK_FAILED) for task in self.tasks):
+            self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        with self._lock:
+            workers = self._live_workers()
+        for worker in workers:
+            try:
+                worker.connection.send({"type": "shutdown"})
+            except OSError:
+                pass
+        return [task.summary for task in self.tasks]
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, coordinator):
+        super().__init__(address, CoordinatorHandler)
+        self.coordinator = coordinator
+
+class CoordinatorHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        coordinator = self.server.coordinator
+        connection = Connection(self.request)
+        worker = None
+        try:
+            hello = connection.receive()
+            if not hello or hello.get("type") != "hello":
+                return
+            worker = coordinator.register(connection, hello)
+            while worker is not None:
+                message = connection.receive()
+                if message is None:
+                    break
+                coordinator.handle_message(worker, message)
+        except (OSError, ValueError) as e:
+            log_dist(f"[WARNING] 节点连接异常: {e}")
+        finally:
+            if worker is not None:
+                coordinator.handle_disconnect(worker)
+
+def start_coordinator(params, variants, commit, output_dir, config):
+    coordinator = Coordinator(params, variants, commit, output_dir, config)
+    server = CoordinatorServer((config["host"], int(config["port"])), coordinator)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    threading.Thread(target=coordinator.monitor, daemon=True).start()
+    return coordinator, server
+
+def run_distributed_build(params, local_workers=0):
+    """协调者入口：等待工作节点连接并分配变体；local_workers > 0 时在本机启动对应数量的工作进程"""
+    log_pipeline_step("STAGE: 分布式矩阵构建")
+    variants = params.get("variants") or []
+    if not variants:
+        log_pipeline_step("[ERROR] build_params.json 中没有配置 variants")
+        return False
+    names = [get_variant_name(v) for v in variants]
+    if len(set(names)) != len(names):
+        log_pipeline_step(f"[ERROR] 变体名称重复: {names}")
+        return False
+    config = get_distributed_config(params)
+    output_dir = os.path.abspath(params.get("matrix_output_dir", os.path.join(SCRIPT_DIR, "matrix_output")))
+    try:
+        commit = resolve_head(params["project_path"])
+    except Exception as e:
+        log_pipeline_step(f"[ERROR] {e}")
+        return False
+
+    start_time = time.time()
+    coordinator, server = start_coordinator(params, variants, commit, output_dir, config)
+    port = server.server_address[1]
+    log_pipeline_step(f"构建提交: {commit}，变体数: {len(variants)}，协调者监听 {config['host']}:{port}")
+
+    processes = []
+    if local_workers:
+        processes = start_local_workers(params, port, local_workers, config)
+    try:
+        results = coordinator.wait()
+    finally:
+        server.shutdown()
+        server.server_close()
+        for process in processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    wall_time = time.time() - start_time
+
+    log_matrix_summary(results, wall_time)
+    for result in results:
+        if result.get("worker"):
+            log_pipeline_step(f"  {result['name']:<28} 节点 {result['worker']}，分配 {result['attempts']} 次")
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "distributed_summary.json"), 'w', encoding='utf-8') as f:
+        json.dump({"commit": commit, "wall_time": wall_time, "variants": results}, f, ensure_ascii=False, indent=2)
+    return all(result["success"] for result in results)
+
+def start_local_workers(params, port, count, config):
+    """本机模式：每个工作进程使用独立的共享克隆与工作树目录，模拟远程节点"""
+    root = get_cache_dir(params, "distributed")
+    processes = []
+    for i in range(count):
+        worker_id = f"local-{i + 1}"
+        command = [sys.executable, os.path.join(SCRIPT_DIR, "distributed_build.py"), "worker",
+                   "--connect", f"127.0.0.1:{port}", "--worker-id", worker_id,
+                   "--workspace", os.path.join(root, worker_id), "--origin", params["project_path"]]
+        if config.get("token"):
+            command += ["--token", config["token"]]
+        processes.append(subprocess.Popen(command, cwd=SCRIPT_DIR,
+                                          env=dict(os.environ, PYTHONIOENCODING="utf-8")))
+    return processes
+
+class RemoteLogSink(Sink):
+    """把构建输出按批发送给协调者"""
+
+    def __init__(self, connection, task_id):
+        super().__init__(lossy=False)
+        self.connection = connection
+        self.task_id = task_id
+
+    def write_lines(self, lines):
+        try:
+            self.connection.send({"type": "log", "task_id": self.task_id, "lines": lines})
+        except OSError:
+            pass
+
+class BuildWorker:
+    """工作节点：接收变体任务，在本地克隆的工作树中执行各阶段，回传日志与产物"""
+
+    def __init__(self, worker_id, workspace, origin=None, local_params=None, token=None):
+        self.worker_id = worker_id
+        self.workspace = os.path.abspath(workspace)
+        self.repo_path = os.path.join(self.workspace, "repo")
+        self.worktree_root = os.path.join(self.workspace, "worktrees")
+        self.output_dir = os.path.join(self.workspace, "output")
+        self.origin = origin
+        self.local_params = local_params or {}
+        self.token = token
+
+    def ensure_repo(self):
+        if os.path.isdir(os.path.join(self.repo_path, ".git")):
+            return
+        if not self.origin:
+            raise RuntimeError(f"工作区中没有仓库且未指定 --origin: {self.repo_path}")
+        os.makedirs(self.workspace, exist_ok=True)
+        # 本地路径使用 --shared 共享对象库，避免复制整个仓库
+        shared = ["--shared"] if os.path.isdir(self.origin) else []
+        result = subprocess.run(["git", "clone", "--no-checkout"] + shared + [self.origin, self.repo_path],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"克隆仓库失败: {result.stderr.strip()}")
+
+    def ensure_commit(self, commit):
+        if subprocess.run(["git", "cat-file", "-e", f"{commit}^{{commit}}"], cwd=self.repo_path,
+                          capture_output=True).returncode == 0:
+            return
+        result = subprocess.run(["git", "fetch", "origin", commit], cwd=self.repo_path, capture_output=True, text=True)
+        if result.returncode != 0:
+            result = subprocess.run(["git", "fetch", "origin"], cwd=self.repo_path, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"获取提交 {commit} 失败: {result.stderr.strip()}")
+
+    def get_cache_info(self):
+        """本节点已有的工作树与其提交，供协调者按缓存分配任务"""
+        commits = []
+        variants = []
+        if os.path.isdir(self.worktree_root):
+            for name in sorted(os.listdir(self.worktree_root)):
+                path = os.path.join(self.worktree_root, name)
+                if os.path.exists(os.path.join(path, ".git")):
+                    variants.append(name)
+                    try:
+                        commits.append(resolve_head(path))
+                    except RuntimeError:
+                        pass
+        return {"commits": sorted(set(commits)), "variants": variants}
+
+    def run_task(self, connection, message):
+        variant = message["variant"]
+        task_id = message["task_id"]
+        base_params = dict(message["params"])
+        base_params.update(self.local_params)
+        base_params["project_path"] = self.repo_path
+        log_sink = RemoteLogSink(connection, task_id)
+        log_sink.start()
+        try:
+            self.ensure_commit(message["commit"])
+            summary = run_variant(base_params, variant, message["commit"], self.worktree_root, self.output_dir,
+                                  line_handler=lambda line: log_sink.put([line]))
+        except Exception as e:
+            summary = {"name": get_variant_name(variant), "success": False, "stages": {}, "artifacts": [],
+                       "duration": 0.0, "error": str(e)}
+        finally:
+            log_sink.close()
+        if summary.get("success"):
+            for path in summary["artifacts"]:
+                self.send_artifact(connection, task_id, path)
+        connection.send({"type": "result", "task_id": task_id,
+                         "summary": dict(summary, artifacts=[os.path.basename(p) for p in summary["artifacts"]]),
+                         "cache": self.get_cache_info()})
+
+    def send_artifact(self, connection, task_id, path, chunk_size=DEFAULT_DISTRIBUTED_CONFIG["chunk_size"]):
+        name = os.path.basename(path)
+        digest = hashlib.sha256()
+        offset = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+                connection.send({"type": "artifact", "task_id": task_id, "name": name, "offset": offset,
+                                 "data": base64.b64encode(chunk).decode('ascii')})
+                offset += len(chunk)
+        connection.send({"type": "artifact_done", "task_id": task_id, "name": name,
+                         "size": offset, "sha256": digest.hexdigest()})
+
+    def _heartbeat(self, connection, interval, stopped):
+        while not stopped.wait(interval):
+            try:
+                connection.send({"type": "heartbeat"})
+            except OSError:
+                return
+
+    def serve(self, host, port, heartbeat_interval):
+        """连接协调者并执行任务，直到收到 shutdown 或连接断开；返回是否正常结束"""
+        self.ensure_repo()
+        sock = socket.create_connection((host, port))
+        connection = Connection(sock)
+        hello = {"type": "hello", "worker_id": self.worker_id, "host": socket.gethostname(), "token": self.token}
+        hello.update(self.get_cache_info())
+        connection.send(hello)
+        stopped = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(connection, heartbeat_interval, stopped), daemon=True).start()
+        try:
+            while True:
+                message = connection.receive()
+                if message is None:
+                    return False
+                if message["type"] == "task":
+                    log_dist(f"[{self.worker_id}] 开始构建 {get_variant_name(message['variant'])} "
+                             f"@ {message['commit'][:12]}")
+                    self.run_task(connection, message)
+                elif message["type"] == "shutdown":
+                    return True
+                elif message["type"] == "rejected":
+                    log_dist(f"[ERROR] 协调者拒绝连接: {message.get('reason')}")
+                    return True
+        finally:
+            stopped.set()
+            connection.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="分布式多变体构建：协调者把变体分配给多个工作节点")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    coordinator_parser = subparsers.add_parser("coordinator", help="启动协调者并等待工作节点连接")
+    coordinator_parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    coordinator_parser.add_argument("--port", type=int, default=None, help="监听端口")
+
+    local_parser = subparsers.add_parser("local", help="协调者 + 本机工作进程（单机测试）")
+    local_parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    local_parser.add_argument("--workers", type=int, default=2, help="本机工作进程数")
+    local_parser.add_argument("--port", type=int, default=0, help="监听端口，默认随机")
+
+    worker_parser = subparsers.add_parser("worker", help="启动工作节点")
+    worker_parser.add_argument("--connect", required=True, help="协调者地址 host:port")
+    worker_parser.add_argument("--worker-id", default=socket.gethostname(), help="节点名称")
+    worker_parser.add_argument("--workspace", default=None, help="节点工作目录（仓库克隆与工作树）")
+    worker_parser.add_argument("--origin", default=None, help="工作目录中没有仓库时克隆的地址")
+    worker_parser.add_argument("--params", default=None, help="本节点覆盖的参数（如 creator_path）")
+    worker_parser.add_argument("--token", default=None, help="协调者要求的共享口令")
+    worker_parser.add_argument("--heartbeat", type=float, default=DEFAULT_DISTRIBUTED_CONFIG["heartbeat_interval"],
+                               help="心跳间隔（秒）")
+    worker_parser.add_argument("--persistent", action="store_true", help="连接断开或本轮结束后重新连接")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "worker":
+        local_params = load_build_params(args.params) if args.params else {}
+        workspace = args.workspace or os.path.join(SCRIPT_DIR, ".build_cache", "distributed", args.worker_id)
+        worker = BuildWorker(args.worker_id, workspace, args.origin, local_params, args.token)
+        host, port = args.connect.rsplit(":", 1)
+        while True:
+            try:
+                worker.serve(host, int(port), args.heartbeat)
+            except OSError as e:
+                log_dist(f"[WARNING] 连接协调者失败: {e}")
+            if not args.persistent:
+                break
+            time.sleep(10)
+        sys.exit(0)
+
+    params = load_build_params(args.params)
+    if not params:
+        sys.exit(1)
+    if args.port is not None:
+        params.setdefault("distributed_build", {})["port"] = args.port
+    if args.command == "local":
+        params.setdefault("distributed_build", {}).setdefault("host", "127.0.0.1")
+    if not run_distributed_build(params, local_workers=args.workers if args.command == "local" else 0):
+        sys.exit(1)
@@ -0,0 +1,264 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+from build_trace import trace_span
+from build_utils import SCRIPT_DIR, file_lock, format_size, log_pipeline_step
+
+# Git 拉取配置的默认值，可通过 build_params.json 的 git_fetch 覆盖
+DEFAULT_GIT_FETCH_CONFIG = {
+    "filter": None,            # 部分克隆过滤器，例如 "blob:none"（未使用镜像时生效）
+    "depth": None,             # 浅拉取深度（未使用镜像时生效，工作区直接对齐到上游最新提交）
+    "mirror_path": None,       # 多个工作区共享的本地镜像仓库路径
+    "sparse_patterns": [],     # 稀疏检出规则（非 cone 模式）
+    "prefetch_interval": 300,  # prefetch 命令更新镜像的间隔秒数
+}
+
+# 例: "Receiving objects: 100% (1234/1234), 45.67 MiB | 10.00 MiB/s, done."
+RECEIVING_PATTERN = re.compile(r"Receiving objects:\s+\d+% \(\d+/\d+\),\s+([\d.]+) (bytes|KiB|MiB|GiB)")
+SIZE_UNITS = {"bytes": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3}
+
+# 工作区通过 alternates 引用镜像的对象，镜像上的 gc/prune 可能删除工作区仍需要的对象，因此关闭
+MIRROR_GIT_CONFIG = (("gc.auto", "0"), ("gc.pruneExpire", "never"), ("gc.reflogExpireUnreachable", "never"))
+
+def run_git(args, cwd=None):
+    """执行git命令并记录追踪区间"""
+    with trace_span(f"git {args[0] if args[0] != '-c' else args[2]}", category="git",
+                    command=" ".join(["git"] + args)) as span:
+        process = subprocess.run(
+            ["git"] + args,
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace"
+        )
+        span.set(exit_code=process.returncode)
+    return process
+
+def get_head_commit(project_path):
+    process = run_git(["rev-parse", "HEAD"], cwd=project_path)
+    if process.returncode != 0:
+        raise RuntimeError(f"获取 HEAD 失败: {process.stderr.strip()}")
+    return process.stdout.strip()
+
+def get_git_fetch_config(params):
+    config = dict(DEFAULT_GIT_FETCH_CONFIG)
+    config.update((params or {}).get("git_fetch", {}))
+    return config
+
+def parse_received_bytes(stderr):
+    """从 --progress 输出中解析接收的字节数，没有传输时返回 0"""
+    received = 0
+    # 进度信息以 \r 刷新，取最后一次的数值
+    for match in RECEIVING_PATTERN.finditer(stderr.replace("\r", "\n")):
+        received = int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+    return received
+
+def run_git_transfer(args, cwd, description):
+    """执行会产生网络传输的git命令，记录传输字节数与耗时"""
+    start_time = time.time()
+    process = run_git(args, cwd=cwd)
+    duration = time.time() - start_time
+    received = parse_received_bytes(process.stderr)
+    log_pipeline_step(f"{description}: 传输 {format_size(received)}，耗时 {duration:.1f}s")
+    return process
+
+def get_remote_url(project_path, remote="origin"):
+    process = run_git(["remote", "get-url", remote], cwd=project_path)
+    if process.returncode != 0:
+        raise RuntimeError(f"获取远程仓库地址失败: {process.stderr.strip()}")
+    return process.stdout.strip()
+
+def get_mirror_lock_path(mirror_path):
+    """镜像的锁文件放在镜像目录旁边，首次创建镜像前也可以加锁"""
+    return os.path.abspath(mirror_path) + ".lock"
+
+def update_mirror(mirror_path, remote_url):
+    """创建或更新本地镜像仓库（完整镜像，供多个工作区通过 alternates 共享对象）。
+    独立运行的预取进程与构建会同时更新镜像，在镜像锁内执行以免引用锁冲突"""
+    with file_lock(get_mirror_lock_path(mirror_path)):
+        if not os.path.exists(os.path.join(mirror_path, "HEAD")):
+            os.makedirs(os.path.dirname(os.path.abspath(mirror_path)), exist_ok=True)
+            process = run_git_transfer(
+                ["-c", "gc.auto=0", "clone", "--mirror", "--progress", remote_url, mirror_path], None,
+                f"创建镜像 {mirror_path}"
+            )
+        else:
+            process = run_git_transfer(
+                ["-c", "gc.auto=0", "fetch", "--prune", "--progress", "origin"], mirror_path, f"更新镜像 {mirror_path}"
+            )
+        if process.returncode != 0:
+            log_pipeline_step(f"[ERROR] 更新镜像失败: {process.stderr.strip()}")
+            return False
+        # 已有的镜像也在每次更新时补上配置
+        for key, value in MIRROR_GIT_CONFIG:
+            process = run_git(["config", key, value], cwd=mirror_path)
+            if process.returncode != 0:
+                log_pipeline_step(f"[ERROR] 设置镜像 {key} 失败: {process.stderr.strip()}")
+                return False
+    return True
+
+def attach_mirror(project_path, mirror_path):
+    """把镜像的对象库加入工作区的 alternates，之后的拉取只需传输镜像中没有的对象"""
+    process = run_git(["rev-parse", "--git-common-dir"], cwd=project_path)
+    if process.returncode != 0:
+        raise RuntimeError(f"无法定位 .git 目录: {process.stderr.strip()}")
+    git_dir = os.path.join(project_path, process.stdout.strip())
+    alternates_path = os.path.join(git_dir, "objects", "info", "alternates")
+    mirror_objects = os.path.abspath(os.path.join(mirror_path, "objects")).replace("\\", "/")
+
+    existing = []
+    if os.path.exists(alternates_path):
+        with open(alternates_path, 'r', encoding='utf-8') as f:
+            existing = [line.strip() for line in f if line.strip()]
+    if mirror_objects not in existing:
+        os.makedirs(os.path.dirname(alternates_path), exist_ok=True)
+        with open(alternates_path, 'a', encoding='utf-8') as f:
+            f.write(mirror_objects + "\n")
+        log_pipeline_step(f"已关联本地镜像对象库: {mirror_objects}")
+
+def apply_sparse_checkout(project_path, patterns):
+    """按配置设置稀疏检出规则；规则清空后恢复完整检出"""
+    if not patterns:
+        enabled = run_git(["config", "--bool", "core.sparseCheckout"], cwd=project_path).stdout.strip()
+        if enabled != "true":
+            return True
+        log_pipeline_step("关闭稀疏检出，恢复完整工作区")
+        process = run_git(["sparse-checkout", "disable"], cwd=project_path)
+        if process.returncode != 0:
+            log_pipeline_step(f"[ERROR] 关闭稀疏检出失败: {process.stderr.strip()}")
+            return False
+        return True
+    log_pipeline_step(f"设置稀疏检出: {', '.join(patterns)}")
+    process = run_git(["sparse-checkout", "set", "--no-cone"] + list(patterns), cwd=project_path)
+    if process.returncode != 0:
+        log_pipeline_step(f"[ERROR] 设置稀疏检出失败: {process.stderr.strip()}")
+        return False
+    return True
+
+def enable_partial_clone(project_path, filter_spec):
+    """把现有工作区转换为部分克隆，之后的拉取按过滤器跳过历史大文件"""
+    for key, value in (("remote.origin.promisor", "true"), ("remote.origin.partialclonefilter", filter_spec)):
+        process = run_git(["config", key, value], cwd=project_path)
+        if process.returncode != 0:
+            raise RuntimeError(f"设置 {key} 失败: {process.stderr.strip()}")
+
+def pull_updates(project_path, params):
+    """拉取远程更新：配置了镜像时先更新镜像再从本地镜像获取，否则按 filter/depth 拉取"""
+    config = get_git_fetch_config(params)
+    if not apply_sparse_checkout(project_path, config.get("sparse_patterns")):
+        return False
+
+    mirror_path = config.get("mirror_path")
+    if mirror_path:
+        # 相对路径按脚本目录解析，不依赖当前工作目录
+        mirror_path = os.path.join(SCRIPT_DIR, mirror_path)
+        remote_url = get_remote_url(project_path)
+        # 预取进程保持镜像较新时，这里通常只需很少的传输
+        if not update_mirror(mirror_path, remote_url):
+            return False
+        attach_mirror(project_path, mirror_path)
+        # 读取镜像期间不允许预取修改其引用
+        with file_lock(get_mirror_lock_path(mirror_path)):
+            process = run_git_transfer(
+                ["fetch", "--progress", "--prune", mirror_path, "+refs/heads/*:refs/remotes/origin/*"],
+                project_path, "从本地镜像获取"
+            )
+        if process.returncode != 0:
+            log_pipeline_step(f"[ERROR] 从本地镜像获取失败: {process.stderr.strip()}")
+            return False
+        log_pipeline_step("合并上游分支...")
+        process = run_git(["merge", "--no-edit", "@{u}"], cwd=project_path)
+    elif config.get("depth"):
+        if config.get("filter"):
+            enable_partial_clone(project_path, config["filter"])
+        # 浅拉取后新旧提交之间没有共同历史，无法合并，直接对齐到上游最新提交
+        process = run_git_transfer(
+            ["fetch", "--progress", f"--depth={int(config['depth'])}", "origin"], project_path, "git fetch (浅拉取)"
+        )
+        if process.returncode != 0:
+            log_pipeline_step(f"[ERROR] git fetch失败: {process.stderr.strip()}")
+            return False
+        process = run_git(["reset", "--hard", "@{u}"], cwd=project_path)
+    else:
+        if config.get("filter"):
+            enable_partial_clone(project_path, config["filter"])
+        process = run_git_transfer(["pull", "--progress"], project_path, "git pull")
+
+    if process.stdout.strip():
+        log_pipeline_step(process.stdout)
+    if process.returncode != 0:
+        log_pipeline_step(f"[ERROR] git pull失败: {process.stderr}")
+        return False
+    return True
+
+# 分离 HEAD 前所在的分支记录在工作区的 git 配置中，下次更新前据此切回
+PINNED_BRANCH_KEY = "buildscript.branch"
+
+def ensure_on_branch(project_path):
+    """上次构建切换到指定提交（分离 HEAD）时，先切回原分支，否则 git pull 无法执行"""
+    if run_git(["symbolic-ref", "-q", "HEAD"], cwd=project_path).returncode == 0:
+        return True
+    branch = run_git(["config", "--get", PINNED_BRANCH_KEY], cwd=project_path).stdout.strip()
+    if not branch:
+        log_pipeline_step("[ERROR] 工作区处于分离 HEAD 状态，且没有记录原分支")
+        return False
+    log_pipeline_step(f"切回分支 {branch}")
+    process = run_git(["checkout", branch], cwd=project_path)
+    if process.returncode != 0:
+        log_pipeline_step(f"[ERROR] 切回分支 {branch} 失败: {process.stderr.strip()}")
+        return False
+    return True
+
+def checkout_commit(project_path, commit):
+    """切换到指定提交（分离 HEAD）；本地没有该提交时先从 origin 获取"""
+    if run_git(["cat-file", "-e", f"{commit}^{{commit}}"], cwd=project_path).returncode != 0:
+        process = run_git_transfer(["fetch", "--progress", "origin", commit], project_path, f"获取提交 {commit[:12]}")
+        if process.returncode != 0:
+            log_pipeline_step(f"[ERROR] 获取提交 {commit} 失败: {process.stderr.strip()}")
+            return False
+    branch = run_git(["symbolic-ref", "-q", "--short", "HEAD"], cwd=project_path).stdout.strip()
+    if branch:
+        run_git(["config", PINNED_BRANCH_KEY, branch], cwd=project_path)
+    process = run_git(["checkout", "--detach", commit], cwd=project_path)
+    if process.returncode != 0:
+        log_pipeline_step(f"[ERROR] 切换到提交 {commit} 失败: {process.stderr.strip()}")
+        return False
+    return True
+
+def prefetch_loop(params, interval, once=False):
+    """前台循环定期更新本地镜像，使构建时的拉取只需很少的传输。
+    构建流程不会启动它，需作为常驻进程单独运行，或用 --once 交给计划任务定时执行"""
+    config = get_git_fetch_config(params)
+    mirror_path = config.get("mirror_path")
+    if not mirror_path:
+        log_pipeline_step("[ERROR] 未配置 git_fetch.mirror_path，无法预取")
+        return False
+    mirror_path = os.path.join(SCRIPT_DIR, mirror_path)
+    remote_url = get_remote_url(params.get("project_path"))
+    while True:
+        ok = update_mirror(mirror_path, remote_url)
+        if once:
+            return ok
+        time.sleep(interval)
+
+if __name__ == "__main__":
+    from build_modules import load_build_params
+
+    parser = argparse.ArgumentParser(description="Git 本地镜像预取（与构建分开运行）")
+    parser.add_argument("command", choices=["prefetch"], help="prefetch: 在前台定期更新本地镜像，直到被中断")
+    parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    parser.add_argument("--interval", type=int, default=None, help="预取间隔秒数")
+    parser.add_argument("--once", action="store_true", help="只更新一次后退出（适合由计划任务调用）")
+    args = parser.parse_args()
+
+    params = load_build_params(args.params)
+    if not params:
+        sys.exit(1)
+    interval = args.interval or int(get_git_fetch_config(params).get("prefetch_interval", 300))
+    if not prefetch_loop(params, interval, args.once):
+        sys.exit(1)
@@ -0,0 +1,385 @@
+import json
+import os
+import re
+import shutil
+import time
+
+from build_cache import clear_tree
+from build_utils import get_cache_dir, log_pipeline_step
+from stage_retry import run_with_retry
+
+# Gradle 执行配置的默认值，可通过 build_params.json 的 gradle_profile 覆盖
+DEFAULT_GRADLE_PROFILE = {
+    "daemon": True,               # 保持 Gradle 守护进程常驻，后续构建复用
+    "build_cache": True,          # 启用本地构建缓存
+    "configuration_cache": False, # 启用配置缓存（需插件兼容）
+    "parallel": None,             # True/False 时强制开启/关闭项目并行执行，None 沿用工程 gradle.properties 的设置
+    "max_workers": None,          # 最大工作线程数，None 表示由 Gradle 决定
+    # 守护进程的最大堆内存，例如 "4g"。设置后会通过 -Dorg.gradle.jvmargs 整体替换工程 gradle.properties 中的
+    # jvmargs（包括 metaspace、编码等参数），None 时沿用工程配置
+    "jvm_heap": None,
+    "offline": False,             # 离线模式，不访问远程仓库
+    "task_report": False,         # 通过 init 脚本记录每个任务的耗时并生成热点任务报告
+}
+
+# 记录任务耗时的 init 脚本：每个任务结束时输出一行 [TASK-TIMING] path|毫秒|结果
+TASK_TIMING_INIT_SCRIPT = """\
+import java.util.concurrent.ConcurrentHashMap
+import org.gradle.api.execution.TaskExecutionListener
+import org.gradle.api.tasks.TaskState
+
+def taskStartTimes = new ConcurrentHashMap<String, Long>()
+gradle.addListener(new TaskExecutionListener() {
+    void beforeExecute(Task task) {
+        taskStartTimes.put(task.path, System.nanoTime())
+    }
+    void afterExecute(Task task, TaskState state) {
+        Long start = taskStartTimes.remove(task.path)
+        long elapsed = start == null ? 0 : (System.nanoTime() - start).intdiv(1000000)
+        String outcome = state.failure != null ? "FAILED" : (state.skipMessage ?: "EXECUTED")
+        println "[TASK-TIMING] ${task.path}|${elapsed}|${outcome}"
+    }
+})
+"""
+
+# Android 产物配置的默认值，可通过 build_params.json 的 android_outputs 覆盖
+DEFAULT_ANDROID_OUTPUTS = {
+    "apk": True,          # 生成 APK
+    "abi_splits": [],     # 按 ABI 拆分 APK，例如 ["armeabi-v7a", "arm64-v8a"]；为空时生成单个多 ABI APK
+    "universal_apk": False,  # 拆分时额外生成包含全部 ABI 的 APK
+    "bundle": False,      # 生成 Android App Bundle (AAB)
+}
+
+# 开启 ABI 拆分的 init script。在 beforeProject 中注册 afterEvaluate，使其先于 Android 插件自身的
+# afterEvaluate 执行（此时 DSL 尚未锁定）；拆分与 ndk.abiFilters 不能同时设置，因此清空后者
+ABI_SPLITS_INIT_SCRIPT = """\
+gradle.beforeProject { project ->
+    project.afterEvaluate {
+        if (!project.plugins.hasPlugin('com.android.application')) {
+            return
+        }
+        def android = project.extensions.getByName('android')
+        android.defaultConfig.ndk.abiFilters.clear()
+        android.splits.abi {
+            enable true
+            reset()
+            include(%(abis)s)
+            universalApk %(universal)s
+        }
+    }
+}
+"""
+
+TASK_TIMING_PATTERN = re.compile(r"\[TASK-TIMING\] (\S+)\|(\d+)\|(\S+)")
+# 原生（NDK/CMake）编译相关任务
+NATIVE_TASK_PATTERN = re.compile(r"(externalNativeBuild|buildCMake|configureCMake|ndkBuild)", re.IGNORECASE)
+# 这些结果表示任务是增量的（未重新执行）
+INCREMENTAL_OUTCOMES = ("UP-TO-DATE", "FROM-CACHE", "NO-SOURCE", "SKIPPED")
+DEFAULT_TASK_REPORT_TOP = 20
+# 保留的历史任务报告数量
+TASK_REPORT_KEEP = 30
+
+# 新启动守护进程时 Gradle 会输出此信息，未出现说明复用了已有的守护进程
+DAEMON_START_PATTERN = re.compile(r"Starting a Gradle Daemon")
+# 例: "57 actionable tasks: 12 executed, 30 from cache, 15 up-to-date"
+TASK_SUMMARY_PATTERN = re.compile(r"(\d+) actionable tasks?: (.+)")
+TASK_SUMMARY_ITEM_PATTERN = re.compile(r"(\d+) (executed|from cache|up-to-date)")
+
+def get_gradle_profile(params):
+    """合并默认配置与参数中的 gradle_profile"""
+    profile = dict(DEFAULT_GRADLE_PROFILE)
+    profile.update((params or {}).get("gradle_profile", {}))
+    return profile
+
+def get_android_outputs(params):
+    """合并默认配置与参数中的 android_outputs"""
+    outputs = dict(DEFAULT_ANDROID_OUTPUTS)
+    outputs.update((params or {}).get("android_outputs", {}))
+    return outputs
+
+def get_output_tasks(mode, outputs):
+    """按产物配置生成 Gradle 任务；APK 与 AAB 在同一次调用中执行，共用编译、资源合并与 dex 等任务"""
+    variant = "Release" if mode == "release" else "Debug"
+    tasks = []
+    if outputs.get("apk", True):
+        tasks.append(f"assemble{variant}")
+    if outputs.get("bundle"):
+        tasks.append(f"bundle{variant}")
+    return tasks
+
+def write_init_scripts(params, profile):
+    """根据执行配置生成需要的 Gradle init 脚本，返回脚本路径列表"""
+    scripts = []
+    abi_splits = get_android_outputs(params).get("abi_splits")
+    if abi_splits:
+        script_path = os.path.join(get_cache_dir(params, "gradle"), "abi_splits.gradle")
+        with open(script_path, 'w', encoding='utf-8') as f:
+            f.write(ABI_SPLITS_INIT_SCRIPT % {
+                "abis": ", ".join(f"'{abi}'" for abi in abi_splits),
+                "universal": "true" if get_android_outputs(params).get("universal_apk") else "false",
+            })
+        scripts.append(script_path)
+    if profile.get("task_report"):
+        script_dir = get_cache_dir(params, "gradle")
+        script_path = os.path.join(script_dir, "task_timing.gradle")
+        with open(script_path, 'w', encoding='utf-8') as f:
+            f.write(TASK_TIMING_INIT_SCRIPT)
+        scripts.append(script_path)
+    return scripts
+
+def build_gradle_args(profile, init_scripts=()):
+    """根据执行配置生成 Gradle 命令行参数"""
+    args = ["--console=plain"]
+    args.append("--daemon" if profile.get("daemon") else "--no-daemon")
+    args.append("--build-cache" if profile.get("build_cache") else "--no-build-cache")
+    # 任务耗时监听器与配置缓存不兼容，生成任务报告时临时关闭配置缓存
+    if profile.get("configuration_cache") and not profile.get("task_report"):
+        args.append("--configuration-cache")
+    if profile.get("parallel") is not None:
+        args.append("--parallel" if profile["parallel"] else "--no-parallel")
+    if profile.get("max_workers"):
+        args.append(f"--max-workers={int(profile['max_workers'])}")
+    if profile.get("jvm_heap"):
+        args.append(f"-Dorg.gradle.jvmargs=-Xmx{profile['jvm_heap']}")
+    if profile.get("offline"):
+        args.append("--offline")
+    for script_path in init_scripts:
+        args += ["--init-script", script_path]
+    return args
+
+def format_gradle_command(gradle_cmd, tasks, profile, init_scripts=()):
+    """拼接 shell 执行用的 Gradle 命令字符串"""
+    args = build_gradle_args(profile, init_scripts)
+    return " ".join([gradle_cmd] + list(tasks) + [f'"{arg}"' if " " in arg else arg for arg in args])
+
+class GradleOutputParser:
+    """解析 Gradle 输出，统计守护进程复用与构建缓存命中情况"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.daemon_started = False
+        self.actionable_tasks = None
+        self.executed = 0
+        self.from_cache = 0
+        self.up_to_date = 0
+        # 第一个任务开始执行的时间，用于区分配置阶段与执行阶段
+        self.first_task_time = None
+        # init 脚本输出的任务耗时记录
+        self.tasks = []
+
+    def feed(self, line):
+        if self.first_task_time is None and line.startswith("> Task "):
+            self.first_task_time = time.time()
+        if line.startswith("[TASK-TIMING]"):
+            match = TASK_TIMING_PATTERN.search(line)
+            if match:
+                path = match.group(1)
+                self.tasks.append({
+                    "path": path,
+                    "duration_ms": int(match.group(2)),
+                    "outcome": match.group(3),
+                    "native": bool(NATIVE_TASK_PATTERN.search(path)),
+                })
+            return
+        if DAEMON_START_PATTERN.search(line):
+            self.daemon_started = True
+            return
+        match = TASK_SUMMARY_PATTERN.search(line)
+        if match:
+            self.actionable_tasks = int(match.group(1))
+            for count, kind in TASK_SUMMARY_ITEM_PATTERN.findall(match.group(2)):
+                if kind == "executed":
+                    self.executed = int(count)
+                elif kind == "from cache":
+                    self.from_cache = int(count)
+                else:
+                    self.up_to_date = int(count)
+
+    def trace_phases(self, tracer, start_time, end_time):
+        """按第一个任务的出现时间把构建拆分为配置与执行两个追踪区间"""
+        split_time = self.first_task_time or end_time
+        tracer.add_span("gradle_configure", start_time, split_time)
+        if self.first_task_time:
+            tracer.add_span("gradle_execute", split_time, end_time,
+                            executed=self.executed, from_cache=self.from_cache, up_to_date=self.up_to_date)
+
+    @property
+    def daemon_reused(self):
+        return bool(self.profile.get("daemon")) and not self.daemon_started
+
+    @property
+    def cache_hit_ratio(self):
+        """构建缓存命中率：从缓存取回的任务 / 需要产出结果的任务（不含 up-to-date）"""
+        total = self.executed + self.from_cache
+        if total == 0:
+            return None
+        return self.from_cache / total
+
+    def log_summary(self, log=log_pipeline_step):
+        if not self.profile.get("daemon"):
+            log("Gradle 守护进程: 已禁用")
+        elif self.daemon_reused:
+            log("Gradle 守护进程: 复用已有守护进程")
+        else:
+            log("Gradle 守护进程: 新启动")
+
+        if self.actionable_tasks is None:
+            log("Gradle 任务统计: 未在输出中找到任务汇总")
+            return
+        ratio = self.cache_hit_ratio
+        ratio_str = f"{ratio * 100:.1f}%" if ratio is not None else "N/A"
+        log(
+            f"Gradle 任务统计: {self.actionable_tasks} 个任务，执行 {self.executed}，"
+            f"缓存命中 {self.from_cache}，已是最新 {self.up_to_date}，构建缓存命中率 {ratio_str}"
+        )
+
+# 预热工程（相对项目路径）。Cocos 导出会清空并重新生成 build/android，预热工程放在导出范围之外，
+# 且与 build/android/proj 同在 build 下的同一深度，构建脚本中的相对路径指向相同的位置
+WARMUP_PROJECT_DIR = ("build", "gradle-warmup", "proj")
+# 决定 Gradle 配置阶段的文件：构建脚本、属性文件与 wrapper（gradle/ 目录整体同步）
+GRADLE_SETUP_FILES = {"gradlew", "gradlew.bat", "gradle.properties", "local.properties"}
+GRADLE_SETUP_SUFFIXES = (".gradle", ".gradle.kts")
+GRADLE_SETUP_SKIP_DIRS = {".gradle", "build", ".cxx"}
+
+def get_warmup_project_dir(project_path):
+    return os.path.join(project_path, *WARMUP_PROJECT_DIR)
+
+def sync_warmup_project(build_dir, warmup_dir):
+    """把 Android 工程的构建脚本与 wrapper 同步到预热工程，返回同步的文件数。
+    预热工程的 .gradle 目录保留，配置阶段的缓存可以复用"""
+    files = []
+    for current_dir, dirs, names in os.walk(build_dir):
+        dirs[:] = sorted(d for d in dirs if d not in GRADLE_SETUP_SKIP_DIRS)
+        rel_dir = os.path.relpath(current_dir, build_dir)
+        in_wrapper_dir = rel_dir.replace("\\", "/").split("/")[0] == "gradle"
+        for name in names:
+            if in_wrapper_dir or name in GRADLE_SETUP_FILES or name.endswith(GRADLE_SETUP_SUFFIXES):
+                files.append(os.path.normpath(os.path.join(rel_dir, name)))
+    if not any(os.path.basename(path) in ("gradlew", "gradlew.bat") for path in files):
+        return 0
+    clear_tree(warmup_dir, exclude=[".gradle"])
+    for rel_path in files:
+        target = os.path.join(warmup_dir, rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy2(os.path.join(build_dir, rel_path), target)
+    return len(files)
+
+def warm_up_gradle(build_dir, profile, watchdog_config, log=log_pipeline_step):
+    """提前启动 Gradle 守护进程并完成配置阶段，供随后的正式构建复用。
+    与正式构建一样在看门狗下执行，超时或无输出时结束进程树"""
+    if not profile.get("daemon"):
+        log("Gradle 预热跳过: 守护进程已禁用")
+        return True
+    gradle_cmd = "gradlew.bat" if os.name == "nt" else "./gradlew"
+    if not os.path.exists(os.path.join(build_dir, gradle_cmd)):
+        log(f"Gradle 预热跳过: 尚无可用的 Gradle 工程 {build_dir}")
+        return True
+
+    command = format_gradle_command(gradle_cmd, ["help"], profile)
+    log(f"Gradle 预热: {command}（目录 {build_dir}）")
+    start_time = time.time()
+    parser = GradleOutputParser(profile)
+    outcome = run_with_retry("gradle_warmup", command, "[GRADLE-WARMUP]", watchdog_config,
+                             line_handler_factory=lambda: parser.feed, cwd=build_dir)
+    duration = time.time() - start_time
+    if not outcome.success:
+        # 预热失败不影响正式构建
+        killed = f"（{outcome.killed}）" if outcome.killed else ""
+        log(f"[WARNING] Gradle 预热失败，返回码: {outcome.return_code}{killed}，耗时: {duration:.1f}s")
+    else:
+        state = "复用已有守护进程" if parser.daemon_reused else "已启动新守护进程"
+        log(f"Gradle 预热完成（{state}），耗时: {duration:.1f}s")
+    return True
+
+def diff_task_reports(previous, current):
+    """对比两次任务报告，找出本次不再增量（之前未执行、本次重新执行）的任务"""
+    previous_tasks = {task["path"]: task for task in previous.get("tasks", [])}
+    newly_executed = []
+    for task in current["tasks"]:
+        before = previous_tasks.get(task["path"])
+        if before and before["outcome"] in INCREMENTAL_OUTCOMES and task["outcome"] == "EXECUTED":
+            newly_executed.append({
+                "path": task["path"],
+                "previous_outcome": before["outcome"],
+                "duration_ms": task["duration_ms"],
+            })
+    newly_executed.sort(key=lambda task: task["duration_ms"], reverse=True)
+    return newly_executed
+
+def format_task_report(report, top=DEFAULT_TASK_REPORT_TOP):
+    """生成可读的热点任务报告"""
+    lines = []
+    summary = report["summary"]
+    lines.append(f"Gradle 任务报告 ({report['created']})")
+    lines.append(
+        f"任务数 {summary['task_count']}，累计耗时 {summary['total_ms'] / 1000:.1f}s，"
+        f"原生编译 {summary['native_ms'] / 1000:.1f}s"
+    )
+    lines.append("结果统计: " + ", ".join(f"{k} {v}" for k, v in sorted(summary["outcomes"].items())))
+    lines.append(f"耗时最多的 {top} 个任务:")
+    for rank, task in enumerate(report["tasks"][:top], 1):
+        marker = " [native]" if task["native"] else ""
+        lines.append(f"  {rank:>3}. {task['duration_ms'] / 1000:>8.1f}s  {task['outcome']:<11} {task['path']}{marker}")
+    native_tasks = [task for task in report["tasks"] if task["native"]]
+    if native_tasks:
+        lines.append("原生编译任务:")
+        for task in native_tasks:
+            lines.append(f"       {task['duration_ms'] / 1000:>8.1f}s  {task['outcome']:<11} {task['path']}")
+    if report.get("newly_executed") is not None:
+        if report["newly_executed"]:
+            lines.append("相比上次不再增量的任务:")
+            for task in report["newly_executed"]:
+                lines.append(
+                    f"       {task['duration_ms'] / 1000:>8.1f}s  {task['previous_outcome']} -> EXECUTED  {task['path']}"
+                )
+        else:
+            lines.append("相比上次没有新增的非增量任务")
+    return "\n".join(lines)
+
+def write_task_report(tasks, report_dir, log=log_pipeline_step):
+    """按耗时排序写出 JSON 与文本报告，并与上一次报告对比"""
+    os.makedirs(report_dir, exist_ok=True)
+    ranked = sorted(tasks, key=lambda task: task["duration_ms"], reverse=True)
+    outcomes = {}
+    for task in ranked:
+        outcomes[task["outcome"]] = outcomes.get(task["outcome"], 0) + 1
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "summary": {
+            "task_count": len(ranked),
+            "total_ms": sum(task["duration_ms"] for task in ranked),
+            "native_ms": sum(task["duration_ms"] for task in ranked if task["native"]),
+            "outcomes": outcomes,
+        },
+        "tasks": ranked,
+        "newly_executed": None,
+    }
+
+    latest_path = os.path.join(report_dir, "latest.json")
+    if os.path.exists(latest_path):
+        try:
+            with open(latest_path, 'r', encoding='utf-8') as f:
+                report["newly_executed"] = diff_task_reports(json.load(f), report)
+        except (OSError, ValueError) as e:
+            log(f"[WARNING] 读取上一次任务报告失败: {e}")
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    json_path = os.path.join(report_dir, f"gradle_tasks_{stamp}.json")
+    text_path = os.path.join(report_dir, f"gradle_tasks_{stamp}.txt")
+    text = format_task_report(report)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    with open(text_path, 'w', encoding='utf-8') as f:
+        f.write(text + "\n")
+    with open(latest_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    # 只保留最近的若干份报告
+    history = sorted(name for name in os.listdir(report_dir) if name.startswith("gradle_tasks_"))
+    for name in history[:-TASK_REPORT_KEEP * 2]:
+        os.remove(os.path.join(report_dir, name))
+
+    for line in text.splitlines():
+        log(line)
+    log(f"Gradle 任务报告: {json_path}")
+    return report
@@ -0,0 +1,370 @@
+import argparse
+import bisect
+import gzip
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from build_utils import get_cache_dir, log_pipeline_step
+from process_stream import FileSink, Sink
+
+# 日志归档配置的默认值，可通过 build_params.json 的 log_store 覆盖
+DEFAULT_LOG_STORE_CONFIG = {
+    "enabled": True,
+    "dir": None,            # 日志目录，默认 .build_cache/logs
+    "block_kb": 256,        # 每个压缩块的原始大小，查询时只解压命中的块
+    "max_file_mb": 64,      # 单个压缩文件的大小上限，超过后轮转到下一个分片
+    "keep_runs": 50,        # 保留最近的运行数
+}
+
+# 写入索引的行类型，按小写后的行匹配；只记录行号与截断后的内容
+MARK_PATTERNS = {
+    "error": re.compile(r"\[error\]|\berror\b[:\s]|^failure:|build failed|\bexception\b|错误|失败"),
+    "warning": re.compile(r"\[warning\]|\bwarning\b[:\s]|^w: |警告"),
+    "stage": re.compile(r"^> task |stage: "),
+}
+MARK_TEXT_LIMIT = 200
+WRITE_CHUNK_LINES = 1024
+# 候选行的关键字（小写）；先在整批输出上用 find 查找，只对候选行做正则分类，
+# 逐行执行多个忽略大小写的正则会让写入慢一个数量级
+MARK_KEYWORDS = tuple(keyword.encode('utf-8') for keyword in (
+    "error", "exception", "fail", "warning", "w: ", "> task ", "stage: ", "错误", "失败", "警告",
+))
+
+_log_root = None
+_config = dict(DEFAULT_LOG_STORE_CONFIG)
+
+def init_log_store(params, run_id):
+    """按参数初始化本进程的日志目录；未初始化时不归档"""
+    global _log_root, _config
+    _config = dict(DEFAULT_LOG_STORE_CONFIG)
+    _config.update((params or {}).get("log_store", {}))
+    if not _config.get("enabled"):
+        _log_root = None
+        return None
+    logs_dir = _config.get("dir") or get_cache_dir(params, "logs")
+    _log_root = os.path.join(logs_dir, run_id)
+    if params.get("variant"):
+        # 矩阵构建的各变体共用 BUILD_TAG，按变体分目录
+        _log_root = os.path.join(_log_root, params["variant"])
+    os.makedirs(_log_root, exist_ok=True)
+    prune_runs(logs_dir, int(_config.get("keep_runs", 50)))
+    return _log_root
+
+def prune_runs(logs_dir, keep_runs):
+    runs = sorted((entry for entry in os.scandir(logs_dir) if entry.is_dir()), key=lambda e: e.stat().st_mtime)
+    for entry in runs[:max(len(runs) - keep_runs, 0)]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+def open_log_sink(name):
+    """为一个输出流创建归档输出端；未初始化或已禁用时返回 None"""
+    if _log_root is None:
+        return None
+    return CompressedLogSink(_log_root, name, int(_config["block_kb"]) * 1024, int(_config["max_file_mb"]) * 1024 * 1024)
+
+def classify_line(lowered_line):
+    for kind, pattern in MARK_PATTERNS.items():
+        if pattern.search(lowered_line):
+            return kind
+    return None
+
+class CompressedLogSink(Sink):
+    """按块写入独立的 gzip 成员，并在 .idx 中记录块偏移与错误/警告/阶段行号"""
+
+    def __init__(self, root, name, block_size, max_file_bytes, **kwargs):
+        super().__init__(lossy=False, **kwargs)
+        self.root = root
+        self.name = name
+        self.block_size = block_size
+        self.max_file_bytes = max_file_bytes
+        self.line_number = 0
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._buffer_lines = 0
+        self._block_first_line = 1
+        self._rotate_pending = False
+        self._part = self._next_part()
+        self._open_part()
+
+    def _next_part(self):
+        part = 0
+        while os.path.exists(os.path.join(self.root, f"{self.name}.{part:03d}.log.gz")):
+            part += 1
+        return part
+
+    @property
+    def log_location(self):
+        return os.path.join(self.root, f"{self.name}.*.log.gz")
+
+    def _open_part(self):
+        base = os.path.join(self.root, f"{self.name}.{self._part:03d}")
+        self.log_path = base + ".log.gz"
+        self._log_file = open(self.log_path, 'wb')
+        self._index_file = open(base + ".idx", 'w', encoding='utf-8')
+        self._write_index({"type": "start", "name": self.name, "time": time.time(), "line": self.line_number + 1})
+
+    def _write_index(self, record):
+        self._index_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def write_lines(self, lines):
+        # 输出过快时一批可能有上万行，拆开处理，避免单个压缩块过大
+        for i in range(0, len(lines), WRITE_CHUNK_LINES):
+            chunk = lines[i:i + WRITE_CHUNK_LINES]
+            if self._rotate_pending:
+                self._rotate_pending = False
+                self._close_part()
+                self._part += 1
+                self._open_part()
+            data = "".join(line + "\n" for line in chunk).encode('utf-8')
+            self._index_marks(data)
+            self._buffer.append(data)
+            self._buffer_bytes += len(data)
+            self._buffer_lines += len(chunk)
+            self.line_number += len(chunk)
+            if self._buffer_bytes >= self.block_size:
+                self._flush_block()
+
+    def _index_marks(self, data):
+        # 在 UTF-8 字节上查找：bytes.lower 只转换 ASCII，长度不变，位置可直接对应
+        lowered = data.lower()
+        positions = set()
+        for keyword in MARK_KEYWORDS:
+            position = lowered.find(keyword)
+            while position != -1:
+                positions.add(position)
+                position = lowered.find(keyword, position + 1)
+        line_number = self.line_number + 1
+        previous = 0
+        last_start = -1
+        marks = []
+        for position in sorted(positions):
+            line_number += data.count(b"\n", previous, position)
+            previous = position
+            start = data.rfind(b"\n", 0, position) + 1
+            if start == last_start:
+                continue
+            last_start = start
+            end = data.find(b"\n", position)
+            kind = classify_line(lowered[start:end].decode('utf-8', errors='replace'))
+            if kind:
+                text = data[start:end].decode('utf-8', errors='replace')[:MARK_TEXT_LIMIT]
+                marks.append(f'{{"type": "mark", "kind": "{kind}", "line": {line_number}, '
+                             f'"text": {json.dumps(text, ensure_ascii=False)}}}\n')
+        if marks:
+            self._index_file.write("".join(marks))
+
+    def _flush_block(self):
+        if not self._buffer:
+            return
+        block = gzip.compress(b"".join(self._buffer), compresslevel=6)
+        offset = self._log_file.tell()
+        self._log_file.write(block)
+        self._write_index({"type": "block", "offset": offset, "length": len(block),
+                           "first_line": self._block_first_line, "lines": self._buffer_lines})
+        self._block_first_line += self._buffer_lines
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._buffer_lines = 0
+        # 每块写完后刷新，构建中途也能查询已写入的部分
+        self._log_file.flush()
+        self._index_file.flush()
+        # 在下一批写入前再轮转，错误行的索引与所在的块始终位于同一分片，结束时也不会留下空分片
+        self._rotate_pending = self._log_file.tell() >= self.max_file_bytes
+
+    def _close_part(self):
+        self._write_index({"type": "end", "time": time.time(), "line": self.line_number})
+        self._log_file.close()
+        self._index_file.close()
+
+    def finish(self):
+        self._flush_block()
+        self._close_part()
+
+class LogIndex:
+    """读取一个分片的 .idx，按行号定位压缩块"""
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.log_path = index_path[:-len(".idx")] + ".log.gz"
+        self.name = None
+        self.blocks = []
+        self.marks = []
+        with open(index_path, 'r', encoding='utf-8') as f:
+            for raw in f:
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    # 正在写入的最后一行可能不完整
+                    continue
+                if record["type"] == "block":
+                    self.blocks.append(record)
+                elif record["type"] == "mark":
+                    self.marks.append(record)
+                elif record["type"] == "start":
+                    self.name = record["name"]
+        self._first_lines = [block["first_line"] for block in self.blocks]
+        self._cache = {}
+
+    def _read_block(self, block_index):
+        if block_index not in self._cache:
+            block = self.blocks[block_index]
+            with open(self.log_path, 'rb') as f:
+                f.seek(block["offset"])
+                data = gzip.decompress(f.read(block["length"]))
+            self._cache[block_index] = data.decode('utf-8').split("\n")[:-1]
+        return self._cache[block_index]
+
+    def get_lines(self, first, last):
+        """返回 [first, last] 范围内的 (行号, 内容)，只解压涉及的块"""
+        result = []
+        if not self.blocks:
+            return result
+        block_index = max(bisect.bisect_right(self._first_lines, first) - 1, 0)
+        while block_index < len(self.blocks):
+            block = self.blocks[block_index]
+            if block["first_line"] > last:
+                break
+            for offset, text in enumerate(self._read_block(block_index)):
+                number = block["first_line"] + offset
+                if first <= number <= last:
+                    result.append((number, text))
+            block_index += 1
+        return result
+
+def find_run_dir(logs_dir, run_id):
+    if run_id != "latest":
+        return os.path.join(logs_dir, run_id)
+    runs = [entry for entry in os.scandir(logs_dir) if entry.is_dir()]
+    if not runs:
+        return None
+    return max(runs, key=lambda e: e.stat().st_mtime).path
+
+def iter_indexes(run_dir, stage=None):
+    for root, dirs, files in os.walk(run_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".idx") and (stage is None or name.startswith(f"{stage}.")):
+                yield LogIndex(os.path.join(root, name))
+
+def query_logs(run_dir, stage=None, kind="error", pattern=None, context=0, limit=20):
+    """按索引查找匹配的行并输出上下文，返回匹配数"""
+    regex = re.compile(pattern) if pattern else None
+    count = 0
+    for index in iter_indexes(run_dir, stage):
+        for mark in index.marks:
+            if kind != "all" and mark["kind"] != kind:
+                continue
+            if regex and not regex.search(mark["text"]):
+                continue
+            count += 1
+            print(f"--- {os.path.relpath(index.log_path, run_dir)}:{mark['line']} [{mark['kind']}]")
+            for number, text in index.get_lines(mark["line"] - context, mark["line"] + context):
+                marker = ">" if number == mark["line"] else " "
+                print(f"{marker}{number:>8}: {text}")
+            if count >= limit:
+                return count
+    return count
+
+def list_runs(logs_dir, run_id=None):
+    run_dirs = [find_run_dir(logs_dir, run_id)] if run_id else sorted(
+        entry.path for entry in os.scandir(logs_dir) if entry.is_dir()
+    )
+    for run_dir in run_dirs:
+        if not run_dir or not os.path.isdir(run_dir):
+            continue
+        print(os.path.basename(run_dir))
+        for index in iter_indexes(run_dir):
+            counts = {}
+            for mark in index.marks:
+                counts[mark["kind"]] = counts.get(mark["kind"], 0) + 1
+            lines = index.blocks[-1]["first_line"] + index.blocks[-1]["lines"] - 1 if index.blocks else 0
+            print(f"  {os.path.relpath(index.log_path, run_dir):<40} {lines:>9} 行  "
+                  f"错误 {counts.get('error', 0):>5}  警告 {counts.get('warning', 0):>5}  "
+                  f"压缩后 {os.path.getsize(index.log_path) / 1024:.0f} KB")
+
+def _benchmark(line_count):
+    """比较普通文本写入与压缩+索引写入的耗时与体积"""
+    lines = []
+    for i in range(line_count):
+        if i % 500 == 0:
+            lines.append(f"e: /proj/app/src/Main.kt: ({i}, 1): error: unresolved reference")
+        elif i % 50 == 0:
+            lines.append(f"warning: [options] source value 8 is obsolete ({i})")
+        elif i % 20 == 0:
+            lines.append(f"> Task :app:compileReleaseJava{i}")
+        else:
+            lines.append(f"[GRADLE] 处理资源 assets/texture_{i}.png ... done")
+    batches = [lines[i:i + 256] for i in range(0, len(lines), 256)]
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        results = {}
+        for label, sink in (
+            ("plain", FileSink(os.path.join(work_dir, "plain.log"), mode='w')),
+            ("indexed", CompressedLogSink(work_dir, "indexed", 256 * 1024, 64 * 1024 * 1024)),
+        ):
+            start_time = time.time()
+            sink.start()
+            for batch in batches:
+                sink.put(batch)
+            sink.close()
+            results[label] = time.time() - start_time
+        plain_size = os.path.getsize(os.path.join(work_dir, "plain.log"))
+        indexed_size = sum(os.path.getsize(os.path.join(work_dir, name))
+                           for name in os.listdir(work_dir) if name.startswith("indexed."))
+
+        start_time = time.time()
+        index = LogIndex(os.path.join(work_dir, "indexed.000.idx"))
+        errors = [mark for mark in index.marks if mark["kind"] == "error"]
+        index.get_lines(errors[-1]["line"] - 5, errors[-1]["line"] + 5)
+        lookup_time = time.time() - start_time
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"普通写入:      {results['plain']:.2f}s, {plain_size / 1024 / 1024:.1f} MB")
+    print(f"压缩+索引写入: {results['indexed']:.2f}s, {indexed_size / 1024 / 1024:.1f} MB "
+          f"(开销 {(results['indexed'] / results['plain'] - 1) * 100:+.0f}%，"
+          f"每行多 {(results['indexed'] - results['plain']) / line_count * 1e6:.2f}µs)")
+    print(f"定位最后一个错误并读取上下文: {lookup_time * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建日志归档查询")
+    parser.add_argument("command", choices=["query", "list", "bench"],
+                        help="query: 查找错误/警告/阶段行; list: 列出归档; bench: 写入开销测试")
+    parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    parser.add_argument("--run", default=None, help="运行编号（BUILD_TAG 或追踪中的 run_id）或 latest，query 默认最近一次")
+    parser.add_argument("--stage", default=None, help="输出流名称，例如 cocos_export、gradle_build")
+    parser.add_argument("--kind", default="error", choices=["error", "warning", "stage", "all"], help="行类型")
+    parser.add_argument("--grep", default=None, help="再按正则过滤")
+    parser.add_argument("-C", "--context", type=int, default=3, help="上下文行数")
+    parser.add_argument("--limit", type=int, default=20, help="最多输出的匹配数")
+    parser.add_argument("--lines", type=int, default=500000, help="bench 的行数")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        _benchmark(args.lines)
+        sys.exit(0)
+
+    from build_modules import load_build_params
+
+    params = load_build_params(args.params) or {}
+    config = dict(DEFAULT_LOG_STORE_CONFIG)
+    config.update(params.get("log_store", {}))
+    logs_dir = config.get("dir") or get_cache_dir(params, "logs")
+    if not os.path.isdir(logs_dir):
+        log_pipeline_step(f"[ERROR] 日志目录不存在: {logs_dir}")
+        sys.exit(1)
+    if args.command == "list":
+        list_runs(logs_dir, args.run)
+        sys.exit(0)
+
+    run_dir = find_run_dir(logs_dir, args.run or "latest")
+    if not run_dir or not os.path.isdir(run_dir):
+        log_pipeline_step(f"[ERROR] 未找到运行 {args.run} 的日志")
+        sys.exit(1)
+    if query_logs(run_dir, args.stage, args.kind, args.grep, args.context, args.limit) == 0:
+        print("没有匹配的行")
@@ -5,6 +5,12 @@ import sys
 import time
 import datetime
 
+from build_modules import clean_workspace
+from build_trace import get_run_id
+from log_store import init_log_store, open_log_sink
+from process_stream import run_streamed
+from resource_monitor import init_resource_monitor, open_resource_monitor
+
 def log_pipeline_step(message):
     """输出带有管道格式的日志信息"""
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -34,7 +40,7 @@ def load_build_params(file_path='build_params.json'):
 
     return params
 
-def run_git_commands(project_path):
+def run_git_commands(project_path, params):
     log_pipeline_step("STAGE: Git操作 - 清理并更新代码")
     
     if not os.path.exists(project_path):
@@ -61,20 +67,9 @@ def run_git_commands(project_path):
         else:
             log_pipeline_step("git checkout完成")
             
-        # 清理缓存文件
-        log_pipeline_step("执行git clean -xdf清理缓存文件...")
-        clean_process = subprocess.run(
-            ["git", "clean", "-xdf"],
-            capture_output=True,
-            text=True
-        )
-        if clean_process.stdout.strip():
-            log_pipeline_step(clean_process.stdout)
-        if clean_process.returncode != 0:
-            log_pipeline_step(f"[ERROR] git clean失败: {clean_process.stderr}")
+        # 清理未跟踪文件（按配置保留缓存目录）
+        if not clean_workspace(project_path, params):
             return False
-        else:
-            log_pipeline_step("git clean完成")
         
         # 执行git pull更新代码
         log_pipeline_step("执行git pull更新代码...")
@@ -106,13 +101,15 @@ def execute_build_command(params):
     project_path = params.get("project_path", "D:/work/Game363")
     config_file = params.get("config_path", "buildConfig_android.json")
     mode = params.get("game_type", "release")
+    # Git操作会切换工作目录，先记录参数文件的绝对路径
+    build_params_path = os.path.abspath('build_params.json')
     
     # 先执行Git操作
-    if not run_git_commands(project_path):
+    if not run_git_commands(project_path, params):
         log_pipeline_step("[WARNING] Git操作失败，但仍将继续构建流程")
     
     # 构建命令
-    command = f'python build.py --creator "{creator_path}" --project "{project_path}" --config {config_file} --mode {mode}'
+    command = f'python build.py --creator "{creator_path}" --project "{project_path}" --config {config_file} --mode {mode} --build-params "{build_params_path}"'
     
     log_pipeline_step(f"STAGE: 执行构建命令")
     log_pipeline_step(f"执行命令: {command}")
@@ -127,25 +124,9 @@ def execute_build_command(params):
         start_time = time.time()
         log_pipeline_step(f"开始构建，时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            shell=True
-        )
-        
-        # 实时输出日志
-        for line in iter(process.stdout.readline, b''):
-            try:
-                decoded_line = line.decode('utf-8').strip()
-            except UnicodeDecodeError:
-                decoded_line = line.decode('gbk', errors='replace').strip()
-            
-            if decoded_line:
-                print(f"[BUILD] {decoded_line}")
-            
-        # 等待进程完成
-        return_code = process.wait()
+        # 实时输出日志并等待进程完成
+        return_code = run_streamed(command, "[BUILD]", extra_sinks=[open_log_sink("build")],
+                                   monitors=[open_resource_monitor("build")]).return_code
         
         end_time = time.time()
         duration = end_time - start_time
@@ -165,6 +146,8 @@ if __name__ == '__main__':
     
     params = load_build_params()
     if params:
+        init_log_store(params, get_run_id())
+        init_resource_monitor(params)
         execute_build_command(params)
         
     end_time = time.time()
@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from build_modules import clean_workspace, list_build_outputs, load_build_params
+from gradle_utils import get_android_outputs
+from build_utils import SCRIPT_DIR, log_pipeline_step
+from process_stream import CallbackSink, FileSink, stream_process
+
+# 每个变体在自己的工作树里依次执行的阶段
+MATRIX_STAGES = ["asset_optimize", "cocos_build", "apk_build", "verify_build"]
+
+DEFAULT_MATRIX_WORKERS = 2
+
+# 仅在主参数中有意义、不传给变体的键
+MATRIX_ONLY_KEYS = ["variants", "matrix_workers", "matrix_worktree_root", "matrix_output_dir", "distributed_build"]
+
+_print_lock = threading.Lock()
+# git worktree 操作会修改主仓库的元数据，需要串行执行
+_git_lock = threading.Lock()
+
+def log_matrix(message):
+    """多线程下串行输出日志"""
+    with _print_lock:
+        log_pipeline_step(message)
+
+def get_variant_name(variant):
+    """变体名称：未指定 name 时由构建类型与配置文件名组合"""
+    if variant.get("name"):
+        return variant["name"]
+    config_name = os.path.splitext(os.path.basename(variant.get("config_path", "")))[0]
+    return f"{variant.get('game_type', 'release')}-{config_name}"
+
+def safe_dir_name(name):
+    return re.sub(r"[^0-9A-Za-z._-]+", "_", name)
+
+def resolve_head(project_path):
+    result = subprocess.run(
+        ["git", "rev-parse", "HEAD"],
+        cwd=project_path,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"获取 HEAD 失败: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+def prepare_worktree(project_path, worktree_path, commit, params, log=log_matrix):
+    """创建或复用变体工作树，并切换到指定提交；log 接收清理过程的日志"""
+    if os.path.exists(os.path.join(worktree_path, ".git")):
+        commands = [
+            ["git", "checkout", "--detach", "--force", commit],
+        ]
+        cwd = worktree_path
+    else:
+        os.makedirs(os.path.dirname(worktree_path), exist_ok=True)
+        commands = [
+            ["git", "worktree", "prune"],
+            ["git", "worktree", "add", "--detach", "--force", worktree_path, commit],
+        ]
+        cwd = project_path
+
+    with _git_lock:
+        for command in commands:
+            result = subprocess.run(command, cwd=cwd, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"{' '.join(command)} 失败: {result.stderr.strip()}")
+
+    # 复用的工作树按主参数的清理模式清理，保留各自的导入缓存
+    if not clean_workspace(worktree_path, params, log=log):
+        raise RuntimeError(f"清理工作树失败: {worktree_path}")
+
+def run_variant(base_params, variant, commit, worktree_root, output_dir, line_handler=None):
+    """在独立工作树中构建单个变体，返回结果摘要；line_handler 逐行接收各阶段的输出"""
+    name = get_variant_name(variant)
+    dir_name = safe_dir_name(name)
+    variant_output = os.path.join(output_dir, dir_name)
+    os.makedirs(variant_output, exist_ok=True)
+    log_path = os.path.join(variant_output, "build.log")
+    summary = {"name": name, "success": False, "stages": {}, "artifacts": [], "log": log_path}
+    start_time = time.time()
+
+    worktree_path = os.path.join(worktree_root, dir_name)
+    variant_params = {k: v for k, v in base_params.items() if k not in MATRIX_ONLY_KEYS}
+    variant_params.update(variant)
+    variant_params.pop("name", None)
+    # 产物仓库按变体名索引
+    variant_params["variant"] = name
+    variant_params["project_path"] = worktree_path
+
+    params_path = os.path.join(variant_output, "build_params.json")
+    with open(params_path, 'w', encoding='utf-8') as f:
+        json.dump(variant_params, f, ensure_ascii=False, indent=4)
+
+    try:
+        log_matrix(f"[{name}] 准备工作树: {worktree_path}")
+        stage_start = time.time()
+        prepare_worktree(base_params["project_path"], worktree_path, commit, base_params,
+                         log=lambda message: log_matrix(f"[{name}] {message}"))
+        summary["stages"]["worktree"] = time.time() - stage_start
+
+        # 子进程输出写入文件，统一使用 UTF-8 避免 Windows 下的编码错误
+        env = dict(os.environ, PYTHONIOENCODING="utf-8")
+        open(log_path, 'w').close()
+        for stage in MATRIX_STAGES:
+            log_matrix(f"[{name}] 开始阶段: {stage}")
+            stage_start = time.time()
+            sinks = [FileSink(log_path)]
+            if line_handler:
+                sinks.append(CallbackSink(line_handler))
+            return_code = stream_process(
+                [sys.executable, os.path.join(SCRIPT_DIR, "build_modules.py"), stage, "--params", params_path],
+                sinks,
+                cwd=SCRIPT_DIR,
+                shell=False,
+                env=env
+            ).return_code
+            summary["stages"][stage] = time.time() - stage_start
+            if return_code != 0:
+                log_matrix(f"[{name}] [ERROR] 阶段 {stage} 失败，返回码: {return_code}，日志: {log_path}")
+                return summary
+
+        # 收集产物到变体自己的输出目录
+        artifact_dir = os.path.join(variant_output, "artifacts")
+        os.makedirs(artifact_dir, exist_ok=True)
+        for artifact in list_build_outputs(worktree_path, variant_params.get("game_type", "release"),
+                                           get_android_outputs(variant_params)):
+            target = os.path.join(artifact_dir, os.path.basename(artifact))
+            shutil.copy2(artifact, target)
+            summary["artifacts"].append(target)
+
+        summary["success"] = True
+        log_matrix(f"[{name}] 构建完成 ✅")
+    except Exception as e:
+        log_matrix(f"[{name}] [ERROR] 构建失败: {e}")
+        summary["error"] = str(e)
+    finally:
+        summary["duration"] = time.time() - start_time
+    return summary
+
+def log_matrix_summary(results, wall_time):
+    """输出各变体的分阶段耗时汇总"""
+    log_pipeline_step("矩阵构建耗时汇总:")
+    columns = ["worktree"] + MATRIX_STAGES
+    log_pipeline_step("  " + f"{'variant':<28}" + "".join(f"{c:>14}" for c in columns) + f"{'total':>10}  result")
+    for result in results:
+        cells = "".join(
+            f"{result['stages'][c]:>13.1f}s" if c in result["stages"] else f"{'-':>14}" for c in columns
+        )
+        status = "✅" if result["success"] else "❌"
+        log_pipeline_step(f"  {result['name']:<28}{cells}{result['duration']:>9.1f}s  {status}")
+
+    serial_time = sum(result["duration"] for result in results)
+    speedup = serial_time / wall_time if wall_time > 0 else 0
+    log_pipeline_step(f"  总墙钟时间: {wall_time:.1f}s，各变体耗时之和: {serial_time:.1f}s，加速比: {speedup:.2f}x")
+
+def run_matrix_build(params):
+    """按 variants 列表在独立工作树中并行构建多个变体"""
+    log_pipeline_step("STAGE: 矩阵构建")
+    variants = params.get("variants") or []
+    if not variants:
+        log_pipeline_step("[ERROR] build_params.json 中没有配置 variants")
+        return False
+
+    project_path = params.get("project_path")
+    names = [get_variant_name(v) for v in variants]
+    if len(set(names)) != len(names):
+        log_pipeline_step(f"[ERROR] 变体名称重复: {names}")
+        return False
+
+    worktree_root = os.path.abspath(params.get("matrix_worktree_root", project_path.rstrip("/\\") + "_matrix"))
+    output_dir = os.path.abspath(params.get("matrix_output_dir", os.path.join(SCRIPT_DIR, "matrix_output")))
+    workers = int(params.get("matrix_workers", DEFAULT_MATRIX_WORKERS))
+
+    try:
+        commit = resolve_head(project_path)
+    except Exception as e:
+        log_pipeline_step(f"[ERROR] {e}")
+        return False
+
+    log_pipeline_step(f"构建提交: {commit}，变体数: {len(variants)}，并行数: {workers}")
+    log_pipeline_step(f"工作树目录: {worktree_root}，输出目录: {output_dir}")
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(run_variant, params, variant, commit, worktree_root, output_dir)
+            for variant in variants
+        ]
+        results = [future.result() for future in futures]
+    wall_time = time.time() - start_time
+
+    log_matrix_summary(results, wall_time)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "matrix_summary.json"), 'w', encoding='utf-8') as f:
+        json.dump({"commit": commit, "wall_time": wall_time, "variants": results}, f, ensure_ascii=False, indent=2)
+
+    return all(result["success"] for result in results)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="多变体并行矩阵构建")
+    parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    parser.add_argument("--workers", type=int, default=None, help="并行构建的变体数量")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    params = load_build_params(args.params)
+    if not params:
+        sys.exit(1)
+    if args.workers:
+        params["matrix_workers"] = args.workers
+
+    if not run_matrix_build(params):
+        sys.exit(1)
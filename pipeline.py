@@ -0,0 +1,215 @@
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import build_modules
+from build_trace import init_tracer, trace_span
+from build_utils import log_pipeline_step
+from log_store import init_log_store
+from resource_monitor import init_resource_monitor, log_resource_summary
+from stage_retry import log_watchdog_summary
+
+class Stage:
+    """流水线中的一个阶段：name 唯一，deps 为依赖的阶段名"""
+
+    def __init__(self, name, func, deps=(), auxiliary=False):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        # 辅助阶段（如预热）失败不影响流水线结果，随依赖它的主阶段自动加入
+        self.auxiliary = auxiliary
+
+def default_stages():
+    """git_update -> cocos_build -> apk_build -> verify_build -> publish，资源预优化与 Gradle 预热为辅助阶段。
+    Gradle 预热在导出范围之外的预热工程中执行，与资源预优化、Cocos 工程生成同时进行"""
+    return [
+        Stage("git_update", build_modules.run_git_update),
+        Stage("asset_optimize", build_modules.run_asset_optimize, deps=["git_update"], auxiliary=True),
+        Stage("cocos_build", build_modules.run_cocos_build, deps=["git_update", "asset_optimize"]),
+        Stage("gradle_warmup", build_modules.run_gradle_warmup, deps=["git_update"], auxiliary=True),
+        Stage("apk_build", build_modules.run_apk_build, deps=["cocos_build", "gradle_warmup"]),
+        Stage("verify_build", build_modules.verify_build, deps=["apk_build"]),
+        Stage("publish", build_modules.run_publish, deps=["verify_build"]),
+    ]
+
+def select_stages(stages, selected_names):
+    """根据 --stages 选择阶段；未选中的依赖视为已满足，辅助阶段随依赖它的阶段加入"""
+    by_name = {stage.name: stage for stage in stages}
+    unknown = [name for name in selected_names if name not in by_name]
+    if unknown:
+        raise ValueError(f"未知阶段: {', '.join(unknown)} (可选: {', '.join(by_name)})")
+
+    selected = set(selected_names)
+    for stage in stages:
+        if stage.name in selected:
+            selected.update(dep for dep in stage.deps if by_name[dep].auxiliary)
+    return [stage for stage in stages if stage.name in selected]
+
+def resume_stages(stages, params):
+    """按依赖顺序校验检查点，从第一个无效的阶段开始执行；其后的阶段一律重新执行"""
+    by_name = {stage.name: stage for stage in stages}
+    valid = set()
+    for stage in stages:
+        if stage.auxiliary:
+            continue
+        deps = [dep for dep in stage.deps if dep in by_name and not by_name[dep].auxiliary]
+        if all(dep in valid for dep in deps) and build_modules.check_stage_checkpoint(stage.name, params):
+            valid.add(stage.name)
+    remaining = [stage for stage in stages if stage.name not in valid]
+    # 辅助阶段只在仍有依赖它的阶段要执行时保留
+    needed = {dep for stage in remaining if not stage.auxiliary for dep in stage.deps}
+    return [stage for stage in remaining if not stage.auxiliary or stage.name in needed]
+
+class PipelineRunner:
+    """在单进程内按依赖关系调度阶段，相互独立的阶段并行执行"""
+
+    def __init__(self, stages, params, max_workers=2):
+        self.stages = stages
+        self.params = params
+        self.max_workers = max_workers
+        self.records = {}
+        self._lock = threading.Lock()
+
+    def _run_stage(self, stage):
+        with trace_span(stage.name, category="stage") as span:
+            try:
+                result = bool(stage.func(self.params))
+            except Exception as e:
+                log_pipeline_step(f"[ERROR] 阶段 {stage.name} 异常: {e}")
+                result = False
+            span.set(exit_code=0 if result else 1)
+        if result and not stage.auxiliary:
+            build_modules.save_stage_checkpoint(stage.name, self.params, span.duration)
+        with self._lock:
+            self.records[stage.name] = {"start": span.start, "end": span.end, "success": result}
+        return result
+
+    def run(self):
+        names = {stage.name for stage in self.stages}
+        pending = {stage.name: stage for stage in self.stages}
+        done = set()
+        failed = False
+        self.start_time = time.time()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            while pending or running:
+                if not failed:
+                    for name, stage in list(pending.items()):
+                        # 只等待本次选中的依赖
+                        if all(dep in done or dep not in names for dep in stage.deps):
+                            log_pipeline_step(f"启动阶段: {name}")
+                            running[executor.submit(self._run_stage, stage)] = stage
+                            del pending[name]
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    if future.result() or stage.auxiliary:
+                        done.add(stage.name)
+                    else:
+                        log_pipeline_step(f"[ERROR] 阶段 {stage.name} 失败，停止调度后续阶段 ❌")
+                        failed = True
+
+        self.end_time = time.time()
+        for name in pending:
+            log_pipeline_step(f"阶段 {name} 未执行")
+        return not failed and not pending
+
+    def critical_path(self):
+        """从最后结束的阶段沿最晚结束的依赖回溯，得到关键路径"""
+        by_name = {stage.name: stage for stage in self.stages}
+        if not self.records:
+            return []
+        current = max(self.records, key=lambda name: self.records[name]["end"])
+        path = [current]
+        while True:
+            deps = [dep for dep in by_name[current].deps if dep in self.records]
+            if not deps:
+                break
+            current = max(deps, key=lambda name: self.records[name]["end"])
+            path.append(current)
+        return list(reversed(path))
+
+    def log_report(self):
+        """输出各阶段耗时与关键路径"""
+        if not self.records:
+            return
+        wall_time = self.end_time - self.start_time
+        log_pipeline_step("阶段耗时报告:")
+        for stage in self.stages:
+            record = self.records.get(stage.name)
+            if not record:
+                continue
+            offset = record["start"] - self.start_time
+            duration = record["end"] - record["start"]
+            status = "✅" if record["success"] else "❌"
+            log_pipeline_step(f"  {stage.name:<14} 开始 +{offset:>7.1f}s  耗时 {duration:>7.1f}s  {status}")
+
+        path = self.critical_path()
+        path_time = sum(self.records[name]["end"] - self.records[name]["start"] for name in path)
+        serial_time = sum(record["end"] - record["start"] for record in self.records.values())
+        log_pipeline_step(f"关键路径: {' -> '.join(path)} ({path_time:.1f}s)")
+        log_pipeline_step(
+            f"总耗时: {wall_time:.1f}s，各阶段串行耗时之和: {serial_time:.1f}s，"
+            f"并行节省: {max(serial_time - wall_time, 0):.1f}s"
+        )
+        log_watchdog_summary()
+        log_resource_summary()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="单进程构建流水线")
+    parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    parser.add_argument("--stages", default=None,
+                        help="要执行的阶段，逗号分隔 (默认全部): git_update,cocos_build,apk_build,verify_build,publish")
+    parser.add_argument("--resume", action="store_true",
+                        help="校验各阶段检查点，从第一个未完成或已失效的阶段开始执行")
+    parser.add_argument("--commit", default=None, help="git_update 拉取后切换到该提交（默认构建分支最新提交）")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    start_time = time.time()
+    log_pipeline_step("开始执行构建流水线")
+
+    # 参数只加载一次，所有阶段共用
+    params = build_modules.load_build_params(args.params)
+    if not params:
+        sys.exit(1)
+    if args.commit:
+        params["commit"] = args.commit
+
+    stages = default_stages()
+    if args.stages:
+        try:
+            stages = select_stages(stages, [name.strip() for name in args.stages.split(",") if name.strip()])
+        except ValueError as e:
+            log_pipeline_step(f"[ERROR] {e}")
+            sys.exit(1)
+
+    if args.resume or params.get("resume"):
+        stages = resume_stages(stages, params)
+        if not stages:
+            log_pipeline_step("所有阶段的检查点均有效，无需执行 ✅")
+            return
+        log_pipeline_step(f"从检查点恢复，执行阶段: {', '.join(stage.name for stage in stages)}")
+
+    tracer = init_tracer(params, "pipeline")
+    init_log_store(params, tracer.run_id)
+    init_resource_monitor(params)
+    runner = PipelineRunner(stages, params)
+    result = runner.run()
+    runner.log_report()
+    tracer.finish()
+
+    duration_str = time.strftime("%H:%M:%S", time.gmtime(time.time() - start_time))
+    log_pipeline_step(f"构建流水线执行完毕，总耗时: {duration_str}")
+    if not result:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+import argparse
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from build_utils import log_pipeline_step
+
+# 每次从子进程管道读取的字节数，按块读取比逐行 readline 的系统调用少得多
+READ_CHUNK_SIZE = 64 * 1024
+# 每个输出端的缓冲队列最多容纳的批次数
+DEFAULT_SINK_QUEUE_SIZE = 256
+# 看门狗检查超时的间隔秒数
+WATCHDOG_POLL_INTERVAL = 1.0
+
+def decode_line(raw_line):
+    """优先按 UTF-8 解码，失败时回退到 GBK（Windows 中文环境下的工具输出）"""
+    try:
+        return raw_line.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw_line.decode('gbk', errors='replace')
+
+class LineSplitter:
+    """增量切分字节流：跨块的半行保留到下一块，完整行才解码"""
+
+    def __init__(self):
+        self._pending = b''
+
+    def feed(self, chunk):
+        data = self._pending + chunk if self._pending else chunk
+        parts = data.split(b'\n')
+        self._pending = parts.pop()
+        return [decode_line(part).rstrip() for part in parts]
+
+    def flush(self):
+        if not self._pending:
+            return []
+        line = decode_line(self._pending).rstrip()
+        self._pending = b''
+        return [line]
+
+class Sink:
+    """输出端基类：在独立线程中按批处理行，bounded 队列满时按 lossy 策略处理"""
+
+    # 完整保存输出的位置（日志文件等），控制台丢行时提示到这里查看；None 表示不保存
+    log_location = None
+
+    def __init__(self, queue_size=DEFAULT_SINK_QUEUE_SIZE, lossy=False):
+        self.lossy = lossy
+        self.dropped_lines = 0
+        self.failed_batches = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, lines):
+        if self.lossy:
+            # 可丢弃的输出端（如控制台）不能反压子进程
+            try:
+                self._queue.put_nowait(lines)
+            except queue.Full:
+                self.dropped_lines += len(lines)
+        else:
+            self._queue.put(lines)
+
+    def close(self):
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join()
+        self.finish()
+
+    def _run(self):
+        while True:
+            lines = self._queue.get()
+            if lines is None:
+                break
+            # 合并已排队的批次，减少写入次数
+            batch = list(lines)
+            while True:
+                try:
+                    more = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    self._write(batch)
+                    return
+                batch.extend(more)
+            self._write(batch)
+
+    def _write(self, lines):
+        # 处理失败时继续消费队列，否则非 lossy 的 put 会在队列满后永远阻塞子进程的读取
+        try:
+            self.write_lines(lines)
+        except Exception as e:
+            self.failed_batches += 1
+            if self.failed_batches == 1:
+                log_pipeline_step(f"[WARNING] 输出端 {type(self).__name__} 处理失败，之后的失败不再提示: {e!r}")
+
+    def write_lines(self, lines):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+class ConsoleSink(Sink):
+    """带前缀输出到标准输出，空行跳过；lossy 时控制台过慢则丢弃并在结束时提示，
+    只应在 full_log 完整保存了输出时开启"""
+
+    def __init__(self, prefix, stream=None, lossy=False, full_log=None, **kwargs):
+        super().__init__(lossy=lossy, **kwargs)
+        self.prefix = f"{prefix} " if prefix else ""
+        self.stream = stream or sys.stdout
+        self.full_log = full_log
+
+    def write_lines(self, lines):
+        text = "".join(f"{self.prefix}{line}\n" for line in lines if line.strip())
+        if text:
+            self.stream.write(text)
+            self.stream.flush()
+
+    def finish(self):
+        if self.dropped_lines:
+            location = f"（完整内容见 {self.full_log}）" if self.full_log else ""
+            self.stream.write(f"{self.prefix}... 控制台输出过慢，省略 {self.dropped_lines} 行{location}\n")
+            self.stream.flush()
+
+class FileSink(Sink):
+    """完整写入日志文件（UTF-8），不丢行"""
+
+    def __init__(self, file_path, mode='a', **kwargs):
+        super().__init__(lossy=False, **kwargs)
+        self.log_location = file_path
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        self._file = open(file_path, mode, encoding='utf-8')
+
+    def write_lines(self, lines):
+        self._file.write("".join(line + "\n" for line in lines))
+
+    def finish(self):
+        self._file.close()
+
+class CallbackSink(Sink):
+    """逐行回调，用于输出解析（如 Gradle 任务统计）"""
+
+    def __init__(self, callback, **kwargs):
+        super().__init__(lossy=False, **kwargs)
+        self.callback = callback
+
+    def write_lines(self, lines):
+        for line in lines:
+            if line:
+                self.callback(line)
+
+def kill_process_tree(process):
+    """结束子进程及其所有子孙进程（Creator/Gradle 会再启动子进程，只结束 shell 不够）"""
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        # 启用看门狗时子进程是新会话的首进程，进程组号即其 pid
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+class Watchdog:
+    """监控子进程的总耗时与无输出时间，超出限制时结束整个进程树"""
+
+    def __init__(self, process, timeout=None, idle_timeout=None):
+        self.process = process
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.start_time = time.time()
+        self.last_output = self.start_time
+        # 触发结束的原因: "timeout"（总耗时超限）或 "idle"（长时间无输出）
+        self.reason = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def touch(self):
+        self.last_output = time.time()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(WATCHDOG_POLL_INTERVAL):
+            now = time.time()
+            if self.timeout and now - self.start_time > self.timeout:
+                self.reason = "timeout"
+            elif self.idle_timeout and now - self.last_output > self.idle_timeout:
+                self.reason = "idle"
+            else:
+                continue
+            kill_process_tree(self.process)
+            return
+
+class StreamResult:
+    def __init__(self, return_code, line_count, duration, killed=None):
+        self.return_code = return_code
+        self.line_count = line_count
+        self.duration = duration
+        # 被看门狗结束时为结束原因，否则为 None
+        self.killed = killed
+
+    @property
+    def lines_per_second(self):
+        return self.line_count / self.duration if self.duration > 0 else 0.0
+
+def stream_process(command, sinks, cwd=None, shell=True, env=None, timeout=None, idle_timeout=None, monitors=()):
+    """启动子进程并把合并后的 stdout/stderr 分发到各输出端，返回 StreamResult
+
+    timeout / idle_timeout（秒）分别限制总耗时与无输出时间，超出时结束整个进程树。
+    monitors 在子进程启动后 attach(process)、结束后 detach()，用于资源采样等。
+    """
+    start_time = time.time()
+    for sink in sinks:
+        sink.start()
+
+    line_count = 0
+    watchdog = None
+    use_watchdog = bool(timeout or idle_timeout)
+    try:
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=cwd,
+            shell=shell,
+            env=env,
+            start_new_session=use_watchdog and os.name != "nt"
+        )
+        if use_watchdog:
+            watchdog = Watchdog(process, timeout, idle_timeout)
+            watchdog.start()
+        for monitor in monitors:
+            monitor.attach(process)
+        splitter = LineSplitter()
+        read = getattr(process.stdout, "read1", process.stdout.read)
+        while True:
+            chunk = read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            if watchdog:
+                watchdog.touch()
+            lines = splitter.feed(chunk)
+            if lines:
+                line_count += len(lines)
+                for sink in sinks:
+                    sink.put(lines)
+        lines = splitter.flush()
+        if lines:
+            line_count += len(lines)
+            for sink in sinks:
+                sink.put(lines)
+        return_code = process.wait()
+    finally:
+        if watchdog:
+            watchdog.stop()
+        for monitor in monitors:
+            monitor.detach()
+        for sink in sinks:
+            sink.close()
+
+    killed = watchdog.reason if watchdog else None
+    return StreamResult(return_code, line_count, time.time() - start_time, killed)
+
+def run_streamed(command, prefix, cwd=None, shell=True, line_handler=None, log_file=None, env=None,
+                 timeout=None, idle_timeout=None, extra_sinks=None, monitors=None):
+    """各构建阶段共用的便捷入口：控制台输出 + 可选解析回调 + 可选日志文件 + 其他输出端（如日志归档）
+
+    monitors 为子进程的观察者（如资源采样），None 会被忽略。
+    控制台只有在输出同时完整写入日志文件时才允许丢行，否则控制台就是唯一的日志。
+    """
+    file_sinks = [FileSink(log_file)] if log_file else []
+    file_sinks.extend(sink for sink in extra_sinks or () if sink)
+    full_log = next((sink.log_location for sink in file_sinks if sink.log_location), None)
+    sinks = [ConsoleSink(prefix, lossy=full_log is not None, full_log=full_log)]
+    if line_handler:
+        sinks.append(CallbackSink(line_handler))
+    sinks.extend(file_sinks)
+    return stream_process(command, sinks, cwd=cwd, shell=shell, env=env,
+                          timeout=timeout, idle_timeout=idle_timeout,
+                          monitors=[monitor for monitor in monitors or () if monitor])
+
+def _legacy_stream(command, stream):
+    """原有的逐行 readline + 逐行 print 实现，仅用于吞吐量对比"""
+    start_time = time.time()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
+    count = 0
+    for line in iter(process.stdout.readline, b''):
+        try:
+            decoded_line = line.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            decoded_line = line.decode('gbk', errors='replace').strip()
+        if decoded_line:
+            print(f"[BENCH] {decoded_line}", file=stream)
+        count += 1
+    process.wait()
+    return count, time.time() - start_time
+
+def _benchmark(lines, output):
+    """用 UTF-8/GBK 混合的合成输出比较原有循环与流式引擎的吞吐量"""
+    import tempfile
+
+    # 先生成数据文件，再由子进程一次性输出，避免生成速度成为瓶颈
+    with tempfile.NamedTemporaryFile(suffix=".log", delete=False) as data_file:
+        for i in range(lines):
+            if i % 10 == 0:
+                data_file.write(f"[BUILD] 警告: 资源 {i} 未压缩\n".encode('gbk'))
+            else:
+                data_file.write(f"[BUILD] 编译资源 assets/texture_{i}.png ... done\n".encode('utf-8'))
+    command = (
+        f'"{sys.executable}" -c "import shutil, sys; '
+        f'shutil.copyfileobj(open(sys.argv[1], \'rb\'), sys.stdout.buffer)" "{data_file.name}"'
+    )
+    try:
+        with open(output, 'w', encoding='utf-8') as stream:
+            legacy_count, legacy_time = _legacy_stream(command, stream)
+            result = stream_process(command, [ConsoleSink("[BENCH]", stream=stream, lossy=False)])
+    finally:
+        os.remove(data_file.name)
+    print(f"原有逐行循环: {legacy_count} 行, {legacy_time:.2f}s, {legacy_count / legacy_time:,.0f} 行/秒")
+    print(f"流式引擎:     {result.line_count} 行, {result.duration:.2f}s, {result.lines_per_second:,.0f} 行/秒")
+    print(f"提升: {legacy_time / result.duration:.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="子进程输出流式引擎吞吐量测试")
+    parser.add_argument("--lines", type=int, default=200000, help="合成输出的行数")
+    parser.add_argument("--output", default=os.devnull, help="控制台输出写入的位置")
+    args = parser.parse_args()
+    _benchmark(args.lines, args.output)
@@ -0,0 +1,404 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from artifact_store import hash_file, link_or_copy
+from build_utils import format_size, get_artifact_variant, get_cache_dir, log_pipeline_step
+from git_utils import get_head_commit
+
+# 发布配置的默认值，可通过 build_params.json 的 publish 覆盖
+DEFAULT_PUBLISH_CONFIG = {
+    "destination": None,      # 本地目录，或 http(s):// 地址（publish.py serve 提供的上传服务）；未配置时跳过发布
+    "path_template": "{variant}/{commit}",  # 产物在发布目标中的目录，可用 variant/commit/short_commit/game_type/build_tag
+    "workers": 4,             # 同时上传的产物数
+    "chunk_mb": 8,            # 分块大小，中断后从已上传的位置继续
+    "retries": 3,             # 每个分块的重试次数
+    "timeout": 60,            # HTTP 请求超时（秒）
+    "token": None,            # HTTP 上传服务的口令
+}
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+MANIFEST_NAME = "manifest.json"
+
+_print_lock = threading.Lock()
+
+def get_publish_config(params):
+    config = dict(DEFAULT_PUBLISH_CONFIG)
+    config.update((params or {}).get("publish", {}))
+    return config
+
+def log_publish(message):
+    with _print_lock:
+        log_pipeline_step(message)
+
+class OffsetMismatch(Exception):
+    """分块的起始位置与目标端已接收的字节数不一致（例如另一个上传已写入）"""
+
+    def __init__(self, offset):
+        super().__init__(f"目标端已接收 {offset} 字节")
+        self.offset = offset
+
+def check_rel_path(rel_path):
+    parts = rel_path.replace("\\", "/").split("/")
+    if rel_path.startswith("/") or any(part in ("", ".", "..") for part in parts):
+        raise ValueError(f"非法的发布路径: {rel_path}")
+    return "/".join(parts)
+
+class LocalDestination:
+    """本地目录（或网络共享）作为发布目标：内容按摘要保存在 .blobs 中，发布路径为指向内容的硬链接或副本"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.blobs_dir = os.path.join(self.root, ".blobs")
+        self.uploads_dir = os.path.join(self.root, ".uploads")
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def describe(self):
+        return self.root
+
+    def _blob_path(self, digest):
+        if not DIGEST_PATTERN.match(digest):
+            raise ValueError(f"非法的摘要: {digest}")
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def _part_path(self, digest):
+        self._blob_path(digest)
+        return os.path.join(self.uploads_dir, digest + ".part")
+
+    def has_blob(self, digest):
+        return os.path.exists(self._blob_path(digest))
+
+    def upload_offset(self, digest):
+        part_path = self._part_path(digest)
+        return os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+    def write_chunk(self, digest, offset, data):
+        part_path = self._part_path(digest)
+        with self._lock:
+            current = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if current != offset:
+                raise OffsetMismatch(current)
+            with open(part_path, 'ab') as f:
+                f.write(data)
+        return offset + len(data)
+
+    def complete(self, digest, size):
+        """校验已接收的内容与摘要一致后入库；不一致时丢弃，下次从头上传"""
+        part_path = self._part_path(digest)
+        blob_path = self._blob_path(digest)
+        if os.path.exists(blob_path):
+            return
+        if not os.path.exists(part_path):
+            raise RuntimeError(f"没有 {digest[:12]} 的上传记录")
+        actual_size = os.path.getsize(part_path)
+        actual = hash_file(part_path)
+        if actual_size != size or actual != digest:
+            os.remove(part_path)
+            raise RuntimeError(f"校验失败: 期望 {digest[:12]} ({size} 字节)，实际 {actual[:12]} ({actual_size} 字节)")
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(part_path, blob_path)
+
+    def put_file(self, rel_path, digest, size):
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path) or os.path.getsize(blob_path) != size:
+            raise RuntimeError(f"内容 {digest[:12]} 不存在")
+        target = os.path.join(self.root, *check_rel_path(rel_path).split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        link_or_copy(blob_path, target)
+
+class HttpDestination:
+    """HTTP 上传服务作为发布目标，协议与 LocalDestination 的操作一一对应（见 PublishRequestHandler）"""
+
+    def __init__(self, base_url, token=None, timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def describe(self):
+        return self.base_url
+
+    def _request(self, method, path, body=None, content_type="application/octet-stream"):
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if body is not None:
+            request.add_header("Content-Type", content_type)
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read()
+                return response.status, json.loads(data) if data else {}
+        except urllib.error.HTTPError as e:
+            data = e.read()
+            try:
+                payload = json.loads(data) if data else {}
+            except ValueError:
+                payload = {"error": data.decode('utf-8', errors='replace')}
+            return e.code, payload
+
+    def has_blob(self, digest):
+        status, _ = self._request("HEAD", f"/blobs/{digest}")
+        return status == 200
+
+    def upload_offset(self, digest):
+        status, payload = self._request("GET", f"/uploads/{digest}")
+        if status != 200:
+            raise RuntimeError(f"查询上传进度失败 ({status}): {payload.get('error')}")
+        return int(payload["offset"])
+
+    def write_chunk(self, digest, offset, data):
+        status, payload = self._request("PUT", f"/uploads/{digest}?offset={offset}", data)
+        if status == 409:
+            raise OffsetMismatch(int(payload["offset"]))
+        if status != 200:
+            raise RuntimeError(f"上传分块失败 ({status}): {payload.get('error')}")
+        return int(payload["offset"])
+
+    def complete(self, digest, size):
+        status, payload = self._request("POST", f"/uploads/{digest}?size={size}", b"")
+        if status not in (200, 201):
+            raise RuntimeError(f"完成上传失败 ({status}): {payload.get('error')}")
+
+    def put_file(self, rel_path, digest, size):
+        body = json.dumps({"sha256": digest, "size": size}).encode('utf-8')
+        status, payload = self._request("PUT", "/files/" + urllib.parse.quote(check_rel_path(rel_path)), body,
+                                        content_type="application/json")
+        if status not in (200, 201):
+            raise RuntimeError(f"登记文件失败 ({status}): {payload.get('error')}")
+
+def open_destination(config):
+    destination = config.get("destination")
+    if destination.startswith(("http://", "https://")):
+        return HttpDestination(destination, config.get("token"), float(config["timeout"]))
+    return LocalDestination(destination)
+
+def upload_blob(destination, file_path, digest, size, config):
+    """从目标端已接收的位置开始分块上传，返回本次实际传输的字节数与起始位置"""
+    chunk_size = int(float(config["chunk_mb"]) * 1024 * 1024)
+    retries = int(config["retries"])
+    offset = start_offset = destination.upload_offset(digest)
+    if offset > size:
+        offset = start_offset = 0
+    sent = 0
+    failures = 0
+    with open(file_path, 'rb') as f:
+        while offset < size:
+            f.seek(offset)
+            data = f.read(chunk_size)
+            try:
+                offset = destination.write_chunk(digest, offset, data)
+                sent += len(data)
+                failures = 0
+            except OffsetMismatch as e:
+                # 以目标端为准继续（例如上一次请求已写入但响应丢失）
+                offset = e.offset
+            except (OSError, RuntimeError) as e:
+                failures += 1
+                if failures > retries:
+                    raise
+                log_publish(f"[WARNING] 上传 {os.path.basename(file_path)} 分块失败（{e}），第 {failures} 次重试")
+                time.sleep(min(2 ** failures, 10))
+                try:
+                    offset = destination.upload_offset(digest)
+                except (OSError, RuntimeError):
+                    pass
+    destination.complete(digest, size)
+    return sent, start_offset
+
+def publish_file(destination, file_path, rel_path, config):
+    """发布单个文件：目标端已有相同摘要的内容时只登记路径，返回结果摘要"""
+    start_time = time.time()
+    size = os.path.getsize(file_path)
+    digest = hash_file(file_path)
+    result = {"name": os.path.basename(file_path), "path": rel_path, "size": size, "sha256": digest,
+              "sent": 0, "resumed_from": 0, "skipped": destination.has_blob(digest)}
+    if not result["skipped"]:
+        result["sent"], result["resumed_from"] = upload_blob(destination, file_path, digest, size, config)
+    destination.put_file(rel_path, digest, size)
+    result["duration"] = time.time() - start_time
+    return result
+
+def format_publish_path(config, params, commit):
+    return config["path_template"].format(
+        variant=get_artifact_variant(params),
+        commit=commit,
+        short_commit=commit[:12],
+        game_type=params.get("game_type", "release"),
+        build_tag=os.environ.get("BUILD_TAG", "local"),
+    ).strip("/")
+
+def log_publish_result(result):
+    if result["skipped"]:
+        status = "目标端已有相同内容，跳过上传"
+    else:
+        speed = result["sent"] / max(result["duration"], 1e-6) / (1024 * 1024)
+        status = f"上传 {format_size(result['sent'])}，{speed:.1f} MB/s"
+        if result["resumed_from"]:
+            status += f"（从 {format_size(result['resumed_from'])} 处续传）"
+    log_publish(f"  {result['name']:<36} {format_size(result['size']):>12}  sha256 {result['sha256'][:12]}  "
+                f"{status}，耗时 {result['duration']:.1f}s")
+
+def publish_artifacts(params, artifacts):
+    """把产物并行发布到配置的目标，最后发布包含各文件摘要的清单；返回是否全部成功"""
+    config = get_publish_config(params)
+    commit = get_head_commit(params.get("project_path"))
+    prefix = format_publish_path(config, params, commit)
+    destination = open_destination(config)
+    log_pipeline_step(f"发布 {len(artifacts)} 个产物到 {destination.describe()}/{prefix}")
+
+    start_time = time.time()
+    results = []
+    failed = []
+
+    def publish_one(file_path):
+        try:
+            result = publish_file(destination, file_path, f"{prefix}/{os.path.basename(file_path)}", config)
+            log_publish_result(result)
+            return result
+        except Exception as e:
+            log_publish(f"[ERROR] 发布 {os.path.basename(file_path)} 失败: {e}")
+            failed.append(file_path)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(int(config["workers"]), 1)) as executor:
+        results = [result for result in executor.map(publish_one, artifacts) if result]
+    if failed:
+        log_pipeline_step(f"[ERROR] {len(failed)} 个产物发布失败 ❌")
+        return False
+
+    # 清单最后发布，下游以清单存在作为本次发布完整的标志
+    manifest_path = os.path.join(get_cache_dir(params, "publish"), MANIFEST_NAME)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "commit": commit,
+            "variant": get_artifact_variant(params),
+            "game_version": params.get("game_version"),
+            "build_tag": os.environ.get("BUILD_TAG"),
+            "published": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "files": [{"name": r["name"], "size": r["size"], "sha256": r["sha256"]} for r in results],
+        }, f, indent=2, ensure_ascii=False)
+    publish_file(destination, manifest_path, f"{prefix}/{MANIFEST_NAME}", config)
+
+    wall_time = time.time() - start_time
+    total_sent = sum(r["sent"] for r in results)
+    skipped = sum(1 for r in results if r["skipped"])
+    log_pipeline_step(
+        f"发布完成: {len(results)} 个产物，上传 {format_size(total_sent)}，跳过 {skipped} 个，"
+        f"耗时 {wall_time:.1f}s，总吞吐 {total_sent / max(wall_time, 1e-6) / (1024 * 1024):.1f} MB/s"
+    )
+    return True
+
+class PublishServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, root, token=None):
+        super().__init__(address, PublishRequestHandler)
+        self.destination = LocalDestination(root)
+        self.token = token
+
+class PublishRequestHandler(BaseHTTPRequestHandler):
+    """上传服务（可作为对象存储的本地替身）：
+    HEAD /blobs/<sha256>                   内容是否已存在
+    GET  /uploads/<sha256>                 已接收的字节数
+    PUT  /uploads/<sha256>?offset=N        追加分块，N 与已接收字节数不一致时返回 409
+    POST /uploads/<sha256>?size=N          校验摘要与大小后入库
+    PUT  /files/<path>                     把路径指向已入库的内容（JSON: sha256, size）"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload=None):
+        body = json.dumps(payload or {}).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _dispatch(self):
+        token = self.server.token
+        if token and self.headers.get("Authorization") != f"Bearer {token}":
+            self._send_json(401, {"error": "unauthorized"})
+            return
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        kind, _, name = url.path.lstrip("/").partition("/")
+        name = urllib.parse.unquote(name)
+        destination = self.server.destination
+        try:
+            if kind == "blobs" and self.command == "HEAD":
+                self._send_json(200 if destination.has_blob(name) else 404)
+            elif kind == "uploads" and self.command == "GET":
+                self._send_json(200, {"offset": destination.upload_offset(name)})
+            elif kind == "uploads" and self.command == "PUT":
+                data = self._read_body()
+                offset = destination.write_chunk(name, int(query.get("offset", 0)), data)
+                self._send_json(200, {"offset": offset})
+            elif kind == "uploads" and self.command == "POST":
+                self._read_body()
+                destination.complete(name, int(query["size"]))
+                self._send_json(201)
+            elif kind == "files" and self.command == "PUT":
+                payload = json.loads(self._read_body())
+                destination.put_file(name, payload["sha256"], int(payload["size"]))
+                self._send_json(201)
+            else:
+                self._send_json(404, {"error": f"unknown request {self.command} {url.path}"})
+        except OffsetMismatch as e:
+            self._send_json(409, {"offset": e.offset})
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": str(e)})
+        except RuntimeError as e:
+            self._send_json(422, {"error": str(e)})
+
+    do_HEAD = do_GET = do_PUT = do_POST = _dispatch
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="发布构建产物，或启动本地上传服务")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="启动上传服务（对象存储的本地替身）")
+    serve_parser.add_argument("--root", required=True, help="保存发布内容的目录")
+    serve_parser.add_argument("--host", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=8767)
+    serve_parser.add_argument("--token", default=None, help="要求客户端提供的口令")
+    upload_parser = subparsers.add_parser("upload", help="发布指定文件（默认为当前构建产物）")
+    upload_parser.add_argument("files", nargs="*")
+    upload_parser.add_argument("--params", default="build_params.json", help="构建参数文件路径")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = PublishServer((args.host, args.port), args.root, args.token)
+        log_pipeline_step(f"上传服务已启动: http://{args.host}:{server.server_address[1]}，目录 {os.path.abspath(args.root)}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    from build_modules import list_build_outputs, load_build_params
+    from gradle_utils import get_android_outputs
+
+    build_params = load_build_params(args.params)
+    if not build_params or not get_publish_config(build_params).get("destination"):
+        log_pipeline_step("[ERROR] 未配置 publish.destination")
+        sys.exit(1)
+    files = args.files or list_build_outputs(build_params.get("project_path"), build_params.get("game_type", "release"),
+                                             get_android_outputs(build_params))
+    if not files:
+        log_pipeline_step("[ERROR] 没有可发布的产物")
+        sys.exit(1)
+    sys.exit(0 if publish_artifacts(build_params, files) else 1)
@@ -0,0 +1,416 @@
+import os
+import threading
+import time
+
+from build_trace import get_tracer
+from build_utils import format_size, log_pipeline_step
+
+# 资源采样配置的默认值，可通过 build_params.json 的 resource_monitor 覆盖
+DEFAULT_RESOURCE_MONITOR_CONFIG = {
+    "enabled": True,
+    "interval": 1.0,              # 采样间隔（秒）
+    "memory_warn_ratio": 0.85,    # 进程树内存峰值超过物理内存的该比例，或系统可用内存低于 1 - 该比例时警告
+    "idle_cpu_percent": 15,       # 平均 CPU 占用（单核百分比）低于此值视为大部分时间空闲
+    "idle_min_seconds": 60,       # 只对耗时超过此值的命令做空闲判断
+    # 与命令分离运行、不在其子进程树中的进程：按命令名配置命令行特征，采样时连同其子进程一并计入。
+    # Gradle 守护进程由 gradlew 启动后脱离，构建本身（含 CMake/clang）都在守护进程中执行。
+    # 同一机器上并发的其他构建共用守护进程时，统计会包含其他构建
+    "detached_processes": {
+        "gradle_build": ["org.gradle.launcher.daemon.bootstrap.GradleDaemon"],
+        "gradle_warmup": ["org.gradle.launcher.daemon.bootstrap.GradleDaemon"],
+    },
+}
+
+# 分离进程的查找间隔（采样次数），守护进程可能在命令开始后才启动
+DETACHED_RESCAN_SAMPLES = 10
+
+_config = dict(DEFAULT_RESOURCE_MONITOR_CONFIG)
+_summaries = []
+_summaries_lock = threading.Lock()
+_unsupported_logged = False
+
+def init_resource_monitor(params):
+    global _config
+    _config = dict(DEFAULT_RESOURCE_MONITOR_CONFIG)
+    _config.update((params or {}).get("resource_monitor", {}))
+
+def _get_psutil():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil
+
+class ProcessSnapshot:
+    """单个进程在某一时刻的累计 CPU 时间、内存、IO 与线程数"""
+
+    def __init__(self, pid, cpu_time, rss, read_bytes, write_bytes, threads):
+        self.pid = pid
+        self.cpu_time = cpu_time
+        self.rss = rss
+        self.read_bytes = read_bytes
+        self.write_bytes = write_bytes
+        self.threads = threads
+
+class PsutilReader:
+    def __init__(self, psutil):
+        self.psutil = psutil
+
+    def snapshot_tree(self, root_pids):
+        psutil = self.psutil
+        processes = {}
+        for root_pid in root_pids:
+            try:
+                root = psutil.Process(root_pid)
+                for process in [root] + root.children(recursive=True):
+                    processes[process.pid] = process
+            except psutil.Error:
+                continue
+        snapshots = []
+        for process in processes.values():
+            try:
+                with process.oneshot():
+                    cpu = process.cpu_times()
+                    try:
+                        io = process.io_counters()
+                        read_bytes, write_bytes = io.read_bytes, io.write_bytes
+                    except (psutil.Error, AttributeError):
+                        read_bytes = write_bytes = 0
+                    snapshots.append(ProcessSnapshot(process.pid, cpu.user + cpu.system, process.memory_info().rss,
+                                                     read_bytes, write_bytes, process.num_threads()))
+            except psutil.Error:
+                # 采样期间退出的进程
+                continue
+        return snapshots
+
+    def find_processes(self, markers):
+        """返回命令行包含任一特征的进程 pid"""
+        pids = []
+        for process in self.psutil.process_iter(["cmdline"]):
+            cmdline = " ".join(process.info.get("cmdline") or [])
+            if any(marker in cmdline for marker in markers):
+                pids.append(process.pid)
+        return pids
+
+    def memory_info(self):
+        memory = self.psutil.virtual_memory()
+        return memory.total, memory.available
+
+class ProcfsReader:
+    """无 psutil 时在 Linux 上直接读取 /proc"""
+
+    def __init__(self):
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+        self.page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def _read_stat(self, pid):
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            data = f.read()
+        # 进程名可能包含空格与括号，从最后一个 ")" 之后开始按字段切分（第 3 个字段起）
+        fields = data[data.rfind(")") + 2:].split()
+        return fields
+
+    def snapshot_tree(self, root_pids):
+        children = {}
+        stats = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                fields = self._read_stat(entry)
+            except OSError:
+                continue
+            pid = int(entry)
+            stats[pid] = fields
+            children.setdefault(int(fields[1]), []).append(pid)
+
+        snapshots = []
+        pending = list(root_pids)
+        seen = set()
+        while pending:
+            pid = pending.pop()
+            fields = stats.get(pid)
+            if fields is None or pid in seen:
+                continue
+            seen.add(pid)
+            pending.extend(children.get(pid, []))
+            read_bytes = write_bytes = 0
+            try:
+                with open(f"/proc/{pid}/io", 'r') as f:
+                    for line in f:
+                        key, _, value = line.partition(":")
+                        if key == "read_bytes":
+                            read_bytes = int(value)
+                        elif key == "write_bytes":
+                            write_bytes = int(value)
+            except OSError:
+                pass
+            snapshots.append(ProcessSnapshot(
+                pid,
+                (int(fields[11]) + int(fields[12])) / self.clock_ticks,
+                int(fields[21]) * self.page_size,
+                read_bytes,
+                write_bytes,
+                int(fields[17]),
+            ))
+        return snapshots
+
+    def find_processes(self, markers):
+        pids = []
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/cmdline", 'rb') as f:
+                    cmdline = f.read().replace(b"\0", b" ").decode('utf-8', 'replace')
+            except OSError:
+                continue
+            if any(marker in cmdline for marker in markers):
+                pids.append(int(entry))
+        return pids
+
+    def memory_info(self):
+        values = {}
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                values[key] = int(value.split()[0]) * 1024
+        return values.get("MemTotal"), values.get("MemAvailable", values.get("MemFree"))
+
+def get_reader():
+    """优先使用 psutil，Linux 上可退回 /proc；都不可用时返回 None"""
+    psutil = _get_psutil()
+    if psutil:
+        return PsutilReader(psutil)
+    if os.path.isdir("/proc/self"):
+        return ProcfsReader()
+    return None
+
+class ResourceSummary:
+    def __init__(self, name, duration, samples, cpu_time, peak_cpu, peak_rss, avg_rss,
+                 read_bytes, write_bytes, peak_threads, memory_total, min_available, detached=None):
+        self.name = name
+        self.duration = duration
+        self.samples = samples
+        self.cpu_time = cpu_time
+        self.peak_cpu = peak_cpu
+        self.peak_rss = peak_rss
+        self.avg_rss = avg_rss
+        self.read_bytes = read_bytes
+        self.write_bytes = write_bytes
+        self.peak_threads = peak_threads
+        self.memory_total = memory_total
+        self.min_available = min_available
+        # 配置了分离进程时为找到的进程数，为 0 表示只统计到了客户端进程；未配置时为 None
+        self.detached = detached
+
+    @property
+    def client_only(self):
+        return self.detached == 0
+
+    @property
+    def avg_cpu(self):
+        """整个命令期间的平均 CPU 占用（单核百分比，多核满载可超过 100）"""
+        return self.cpu_time / self.duration * 100 if self.duration > 0 else 0.0
+
+    def to_args(self):
+        return {
+            "avg_cpu": round(self.avg_cpu, 1), "peak_cpu": round(self.peak_cpu, 1),
+            "peak_rss": self.peak_rss, "avg_rss": self.avg_rss,
+            "read_bytes": self.read_bytes, "write_bytes": self.write_bytes,
+            "peak_threads": self.peak_threads, "samples": self.samples, "detached": self.detached,
+        }
+
+class ResourceMonitor:
+    """在后台线程中按间隔采样子进程树（及配置的分离进程），结束时输出峰值/平均值并写入追踪文件的计数器"""
+
+    def __init__(self, name, reader, config):
+        self.name = name
+        self.reader = reader
+        self.interval = float(config.get("interval", 1.0))
+        self.config = config
+        self.summary = None
+        self._process = None
+        self._stopped = threading.Event()
+        self._thread = None
+        # 各进程最近一次的累计值；已退出进程的最后一次采样仍计入总量
+        self._last = {}
+        # 分离进程在命令开始前已累计的值，第一次采样时记录，统计时扣除
+        self._baseline = {}
+        self._detached_markers = (config.get("detached_processes") or {}).get(name) or []
+        self._detached_pids = []
+        self._detached_seen = set()
+        self._rss_sum = 0
+        self._peak_rss = 0
+        self._peak_cpu = 0.0
+        self._peak_threads = 0
+        self._samples = 0
+        self._min_available = None
+        self._memory_total = None
+
+    def attach(self, process):
+        self._process = process
+        self._start_time = time.time()
+        self._last_time = self._start_time
+        try:
+            self._memory_total = self.reader.memory_info()[0]
+        except OSError:
+            self._memory_total = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        # 第一次采样提前，较短的命令也能得到数据
+        wait = min(self.interval, 0.2)
+        while not self._stopped.wait(wait):
+            self.sample()
+            wait = self.interval
+
+    def _find_detached(self):
+        if self._detached_markers and (not self._detached_pids or self._samples % DETACHED_RESCAN_SAMPLES == 0):
+            try:
+                self._detached_pids = self.reader.find_processes(self._detached_markers)
+            except OSError:
+                self._detached_pids = []
+        return self._detached_pids
+
+    def sample(self):
+        now = time.time()
+        snapshots = self.reader.snapshot_tree([self._process.pid])
+        if not snapshots:
+            return
+        detached_pids = self._find_detached()
+        if detached_pids:
+            tree_pids = {snapshot.pid for snapshot in snapshots}
+            for snapshot in self.reader.snapshot_tree(detached_pids):
+                if snapshot.pid in tree_pids:
+                    continue
+                if self._samples == 0:
+                    # 命令开始时已存在的分离进程（及其子进程）扣除之前的累计值，之后出现的从零开始计入
+                    self._baseline[snapshot.pid] = snapshot
+                if snapshot.pid in detached_pids:
+                    self._detached_seen.add(snapshot.pid)
+                snapshots.append(snapshot)
+        cpu_delta = 0.0
+        for snapshot in snapshots:
+            previous = self._last.get(snapshot.pid) or self._baseline.get(snapshot.pid)
+            cpu_delta += snapshot.cpu_time - (previous.cpu_time if previous else 0.0)
+            self._last[snapshot.pid] = snapshot
+        elapsed = max(now - self._last_time, 1e-6)
+        self._last_time = now
+        # 共享内存页会被重复计入，RSS 之和是上限估计
+        rss = sum(snapshot.rss for snapshot in snapshots)
+        cpu = cpu_delta / elapsed * 100
+        threads = sum(snapshot.threads for snapshot in snapshots)
+        read_bytes, write_bytes = self._io_totals()
+        try:
+            available = self.reader.memory_info()[1]
+        except OSError:
+            available = None
+
+        self._samples += 1
+        self._rss_sum += rss
+        self._peak_rss = max(self._peak_rss, rss)
+        self._peak_cpu = max(self._peak_cpu, cpu)
+        self._peak_threads = max(self._peak_threads, threads)
+        if available is not None:
+            self._min_available = available if self._min_available is None else min(self._min_available, available)
+        get_tracer().counter(f"{self.name} resources", now, cpu=round(cpu, 1), rss_mb=round(rss / 1048576, 1),
+                             read_mb=round(read_bytes / 1048576, 1), write_mb=round(write_bytes / 1048576, 1),
+                             threads=threads)
+
+    def _total(self, field):
+        total = sum(getattr(snapshot, field) for snapshot in self._last.values())
+        return total - sum(getattr(snapshot, field) for snapshot in self._baseline.values())
+
+    def _io_totals(self):
+        return self._total("read_bytes"), self._total("write_bytes")
+
+    def detach(self):
+        if self._thread is None:
+            return None
+        self._stopped.set()
+        self._thread.join()
+        read_bytes, write_bytes = self._io_totals()
+        self.summary = ResourceSummary(
+            self.name,
+            time.time() - self._start_time,
+            self._samples,
+            self._total("cpu_time"),
+            self._peak_cpu,
+            self._peak_rss,
+            self._rss_sum // self._samples if self._samples else 0,
+            read_bytes,
+            write_bytes,
+            self._peak_threads,
+            self._memory_total,
+            self._min_available,
+            len(self._detached_seen) if self._detached_markers else None,
+        )
+        with _summaries_lock:
+            _summaries.append(self.summary)
+        if self._samples:
+            get_tracer().instant(f"resources: {self.name}", category="resources", **self.summary.to_args())
+            log_resource_usage(self.summary, self.config)
+        return self.summary
+
+def open_resource_monitor(name):
+    """为一次命令执行创建采样器；已禁用或当前平台无法采样时返回 None"""
+    global _unsupported_logged
+    if not _config.get("enabled"):
+        return None
+    reader = get_reader()
+    if reader is None:
+        if not _unsupported_logged:
+            log_pipeline_step("[WARNING] 未安装 psutil 且系统不支持 /proc，跳过资源采样（pip install psutil）")
+            _unsupported_logged = True
+        return None
+    return ResourceMonitor(name, reader, _config)
+
+def check_resource_warnings(summary, config):
+    """返回内存压力与 CPU 空闲的警告信息列表"""
+    warnings = []
+    ratio = float(config.get("memory_warn_ratio", 0.85))
+    total = summary.memory_total
+    if total and summary.peak_rss >= total * ratio:
+        warnings.append(f"{summary.name} 内存峰值 {format_size(summary.peak_rss)}，"
+                        f"接近物理内存 {format_size(total)}（{summary.peak_rss / total * 100:.0f}%）")
+    elif total and summary.min_available is not None and summary.min_available < total * (1 - ratio):
+        warnings.append(f"{summary.name} 执行期间系统可用内存最低 {format_size(summary.min_available)}"
+                        f"（物理内存 {format_size(total)}），存在内存压力，Gradle 可能频繁 GC 或被换页")
+    # 只统计到客户端进程时 CPU 占用不代表实际构建，不做空闲判断
+    if (summary.samples and not summary.client_only and summary.duration >= float(config.get("idle_min_seconds", 60))
+            and summary.avg_cpu < float(config.get("idle_cpu_percent", 15))):
+        io_rate = (summary.read_bytes + summary.write_bytes) / summary.duration
+        warnings.append(f"{summary.name} 大部分时间 CPU 空闲（平均 {summary.avg_cpu:.0f}%，"
+                        f"磁盘 {format_size(io_rate)}/s），可能在等待磁盘、网络或锁")
+    return warnings
+
+def log_resource_usage(summary, config):
+    scope = "（未找到分离的守护进程，仅统计客户端进程）" if summary.client_only else ""
+    log_pipeline_step(
+        f"资源占用 {summary.name}{scope}: CPU 平均 {summary.avg_cpu:.0f}% 峰值 {summary.peak_cpu:.0f}%，"
+        f"内存平均 {format_size(summary.avg_rss)} 峰值 {format_size(summary.peak_rss)}，"
+        f"读 {format_size(summary.read_bytes)} 写 {format_size(summary.write_bytes)}，线程峰值 {summary.peak_threads}"
+    )
+    for warning in check_resource_warnings(summary, config):
+        log_pipeline_step(f"[WARNING] {warning}")
+
+def get_resource_summaries():
+    with _summaries_lock:
+        return list(_summaries)
+
+def log_resource_summary():
+    """输出本次运行中各命令的资源占用汇总"""
+    summaries = [summary for summary in get_resource_summaries() if summary.samples]
+    if not summaries:
+        return
+    log_pipeline_step("资源占用汇总（CPU 为单核百分比）:")
+    for summary in summaries:
+        log_pipeline_step(
+            f"  {summary.name + ('*' if summary.client_only else ''):<14} 耗时 {summary.duration:>7.1f}s  "
+            f"CPU 平均 {summary.avg_cpu:>5.0f}% 峰值 {summary.peak_cpu:>5.0f}%  内存峰值 {format_size(summary.peak_rss):>11}  "
+            f"读 {format_size(summary.read_bytes):>11}  写 {format_size(summary.write_bytes):>11}"
+        )
+    if any(summary.client_only for summary in summaries):
+        log_pipeline_step("  * 未找到分离的守护进程，仅统计客户端进程")
@@ -27,34 +27,12 @@ if not exist build_params.json (
     type build_params.json
 )
 
-REM 执行各个构建阶段
+REM 提交到常驻构建服务执行（重复请求合并、工具链保持预热），服务未启动时在本机按依赖关系执行各阶段
 echo [PIPELINE] ======================== 开始执行构建流程 ========================
 
-echo [PIPELINE] [1/4] Git 更新阶段
-call run_git_update.bat
+python build_client.py %*
 IF ERRORLEVEL 1 (
-    echo [PIPELINE] [ERROR] Git 更新阶段失败！
-    exit /b %ERRORLEVEL%
-)
-
-echo [PIPELINE] [2/4] Cocos 工程生成阶段
-call run_cocos_build.bat
-IF ERRORLEVEL 1 (
-    echo [PIPELINE] [ERROR] Cocos 工程生成阶段失败！
-    exit /b %ERRORLEVEL%
-)
-
-echo [PIPELINE] [3/4] APK 打包生成阶段
-call run_apk_build.bat
-IF ERRORLEVEL 1 (
-    echo [PIPELINE] [ERROR] APK 打包生成阶段失败！
-    exit /b %ERRORLEVEL%
-)
-
-echo [PIPELINE] [4/4] 构建结果验证阶段
-call run_verify_build.bat
-IF ERRORLEVEL 1 (
-    echo [PIPELINE] [ERROR] 构建结果验证阶段失败！
+    echo [PIPELINE] [ERROR] 构建流程失败！
     exit /b %ERRORLEVEL%
 )
 
@@ -0,0 +1,19 @@
+@echo off
+echo [PIPELINE] ======================== 启动常驻构建服务 ========================
+echo [PIPELINE] 开始时间: %date% %time%
+
+REM 切换到脚本目录
+cd /d %~dp0
+
+REM 检查 Python 和脚本是否存在
+if not exist build_daemon.py (
+    echo [PIPELINE] [ERROR] build_daemon.py 不存在!
+    exit /b 1
+)
+
+REM 服务常驻运行，run_*.bat 通过 build_client.py 提交构建请求
+python build_daemon.py %*
+if %ERRORLEVEL% NEQ 0 (
+    echo [PIPELINE] [ERROR] 构建服务异常退出! 错误代码: %ERRORLEVEL%
+    exit /b %ERRORLEVEL%
+)
@@ -6,13 +6,14 @@ REM 切换到脚本目录
 cd /d %~dp0
 
 REM 检查 Python 和脚本是否存在
-if not exist build_modules.py (
-    echo [PIPELINE] [ERROR] build_modules.py 不存在!
+if not exist build_client.py (
+    echo [PIPELINE] [ERROR] build_client.py 不存在!
     exit /b 1
 )
 
 echo [PIPELINE] 执行 Git 更新操作...
-python build_modules.py git_update
+REM 提交到常驻构建服务执行，服务未启动时在本机执行
+python build_client.py --stages git_update
 if %ERRORLEVEL% NEQ 0 (
     echo [PIPELINE] [ERROR] Git 更新失败! 错误代码: %ERRORLEVEL%
     exit /b %ERRORLEVEL%
@@ -0,0 +1,23 @@
+@echo off
+echo [PIPELINE] ======================== 产物发布阶段 ========================
+echo [PIPELINE] 开始时间: %date% %time%
+
+REM 切换到脚本目录
+cd /d %~dp0
+
+REM 检查 Python 和脚本是否存在
+if not exist build_client.py (
+    echo [PIPELINE] [ERROR] build_client.py 不存在!
+    exit /b 1
+)
+
+echo [PIPELINE] 执行产物发布...
+REM 提交到常驻构建服务执行，服务未启动时在本机执行
+python build_client.py --stages publish
+if %ERRORLEVEL% NEQ 0 (
+    echo [PIPELINE] [ERROR] 产物发布失败! 错误代码: %ERRORLEVEL%
+    exit /b %ERRORLEVEL%
+)
+
+echo [PIPELINE] ====================== 产物发布阶段完成 ======================
+echo [PIPELINE] 结束时间: %date% %time% 
\ No newline at end of file
@@ -0,0 +1,156 @@
+import collections
+import re
+import threading
+import time
+
+from build_trace import get_tracer
+from build_utils import log_pipeline_step
+from log_store import open_log_sink
+from process_stream import run_streamed
+from resource_monitor import open_resource_monitor
+
+# 各外部命令的看门狗与重试配置，可通过 build_params.json 的 watchdog 按名称覆盖
+DEFAULT_WATCHDOG_CONFIG = {
+    "cocos_export": {
+        "timeout": 5400,            # 总耗时上限（秒），超出时结束进程树，不重试
+        "idle_timeout": 900,        # 无输出上限（秒），Creator 无界面运行时卡死的典型表现，结束后重试
+        "retries": 1,
+        "backoff": 30,              # 首次重试前等待秒数，之后每次翻倍
+        "max_backoff": 300,
+        "success_exit_codes": [0, 36],  # Cocos Creator有时返回36但实际构建成功
+        "transient_exit_codes": [],
+        "transient_patterns": [
+            r"EADDRINUSE",
+            r"ECONNRESET",
+            r"EBUSY",
+            r"socket hang up",
+        ],
+    },
+    "gradle_build": {
+        "timeout": 5400,
+        "idle_timeout": 1200,
+        "retries": 2,
+        "backoff": 30,
+        "max_backoff": 300,
+        "success_exit_codes": [0],
+        "transient_exit_codes": [],
+        # 只匹配网络层面的原因；"Could not resolve/find ..." 本身也可能是坐标或版本错误，重试没有意义
+        "transient_patterns": [
+            r"Received status code 5\d\d from server",
+            r"Connection (reset|refused|timed out)",
+            r"Connect timed out",
+            r"Read timed out",
+            r"Remote host terminated the handshake",
+            r"Gradle build daemon disappeared unexpectedly",
+            r"Timeout waiting to lock",
+        ],
+    },
+    # 预热只是提前启动守护进程，卡住时结束进程树即可，正式构建会自行启动守护进程
+    "gradle_warmup": {
+        "timeout": 900,
+        "idle_timeout": 600,
+        "retries": 0,
+        "backoff": 30,
+        "max_backoff": 300,
+        "success_exit_codes": [0],
+        "transient_exit_codes": [],
+        "transient_patterns": [],
+    },
+}
+
+# 判定临时故障时只检查输出的最后若干行
+FAILURE_TAIL_LINES = 200
+
+_events = []
+_events_lock = threading.Lock()
+
+def get_watchdog_config(params, name):
+    config = dict(DEFAULT_WATCHDOG_CONFIG.get(name, DEFAULT_WATCHDOG_CONFIG["gradle_build"]))
+    config.update((params or {}).get("watchdog", {}).get(name, {}))
+    return config
+
+def classify_failure(return_code, killed, tail_lines, config):
+    """返回 "success"、"transient"（可重试）或 "fatal" """
+    if killed == "idle":
+        return "transient"
+    if killed:
+        return "fatal"
+    if return_code in config.get("success_exit_codes", [0]):
+        return "success"
+    if return_code in config.get("transient_exit_codes", []):
+        return "transient"
+    patterns = [re.compile(pattern) for pattern in config.get("transient_patterns", [])]
+    if any(pattern.search(line) for line in tail_lines for pattern in patterns):
+        return "transient"
+    return "fatal"
+
+def record_event(kind, name, attempt, **info):
+    """记录一次结束进程或重试，写入追踪文件并在运行汇总中输出"""
+    event = dict(info, kind=kind, name=name, attempt=attempt, time=time.time())
+    with _events_lock:
+        _events.append(event)
+    get_tracer().instant(f"{kind}: {name}", category="watchdog", attempt=attempt, **info)
+
+def get_watchdog_events():
+    with _events_lock:
+        return list(_events)
+
+def log_watchdog_summary():
+    """输出本次运行中所有被结束的进程与重试"""
+    events = get_watchdog_events()
+    if not events:
+        return
+    log_pipeline_step("看门狗与重试记录:")
+    for event in events:
+        timestamp = time.strftime("%H:%M:%S", time.localtime(event["time"]))
+        details = ", ".join(f"{k}={v}" for k, v in event.items() if k not in ("kind", "name", "attempt", "time"))
+        log_pipeline_step(f"  [{timestamp}] {event['kind']:<6} {event['name']} 第 {event['attempt']} 次执行  {details}")
+
+class RetryOutcome:
+    def __init__(self, return_code, success, attempts, killed=None):
+        self.return_code = return_code
+        self.success = success
+        self.attempts = attempts
+        self.killed = killed
+
+def run_with_retry(name, command, prefix, config, line_handler_factory=None, cwd=None):
+    """带看门狗执行外部命令，临时故障按退避间隔重试，返回 RetryOutcome
+
+    line_handler_factory 每次执行前调用，返回本次执行的输出解析回调，重试时不会混入上次的输出。
+    """
+    retries = int(config.get("retries", 0))
+    attempt = 0
+    while True:
+        attempt += 1
+        tail = collections.deque(maxlen=FAILURE_TAIL_LINES)
+        handler = line_handler_factory() if line_handler_factory else None
+
+        def on_line(line, handler=handler, tail=tail):
+            tail.append(line)
+            if handler:
+                handler(line)
+
+        # 每次执行写入独立的日志分片，重试前的输出仍可查询
+        result = run_streamed(command, prefix, cwd=cwd, line_handler=on_line,
+                              timeout=config.get("timeout"), idle_timeout=config.get("idle_timeout"),
+                              extra_sinks=[open_log_sink(name)], monitors=[open_resource_monitor(name)])
+        if result.killed:
+            limit = config.get("timeout") if result.killed == "timeout" else config.get("idle_timeout")
+            reason = "总耗时超过" if result.killed == "timeout" else "无输出超过"
+            log_pipeline_step(f"[WARNING] {name} {reason} {limit}s，已结束进程树")
+            record_event("kill", name, attempt, reason=result.killed, limit=limit,
+                         duration=round(result.duration, 1))
+
+        verdict = classify_failure(result.return_code, result.killed, tail, config)
+        if verdict == "success":
+            return RetryOutcome(result.return_code, True, attempt)
+        if verdict == "fatal" or attempt > retries:
+            return RetryOutcome(result.return_code, False, attempt, result.killed)
+
+        delay = min(float(config.get("backoff", 30)) * 2 ** (attempt - 1), float(config.get("max_backoff", 300)))
+        log_pipeline_step(
+            f"[WARNING] {name} 临时故障（返回码: {result.return_code}），{delay:.0f}s 后重试 "
+            f"({attempt}/{retries})"
+        )
+        record_event("retry", name, attempt, exit_code=result.return_code, killed=result.killed, delay=delay)
+        time.sleep(delay)